@@ -60,12 +60,16 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    # SearchVectorField (Post.search_vector)
+    'django.contrib.postgres',
 
     'content.apps.ContentConfig'
 ]
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    # до всего, что читает кеши в памяти процесса
+    'content.middleware.InvalidationMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -89,6 +93,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'content.context_processors.permissions',
             ],
         },
     },
@@ -131,12 +136,31 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
-CACHES = {
-    "default": {
-        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
-        "LOCATION": "singyician-cache",
+# Поиск: "postgres" (FTS), "index" (встроенный индекс) или "like".
+# Пусто - выбирается по типу базы.
+SEARCH_BACKEND = os.getenv("SEARCH_BACKEND", "")
+
+# L2 общего кеша (content/cache.py): один на все воркеры gunicorn.
+# Redis, если задан REDIS_URL, иначе файловый кеш на диске сервера.
+# L1 - LRU в памяти каждого процесса поверх него.
+REDIS_URL = os.getenv("REDIS_URL")
+
+if REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL,
+            "KEY_PREFIX": "singyician",
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+            "LOCATION": os.getenv("CACHE_DIR", str(BASE_DIR / "var" / "cache")),
+            "OPTIONS": {"MAX_ENTRIES": 50000},
+        }
     }
-}
 
 
 # Internationalization
@@ -168,6 +192,15 @@ if not DEBUG:
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# потоков на процесс для уменьшенных копий картинок (content/images.py)
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", "2"))
+
+# версии статей: опорный кадр каждые N версий, между ними дельты (content/revisions.py)
+REVISION_KEYFRAME_EVERY = 20
+# compact_revisions: снимки публикаций и текущая версия остаются всегда,
+# из черновиков - последние N и по одному за день среди более старых
+REVISION_KEEP_DRAFTS = 20
+
 # доступ только для избранных
 LOGIN_REDIRECT_URL = '/main/'
 LOGOUT_REDIRECT_URL = '/login/'
@@ -185,6 +218,17 @@ EMAIL_USE_TLS = True
 EMAIL_HOST_USER = os.getenv("EMAIL_HOST_USER")
 EMAIL_HOST_PASSWORD = os.getenv("EMAIL_HOST_PASSWORD")
 
+# рассылки: размер пачки писем на одно SMTP-соединение,
+# таймаут, чтобы зависший SMTP не держал воркер
+EMAIL_BATCH_SIZE = int(os.getenv("EMAIL_BATCH_SIZE", "100"))
+EMAIL_TIMEOUT = 30
+
+# очередь писем (manage.py send_outbox): лимит Gmail, повторы с
+# задержкой OUTBOX_RETRY_BASE * 2^(попытка-1) секунд
+EMAIL_RATE_PER_MINUTE = int(os.getenv("EMAIL_RATE_PER_MINUTE", "60"))
+OUTBOX_RETRY_BASE = 60
+OUTBOX_MAX_ATTEMPTS = 6
+
 
 DEFAULT_FROM_EMAIL = os.getenv(
     "DEFAULT_FROM_EMAIL",
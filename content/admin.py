@@ -1,7 +1,7 @@
 from django.contrib import admin
 from django.utils.html import format_html
 
-from .models import Section, Post, PostImage, PostRevision
+from .models import Section, Post, PostImage, PostRevision, OutboxMessage
 
 
 @admin.register(Section)
@@ -26,6 +26,12 @@ class PostRevisionInline(admin.TabularInline):
     can_delete = False
     show_change_link = True
 
+    def get_queryset(self, request):
+        # текст версий в таблице не нужен
+        return super().get_queryset(request).select_related('created_by').defer(
+            'raw_content', 'data', 'plain_text'
+        )
+
 
 @admin.register(Post)
 class PostAdmin(admin.ModelAdmin):
@@ -65,8 +71,14 @@ class PostAdmin(admin.ModelAdmin):
 class PostRevisionAdmin(admin.ModelAdmin):
     list_display = ('post', 'created_at', 'created_by', 'note', 'is_published_snapshot')
     list_filter = ('is_published_snapshot', 'created_at')
-    search_fields = ('post__title', 'note', 'content')
-    readonly_fields = ('created_at',)
+    search_fields = ('post__title', 'note', 'plain_text')
+    readonly_fields = ('created_at', 'storage', 'content')
+    list_select_related = ('post', 'created_by')
+    raw_id_fields = ('post', 'created_by')
+
+    def get_queryset(self, request):
+        # текст нужен только на странице версии - догрузится там
+        return super().get_queryset(request).defer('raw_content', 'data', 'plain_text')
 
     def has_add_permission(self, request):
         # добавление ревизий будем делать позже через отдельный UI, пока пусть будет только чтение
@@ -84,3 +96,11 @@ class PostImageAdmin(admin.ModelAdmin):
         if not obj.image:
             return "-"
         return format_html('<img src="{}" style="height:40px" />', obj.image.url)
+
+
+@admin.register(OutboxMessage)
+class OutboxMessageAdmin(admin.ModelAdmin):
+    list_display = ('to_email', 'subject', 'status', 'attempts', 'next_attempt_at', 'sent_at')
+    list_filter = ('status',)
+    search_fields = ('to_email', 'subject', 'last_error')
+    readonly_fields = ('event', 'created_at', 'sent_at', 'last_error')
@@ -0,0 +1,128 @@
+import itertools
+import threading
+import time
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+
+# Шина инвалидации кешей в памяти процессов: таблица CacheInvalidation
+# с возрастающим id. Каждый процесс помнит последний увиденный id и в
+# начале запроса (InvalidationMiddleware) одним индексным запросом
+# забирает новые события, вызывая подписчиков пространства.
+# Строка с меньшим id может закоммититься позже строки с большим:
+# такие пропуски запоминаются и перечитываются, пока не появятся
+# (или пока не истечёт GAP_GRACE - значит, вставка откатилась).
+
+# сколько храним события: новый процесс начинает с текущего максимума,
+# старые строки никому не нужны
+RETENTION = timedelta(hours=1)
+CLEANUP_EVERY = 200
+
+# key="*" - сбросить пространство целиком
+ALL = "*"
+
+# сколько секунд ждём строку на месте пропущенного id
+GAP_GRACE = 60
+MAX_GAPS = 1000
+
+_subscribers = {}
+_last_seen = None
+# пропущенный id -> time.monotonic(), когда пропуск замечен
+_gaps = {}
+_lock = threading.Lock()
+_published = itertools.count(1)
+
+
+def subscribe(namespace, callback):
+    """
+    callback(key) вызывается для каждого события пространства
+    (в том числе key == ALL).
+    """
+    _subscribers.setdefault(namespace, []).append(callback)
+
+
+def publish(namespace, key=ALL):
+    """
+    Записать событие. Внутри транзакции - после коммита, чтобы другие
+    процессы не перечитали старые данные до того, как они изменятся.
+    """
+    from .models import CacheInvalidation
+
+    def _write():
+        CacheInvalidation.objects.create(namespace=namespace, key=str(key)[:255])
+
+        if next(_published) % CLEANUP_EVERY == 0:
+            CacheInvalidation.objects.filter(
+                created_at__lt=timezone.now() - RETENTION
+            ).delete()
+
+    transaction.on_commit(_write)
+
+
+def poll():
+    """
+    Применить события, опубликованные с прошлого вызова, и те, что
+    закоммитились на месте пропущенных id.
+    Первый вызов в процессе только запоминает текущую позицию: L1 нового
+    процесса пуст, догонять нечего.
+    """
+    global _last_seen
+    from .models import CacheInvalidation
+
+    if _last_seen is None:
+        with _lock:
+            if _last_seen is None:
+                latest = CacheInvalidation.objects.order_by("-pk").values_list("pk", flat=True).first()
+                _last_seen = latest or 0
+        return
+
+    with _lock:
+        condition = Q(pk__gt=_last_seen)
+        if _gaps:
+            condition |= Q(pk__in=list(_gaps))
+
+    events = list(
+        CacheInvalidation.objects
+        .filter(condition)
+        .order_by("pk")
+        .values_list("pk", "namespace", "key")
+    )
+
+    with _lock:
+        _track(events)
+
+    for _, namespace, key in events:
+        for callback in _subscribers.get(namespace, ()):
+            callback(key)
+
+
+def _track(events):
+    """
+    Сдвинуть _last_seen и обновить пропуски по прочитанным событиям.
+    Вызывается под _lock.
+    """
+    global _last_seen
+
+    now = time.monotonic()
+    found = {pk for pk, _, _ in events}
+
+    for pk in found:
+        _gaps.pop(pk, None)
+
+    newest = events[-1][0] if events else _last_seen
+    if newest > _last_seen:
+        for pk in range(max(_last_seen + 1, newest - MAX_GAPS), newest):
+            if pk not in found:
+                _gaps.setdefault(pk, now)
+        _last_seen = newest
+
+    for pk, noticed in list(_gaps.items()):
+        if now - noticed > GAP_GRACE:
+            del _gaps[pk]
+
+    if len(_gaps) > MAX_GAPS:
+        for pk in sorted(_gaps)[:-MAX_GAPS]:
+            del _gaps[pk]
@@ -0,0 +1,244 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import cache as shared
+
+from . import bus
+
+
+# L1 - словарь в памяти процесса, L2 - общий кеш (CACHES["default"]:
+# Redis или файловый), один на все воркеры gunicorn
+
+L1_SIZE = 1000
+L1_TTL = 60
+
+# как часто процесс перечитывает версию пространства из L2; обычно
+# раньше срабатывает шина инвалидации (content/bus.py), это страховка
+VERSION_TTL = 30
+
+# счётчики копятся в процессе и сбрасываются в L2 пачками
+STATS_FLUSH_EVERY = 100
+
+_missing = object()
+
+
+class LocalLRU:
+    """
+    Потокобезопасный LRU с TTL: хранит (срок, значение).
+    """
+
+    def __init__(self, size, ttl):
+        self.size = size
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return _missing
+
+            expires, value = item
+            if expires < time.monotonic():
+                del self._data[key]
+                return _missing
+
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        if not self.size:
+            return
+
+        with self._lock:
+            self._data[key] = (time.monotonic() + (ttl or self.ttl), value)
+            self._data.move_to_end(key)
+
+            while len(self._data) > self.size:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class Namespace:
+    """
+    Пространство ключей двухуровневого кеша.
+
+    Ключ в L2: "<name>:<version>:<key>". invalidate() меняет версию -
+    все старые ключи разом становятся недоступны во всех процессах.
+    invalidate() и delete() публикуют событие в шину: остальные процессы
+    в начале следующего запроса сбрасывают у себя ровно эти ключи L1.
+    local=False - без L1, для флагов, которые должны быть одинаковы
+    во всех воркерах сразу.
+    """
+
+    COUNTERS = ("l1_hits", "l2_hits", "misses")
+
+    def __init__(self, name, timeout=None, local=True):
+        self.name = name
+        self.timeout = timeout
+        self.local = LocalLRU(L1_SIZE if local else 0, L1_TTL)
+
+        self._version = None
+        self._version_checked = 0
+        self._stats = dict.fromkeys(self.COUNTERS, 0)
+        self._pending = dict.fromkeys(self.COUNTERS, 0)
+        self._lock = threading.Lock()
+
+        bus.subscribe(name, self._on_invalidate)
+
+    def _on_invalidate(self, key):
+        if key == bus.ALL:
+            self.local.clear()
+            self._version = None
+        elif self._version is not None:
+            self.local.delete(f"{self.name}:{self._version}:{key}")
+
+    # ===== ВЕРСИЯ =====
+
+    def version_key(self):
+        return f"{self.name}:version"
+
+    def version(self):
+        now = time.monotonic()
+
+        if self._version is None or now - self._version_checked > VERSION_TTL:
+            version = shared.get(self.version_key())
+
+            if version is None:
+                shared.add(self.version_key(), time.time_ns(), timeout=None)
+                version = shared.get(self.version_key())
+
+            if version != self._version:
+                self.local.clear()
+
+            self._version = version
+            self._version_checked = now
+
+        return self._version
+
+    def invalidate(self):
+        version = time.time_ns()
+        shared.set(self.version_key(), version, timeout=None)
+
+        self.local.clear()
+        self._version = version
+        self._version_checked = time.monotonic()
+
+        bus.publish(self.name)
+
+    # ===== ЗНАЧЕНИЯ =====
+
+    def make_key(self, key):
+        return f"{self.name}:{self.version()}:{key}"
+
+    def get(self, key, default=None):
+        full_key = self.make_key(key)
+
+        value = self.local.get(full_key)
+        if value is not _missing:
+            self._count("l1_hits")
+            return value
+
+        value = shared.get(full_key, _missing)
+        if value is not _missing:
+            self._count("l2_hits")
+            self.local.set(full_key, value)
+            return value
+
+        self._count("misses")
+        return default
+
+    def set(self, key, value, timeout=None):
+        full_key = self.make_key(key)
+
+        shared.set(full_key, value, timeout or self.timeout)
+        self.local.set(full_key, value)
+
+    def get_or_set(self, key, default, timeout=None):
+        value = self.get(key, _missing)
+
+        if value is _missing:
+            value = default() if callable(default) else default
+            self.set(key, value, timeout)
+
+        return value
+
+    def delete(self, key):
+        full_key = self.make_key(key)
+
+        shared.delete(full_key)
+        self.local.delete(full_key)
+
+        bus.publish(self.name, key)
+
+    # ===== СЧЁТЧИКИ =====
+
+    def _count(self, counter):
+        with self._lock:
+            self._stats[counter] += 1
+            self._pending[counter] += 1
+
+            if sum(self._pending.values()) < STATS_FLUSH_EVERY:
+                return
+
+            pending = self._pending
+            self._pending = dict.fromkeys(self.COUNTERS, 0)
+
+        self._flush(pending)
+
+    def _flush(self, pending):
+        for counter, value in pending.items():
+            if not value:
+                continue
+
+            key = f"stats:{self.name}:{counter}"
+            shared.add(key, 0, timeout=None)
+            try:
+                shared.incr(key, value)
+            except ValueError:
+                shared.set(key, value, timeout=None)
+
+    def stats(self):
+        """
+        Счётчики этого процесса.
+        """
+        return dict(self._stats)
+
+    def shared_stats(self):
+        """
+        Счётчики всех процессов, сброшенные в L2 (с точностью до пачки).
+        """
+        return {
+            counter: shared.get(f"stats:{self.name}:{counter}", 0)
+            for counter in self.COUNTERS
+        }
+
+
+_namespaces = {}
+_namespaces_lock = threading.Lock()
+
+
+def namespace(name, timeout=None, local=True):
+    """
+    Пространство кеша по имени; один объект на процесс.
+    """
+    ns = _namespaces.get(name)
+    if ns is None:
+        with _namespaces_lock:
+            ns = _namespaces.get(name)
+            if ns is None:
+                ns = _namespaces[name] = Namespace(name, timeout, local)
+    return ns
+
+
+def all_namespaces():
+    return dict(_namespaces)
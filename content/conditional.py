@@ -0,0 +1,78 @@
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.contrib import messages
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import etag
+
+from .cache import namespace
+from .permissions import is_publisher
+from .tree import get_tree_version
+
+
+# поднимать при изменении шаблонов, чтобы браузеры не держали старые страницы
+ETAG_VERSION = 1
+
+# версия всего опубликованного контента: меняется при сохранении /
+# удалении статьи или её версии (signals.py)
+content_cache = namespace("content")
+
+# версия личного состояния пользователя: закладки, профиль
+user_state_cache = namespace("user_state", timeout=60 * 60 * 24)
+
+
+def get_content_version():
+    return content_cache.version()
+
+
+def bump_content_version():
+    content_cache.invalidate()
+
+
+def get_user_state_version(user):
+    return user_state_cache.get_or_set(user.pk, time.time_ns)
+
+
+def touch_user_state(user_id):
+    user_state_cache.delete(user_id)
+
+
+def page_etag(request, *args, **kwargs):
+    """
+    ETag страницы из штампов: роль и состояние пользователя, версия
+    дерева разделов, версия контента. Считается без запросов к базе
+    (всё лежит в кеше) - 304 отдаётся до выборок и шаблонов.
+    """
+    # flash-сообщение должно показаться - страницу собираем заново
+    if len(messages.get_messages(request)):
+        return None
+
+    user = request.user
+
+    raw = "|".join(map(str, (
+        ETAG_VERSION,
+        user.pk,
+        is_publisher(user),
+        get_user_state_version(user),
+        # страница содержит csrf-токен: после смены секрета нужна новая
+        request.COOKIES.get(settings.CSRF_COOKIE_NAME, ""),
+        get_tree_version(),
+        get_content_version(),
+    )))
+
+    return hashlib.md5(raw.encode()).hexdigest()
+
+
+def conditional_page(view_func):
+    """
+    Условный GET: If-None-Match -> 304 без выполнения view.
+    no-cache - браузер хранит ответ, но каждый раз переспрашивает.
+    """
+    @wraps(view_func)
+    @cache_control(private=True, no_cache=True)
+    @etag(page_etag)
+    def _wrapped(request, *args, **kwargs):
+        return view_func(request, *args, **kwargs)
+    return _wrapped
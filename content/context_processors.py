@@ -0,0 +1,16 @@
+from django.utils.functional import SimpleLazyObject
+
+from .permissions import get_user_groups, is_publisher
+
+
+def permissions(request):
+    """
+    Группы пользователя и флаг публикатора для шаблонов;
+    читаются лениво и не чаще раза за запрос.
+    """
+    user = request.user
+
+    return {
+        "user_groups": SimpleLazyObject(lambda: get_user_groups(user)),
+        "is_publisher": SimpleLazyObject(lambda: is_publisher(user)),
+    }
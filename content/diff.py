@@ -0,0 +1,116 @@
+import json
+import re
+from difflib import SequenceMatcher
+
+from .cache import namespace
+from .revisions import TOKEN_RE
+
+
+# сравнение двух версий статьи по словам.
+# Сначала по блокам (абзацы HTML / предложения текста) - это дёшево
+# даже для больших статей; по словам сравниваются только изменённые блоки.
+
+TEXT = "text"
+HTML = "html"
+
+# границы блоков: после закрывающих блочных тегов и переводов строк в HTML,
+# после конца предложения в тексте
+HTML_BLOCK_RE = re.compile(
+    r"(?<=\n)|(?<=</p>)|(?<=</li>)|(?<=</tr>)|(?<=</pre>)|(?<=</h[1-6]>)|(?<=</blockquote>)"
+)
+TEXT_BLOCK_RE = re.compile(r"(?<=[.!?…] )")
+
+WORD_RE = re.compile(r"\S+\s*|\s+")
+
+# изменённый кусок длиннее - показываем целиком как удалённый / вставленный
+MAX_WORD_DIFF_TOKENS = 5000
+
+# результат больше - не кешируется (отдаётся потоком каждый раз)
+MAX_CACHED_SIZE = 256 * 1024
+
+diff_cache = namespace("revision_diff", timeout=60 * 60 * 24 * 7)
+
+
+def diff_cache_key(post_id, rev_a, rev_b, mode):
+    return f"{post_id}:{rev_a}:{rev_b}:{mode}"
+
+
+def iter_diff(old, new, mode=TEXT):
+    """
+    Правка old -> new кусками ("=" | "-" | "+", текст);
+    соседние куски одного вида склеены.
+    """
+    block_re, token_re = (HTML_BLOCK_RE, TOKEN_RE) if mode == HTML else (TEXT_BLOCK_RE, WORD_RE)
+
+    last_op, parts = None, []
+
+    for op, text in _diff_blocks(block_re.split(old), block_re.split(new), token_re):
+        if not text:
+            continue
+        if op != last_op and parts:
+            yield last_op, "".join(parts)
+            parts = []
+        last_op = op
+        parts.append(text)
+
+    if parts:
+        yield last_op, "".join(parts)
+
+
+def _diff_blocks(a, b, token_re):
+    for tag, i1, i2, j1, j2 in SequenceMatcher(None, a, b, autojunk=False).get_opcodes():
+        if tag == "equal":
+            yield "=", "".join(a[i1:i2])
+        elif tag == "delete":
+            yield "-", "".join(a[i1:i2])
+        elif tag == "insert":
+            yield "+", "".join(b[j1:j2])
+        else:
+            yield from _diff_words("".join(a[i1:i2]), "".join(b[j1:j2]), token_re)
+
+
+def _diff_words(old, new, token_re):
+    a, b = token_re.findall(old), token_re.findall(new)
+
+    if len(a) + len(b) > MAX_WORD_DIFF_TOKENS:
+        yield "-", old
+        yield "+", new
+        return
+
+    for tag, i1, i2, j1, j2 in SequenceMatcher(None, a, b, autojunk=False).get_opcodes():
+        if tag == "equal":
+            yield "=", "".join(a[i1:i2])
+            continue
+        if i2 > i1:
+            yield "-", "".join(a[i1:i2])
+        if j2 > j1:
+            yield "+", "".join(b[j1:j2])
+
+
+def stream_json(meta, ops, cache_key=None):
+    """
+    JSON {**meta, "ops": [[op, text], ...]} кусками по мере расчёта.
+    Если итог не больше MAX_CACHED_SIZE - кладётся в кеш по cache_key.
+    """
+    head = json.dumps(meta, ensure_ascii=False)
+    yield head[:-1] + (', ' if meta else '') + '"ops": ['
+
+    collected, size = [], 0
+    for index, op in enumerate(ops):
+        chunk = json.dumps(op, ensure_ascii=False)
+        yield ("," if index else "") + chunk
+
+        if collected is not None:
+            size += len(chunk)
+            collected.append(op)
+            if size > MAX_CACHED_SIZE:
+                collected = None
+
+    yield "]}"
+
+    if cache_key and collected is not None:
+        diff_cache.set(cache_key, collected)
+
+
+def invalidate_diffs():
+    diff_cache.invalidate()
@@ -41,34 +41,47 @@ def send_confirm_email(request, profile):
     )
 
 # ===== POSTS =====
+# тексты писем; рассылка - content/notifications.py
 
-def send_new_post_email(email, post):
+def new_post_email(post):
     url = settings.SITE_URL + post.get_absolute_url()
 
-    send_mail(
-        subject=f"Новая публикация: {post.title}",
-        message=(
-            "Опубликована новая статья:\n\n"
-            f"{post.title}\n\n"
-            f"Читать статью:\n{url}"
-        ),
-        from_email=None,
-        recipient_list=[email],
-        fail_silently=True,
+    subject = f"Новая публикация: {post.title}"
+    body = (
+        "Опубликована новая статья:\n\n"
+        f"{post.title}\n\n"
+        f"Читать статью:\n{url}"
     )
+    return subject, body
 
-def send_post_update_email(email, post):
+
+def post_update_email(post):
     url = settings.SITE_URL + post.get_absolute_url()
 
-    send_mail(
-        subject=f"Обновление статьи: {post.title}",
-        message=(
-            "Статья была обновлена:\n\n"
-            f"{post.title}\n\n"
-            f"Открыть статью:\n{url}"
-        ),
-        from_email=None,
-        recipient_list=[email],
-        fail_silently=True,
+    subject = f"Обновление статьи: {post.title}"
+    body = (
+        "Статья была обновлена:\n\n"
+        f"{post.title}\n\n"
+        f"Открыть статью:\n{url}"
     )
+    return subject, body
+
+
+def digest_email(new_posts, updated_posts):
+    lines = []
+
+    for title, posts in (
+        ("Новые публикации:", new_posts),
+        ("Обновлённые статьи:", updated_posts),
+    ):
+        if not posts:
+            continue
+
+        lines.append(title)
+        for post in posts:
+            lines.append(f"- {post.title}\n  {settings.SITE_URL + post.get_absolute_url()}")
+        lines.append("")
 
+    total = len(new_posts) + len(updated_posts)
+    subject = f"Сводка материалов: {total}"
+    return subject, "\n".join(lines).strip()
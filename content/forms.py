@@ -8,7 +8,7 @@ from content.emails import send_confirm_email
 class ProfileForm(forms.ModelForm):
     class Meta:
         model = UserProfile
-        fields = ["email", "notify_new_posts", "notify_updates"]
+        fields = ["email", "notify_new_posts", "notify_updates", "digest_mode"]
 
     def save(self, request=None, commit=True):
         profile = super().save(commit=False)
@@ -129,31 +129,12 @@ class SectionForm(forms.ModelForm):
         # 3. Исключения при редактировании
         if self.instance.pk:
             qs = qs.exclude(pk=self.instance.pk)
-            qs = qs.exclude(pk__in=self._get_descendants(self.instance))
+            qs = qs.exclude(path__startswith=self.instance.path)
 
         self._apply_parent_rules(qs)
 
     def _apply_parent_rules(self, qs):
-        allowed_ids = [
-            s.pk for s in qs
-            if s.get_depth() < 2
-        ]
-
         self.fields["parent"].queryset = (
-            qs.filter(pk__in=allowed_ids)
+            qs.filter(depth__lt=2)
             .order_by("catalog", "order", "title")
-        )
-
-    def _get_descendants(self, section):
-        """
-        Возвращает список id всех потомков раздела (любой глубины)
-        """
-        ids = []
-
-        def collect(node):
-            for child in node.children.all():
-                ids.append(child.pk)
-                collect(child)
-
-        collect(section)
-        return ids
\ No newline at end of file
+        )
\ No newline at end of file
@@ -0,0 +1,210 @@
+import hashlib
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from urllib.parse import unquote
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from PIL import Image, ImageOps
+
+
+logger = logging.getLogger(__name__)
+
+# ширины вариантов; больше исходной не делаем
+WIDTHS = (320, 640, 1024, 1600)
+
+# формат -> (расширение, параметры сохранения Pillow)
+FORMATS = {
+    "webp": ("webp", {"quality": 80, "method": 4}),
+    "jpeg": ("jpg", {"quality": 82, "optimize": True, "progressive": True}),
+}
+
+# ширина JPEG для src у <img> - запасной вариант без srcset
+FALLBACK_WIDTH = 1024
+
+DEFAULT_SIZES = "(max-width: 900px) 100vw, 860px"
+
+# тег Orientation; 5-8 - поворот на 90°, ширина и высота меняются местами
+EXIF_ORIENTATION = 0x0112
+ROTATED = {5, 6, 7, 8}
+
+# Pillow отпускает GIL при декодировании и ресайзе - потоков хватает
+_executor = ThreadPoolExecutor(
+    max_workers=getattr(settings, "IMAGE_WORKERS", 2),
+    thread_name_prefix="images",
+)
+
+
+def generate_variants(source, force=False):
+    """
+    Варианты картинки source (имя файла в хранилище): поворот по EXIF,
+    затем метаданные отбрасываются - в варианты EXIF не пишется.
+    Возвращает список ImageVariant.
+    """
+    from .models import ImageVariant
+
+    existing = list(ImageVariant.objects.filter(source=source))
+    if existing and not force:
+        return existing
+
+    with default_storage.open(source, "rb") as fh:
+        image = Image.open(fh)
+        image.load()
+
+    image = ImageOps.exif_transpose(image)
+    store_dimensions(source, image.width, image.height)
+
+    if image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA" if "transparency" in image.info else "RGB")
+
+    stem = os.path.splitext(os.path.basename(source))[0]
+    widths = [w for w in WIDTHS if w < image.width] or [image.width]
+
+    variants = []
+    for width in widths:
+        height = round(image.height * width / image.width)
+        resized = image.resize((width, height), Image.Resampling.LANCZOS)
+
+        for fmt, (ext, options) in FORMATS.items():
+            frame = resized
+            if fmt == "jpeg" and frame.mode == "RGBA":
+                frame = frame.convert("RGB")
+
+            buffer = BytesIO()
+            frame.save(buffer, format=fmt.upper(), **options)
+
+            variant = ImageVariant(
+                source=source, format=fmt, width=width, height=height,
+                size=buffer.tell(),
+            )
+            variant.file.save(f"{stem}-{width}.{ext}", ContentFile(buffer.getvalue()), save=False)
+            variants.append(variant)
+
+    with transaction.atomic():
+        for old in existing:
+            old.file.delete(save=False)
+        ImageVariant.objects.filter(source=source).delete()
+        ImageVariant.objects.bulk_create(variants)
+
+    _variants_changed(source)
+    return variants
+
+
+def store_dimensions(source, width, height):
+    """
+    Размеры картинки (уже повёрнутой по EXIF) во всех строках, где она
+    загружена: PostImage и обложки статей. update() - без сигналов.
+    """
+    from .models import Post, PostImage
+
+    PostImage.objects.filter(image=source).update(width=width, height=height)
+    Post.objects.filter(cover_image=source).update(cover_width=width, cover_height=height)
+
+
+def image_size(source):
+    """
+    (width, height) файла из хранилища с учётом поворота по EXIF;
+    читается только заголовок. OSError - файла нет или он не картинка.
+    """
+    with default_storage.open(source, "rb") as fh:
+        image = Image.open(fh)
+        width, height = image.size
+        if image.getexif().get(EXIF_ORIENTATION) in ROTATED:
+            width, height = height, width
+    return width, height
+
+
+def delete_variants(source):
+    """
+    Удалить варианты картинки вместе с файлами. Возвращает освобождённые байты.
+    """
+    from .models import ImageVariant
+
+    freed = 0
+    for variant in ImageVariant.objects.filter(source=source):
+        freed += variant.size
+        variant.file.delete(save=False)
+        variant.delete()
+    return freed
+
+
+def file_checksum(file):
+    """
+    sha256 загружаемого файла по кускам, без чтения целиком в память.
+    """
+    digest = hashlib.sha256()
+    for chunk in file.chunks():
+        digest.update(chunk)
+    file.seek(0)
+    return digest.hexdigest()
+
+
+def _variants_changed(source):
+    # srcset подставляется при отрисовке тела статьи - перерисовать
+    # только тела с этой картинкой, ETag страниц - только если такие были
+    from .conditional import bump_content_version
+    from .render import invalidate_image_bodies
+
+    if invalidate_image_bodies(source):
+        bump_content_version()
+
+
+def _run(source, force):
+    try:
+        generate_variants(source, force=force)
+    except Exception:
+        logger.exception("Не удалось сделать варианты %s", source)
+    finally:
+        close_old_connections()
+
+
+def schedule_variants(source, force=False):
+    """
+    Поставить генерацию в пул потоков после коммита - запрос загрузки
+    не ждёт ресайза.
+    """
+    if source:
+        transaction.on_commit(lambda: _executor.submit(_run, source, force))
+
+
+# ===== SRCSET =====
+
+def variants_for(sources):
+    """
+    {source: {format: [(width, url), ...], "size": (width, height)}}
+    одним запросом; size - размеры самого крупного варианта.
+    """
+    from .models import ImageVariant
+
+    result = {}
+    for variant in ImageVariant.objects.filter(source__in=set(sources)).order_by("width"):
+        item = result.setdefault(variant.source, {})
+        item.setdefault(variant.format, []).append((variant.width, variant.file.url))
+        item["size"] = (variant.width, variant.height)
+    return result
+
+
+def source_from_url(url):
+    """
+    "/media/posts/images/a.jpg" -> "posts/images/a.jpg"; чужие ссылки - None.
+    Не-ASCII имена в адресе %-кодированы (FieldFile.url) - раскодируем.
+    """
+    if not settings.MEDIA_URL or not url.startswith(settings.MEDIA_URL):
+        return None
+    return unquote(url[len(settings.MEDIA_URL):])
+
+
+def srcset(items):
+    return ", ".join(f"{url} {width}w" for width, url in items)
+
+
+def fallback_url(items):
+    """
+    Самый крупный вариант не шире FALLBACK_WIDTH.
+    """
+    suitable = [url for width, url in items if width <= FALLBACK_WIDTH]
+    return suitable[-1] if suitable else items[0][1]
@@ -0,0 +1,92 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from content.images import file_checksum, generate_variants, image_size, store_dimensions
+from content.models import Post, PostImage
+
+
+class Command(BaseCommand):
+    help = (
+        "Размеры, хеши и уменьшенные копии (WebP / JPEG) для уже "
+        "загруженных картинок и обложек"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--force", action="store_true", help="Пересчитать и готовые")
+        parser.add_argument("--workers", type=int, default=settings.IMAGE_WORKERS)
+
+    def handle(self, *args, **options):
+        self.fill_dimensions()
+        self.fill_checksums()
+
+        sources = set(
+            PostImage.objects.exclude(image="").values_list("image", flat=True)
+        )
+        sources |= set(
+            Post.objects.exclude(cover_image="")
+            .exclude(cover_image__isnull=True)
+            .values_list("cover_image", flat=True)
+        )
+
+        def run(source):
+            try:
+                return source, len(generate_variants(source, force=options["force"])), None
+            except Exception as exc:
+                return source, 0, exc
+
+        done = failed = 0
+        with ThreadPoolExecutor(max_workers=options["workers"]) as pool:
+            for source, count, error in pool.map(run, sorted(sources)):
+                if error:
+                    failed += 1
+                    self.stderr.write(f"{source}: {error}")
+                else:
+                    done += 1
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Картинок обработано: {done}, с ошибками: {failed}"
+        ))
+
+    def fill_dimensions(self):
+        # строки, загруженные до появления колонок; файла может уже не быть
+        sources = set(
+            PostImage.objects.filter(width__isnull=True)
+            .exclude(image="").values_list("image", flat=True)
+        )
+        sources |= set(
+            Post.objects.filter(cover_width__isnull=True)
+            .exclude(cover_image="").exclude(cover_image__isnull=True)
+            .values_list("cover_image", flat=True)
+        )
+
+        for source in sorted(sources):
+            try:
+                width, height = image_size(source)
+            except OSError as exc:
+                self.stderr.write(f"{source}: {exc}")
+                continue
+
+            store_dimensions(source, width, height)
+
+    def fill_checksums(self):
+        # хеши старых загрузок - чтобы повторная загрузка их находила
+        batch = []
+        images = PostImage.objects.filter(checksum="").exclude(image="").only("id", "image")
+
+        for image in images.iterator(chunk_size=500):
+            try:
+                with image.image.open("rb") as fh:
+                    image.checksum = file_checksum(fh)
+            except OSError as exc:
+                self.stderr.write(f"{image.image.name}: {exc}")
+                continue
+
+            batch.append(image)
+            if len(batch) >= 500:
+                PostImage.objects.bulk_update(batch, ["checksum"])
+                batch = []
+
+        if batch:
+            PostImage.objects.bulk_update(batch, ["checksum"])
@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+
+from content.models import PostRevision
+from content.revisions import iter_contents
+
+
+class Command(BaseCommand):
+    help = "Заполняет plain_text / word_count / excerpt у существующих версий статей"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Пересчитать все версии, а не только незаполненные",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+
+        qs = PostRevision.objects.all()
+        if not options["all"]:
+            qs = qs.filter(plain_text="")
+
+        batch = []
+        total = 0
+        for revision, content in iter_contents(qs):
+            if not content and not options["all"]:
+                continue
+
+            revision._content = content
+            revision.fill_text()
+            batch.append(revision)
+
+            if len(batch) >= batch_size:
+                PostRevision.objects.bulk_update(batch, ["plain_text", "word_count", "excerpt"])
+                total += len(batch)
+                batch = []
+
+        if batch:
+            PostRevision.objects.bulk_update(batch, ["plain_text", "word_count", "excerpt"])
+            total += len(batch)
+
+        self.stdout.write(self.style.SUCCESS(f"Обновлено версий: {total}"))
@@ -0,0 +1,90 @@
+import random
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.core.paginator import Paginator
+from django.db import transaction
+from django.db.models.functions import Coalesce
+from django.http import QueryDict
+from django.utils import timezone
+
+from content.models import Post, Section
+from content.pagination import KeysetPaginator
+
+
+PER_PAGE = 5
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Время страниц главной ленты: прежняя сортировка по выражению с OFFSET "
+        "против feed_at с ключевыми страницами (все данные откатываются)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--posts", type=int, default=50000)
+        parser.add_argument("--pages", type=int, nargs="+", default=[1, 100])
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.run(options)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def run(self, options):
+        rnd = random.Random(42)
+        section = Section.objects.create(title="benchmark")
+        now = timezone.now()
+
+        posts = []
+        for i in range(options["posts"]):
+            moment = now - timedelta(minutes=rnd.randint(0, 60 * 24 * 365))
+            posts.append(Post(
+                section=section,
+                title=f"benchmark {i}",
+                slug=f"benchmark-feed-{i}",
+                status=rnd.choice([Post.Status.PUBLISHED] * 4 + [Post.Status.DRAFT]),
+                published_at=moment,
+                feed_at=moment,
+            ))
+        Post.objects.bulk_create(posts, batch_size=2000)
+        # updated_at (auto_now) у всех одинаковый - разводим, как в живой базе
+        Post.objects.filter(section=section).update(updated_at=Coalesce("feed_at", "published_at"))
+
+        published = Post.objects.filter(status=Post.Status.PUBLISHED).select_related("section", "author")
+        old = published.order_by(Coalesce("updated_at", "published_at").desc())
+        new = KeysetPaginator(published.order_by("-feed_at"), PER_PAGE)
+
+        self.stdout.write(f"статей: {options['posts']}, опубликовано: {published.count()}")
+
+        for number in options["pages"]:
+            self.report(f"OFFSET, страница {number}", options["repeat"], lambda: list(
+                Paginator(old, PER_PAGE).get_page(number)
+            ))
+
+            # курсор страницы number-1 - пользователь дошёл до неё по ссылкам
+            params = QueryDict(mutable=True)
+            if number > 1:
+                boundary = published.order_by("-feed_at", "-id")[(number - 1) * PER_PAGE - 1]
+                params["after"] = new._cursor(boundary)
+
+            self.report(f"keyset, страница {number}", options["repeat"], lambda: list(
+                new.get_page(params)
+            ))
+
+    def report(self, label, repeat, fetch):
+        elapsed = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            fetch()
+            elapsed.append(time.perf_counter() - started)
+
+        self.stdout.write(f"{label:<24} {min(elapsed) * 1000:8.2f} мс")
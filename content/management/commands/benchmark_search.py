@@ -0,0 +1,107 @@
+import random
+import time
+from itertools import accumulate
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from content.models import Post, PostRevision, Section
+from content.search.base import LikeSearchBackend
+from content.search.index import InvertedIndexBackend
+
+
+WORDS = (
+    "стойка столб шаг удар ладонь кулак дыхание разминка практика техника "
+    "учитель ученик форма связка пять стихий двенадцать животных тайцзи "
+    "синьи цюань сила корень равновесие движение тело ноги руки спина "
+    "внимание намерение энергия занятие упражнение повторение основа"
+).split()
+
+QUERIES = ("столб", "разминка дыхание", '"пять стихий"', "учитель OR ученик", "равнове")
+
+SYLLABLES = "ба ве ги до жу зы ка ле ми но пу ро са ту фи ха це чу ша ю".split()
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Сравнивает встроенный индекс с поиском через icontains "
+        "на синтетических статьях (все данные откатываются)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--posts", type=int, default=10000)
+        parser.add_argument("--words", type=int, default=600)
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.run(options)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def run(self, options):
+        rnd = random.Random(42)
+        section = Section.objects.create(title="benchmark")
+
+        # словарь с распределением Ципфа: частые слова и длинный хвост редких
+        vocabulary = WORDS + [
+            "".join(rnd.choices(SYLLABLES, k=rnd.randint(2, 4)))
+            for _ in range(20000)
+        ]
+        weights = list(accumulate(1 / rank for rank in range(1, len(vocabulary) + 1)))
+        rnd.shuffle(vocabulary)
+
+        def text(k):
+            return " ".join(rnd.choices(vocabulary, cum_weights=weights, k=k))
+
+        posts = Post.objects.bulk_create(
+            Post(
+                section=section,
+                title=text(4),
+                slug=f"benchmark-{i}",
+                status=Post.Status.PUBLISHED,
+            )
+            for i in range(options["posts"])
+        )
+        revisions = [
+            PostRevision(post=post, content=f"<p>{text(options['words'])}</p>")
+            for post in posts
+        ]
+        for revision in revisions:
+            revision.fill_text()
+        PostRevision.objects.bulk_create(revisions, batch_size=1000)
+        for post, revision in zip(posts, revisions):
+            post.current_revision = revision
+        Post.objects.bulk_update(posts, ["current_revision"], batch_size=1000)
+
+        index = InvertedIndexBackend()
+
+        started = time.perf_counter()
+        index.rebuild(Post.objects.select_related("current_revision").order_by("pk"))
+        self.stdout.write(
+            f"индексация {len(posts)} статей: {time.perf_counter() - started:.1f} с"
+        )
+
+        base = Post.objects.filter(status=Post.Status.PUBLISHED)
+
+        for backend in (LikeSearchBackend(), index):
+            for query in QUERIES:
+                elapsed = []
+                for _ in range(options["repeat"]):
+                    started = time.perf_counter()
+                    list(
+                        backend.search(base, query, prefix=True)
+                        .order_by("-search_rank")[:5]
+                    )
+                    elapsed.append(time.perf_counter() - started)
+
+                self.stdout.write(
+                    f"{type(backend).__name__:<22} {query!r:<24} "
+                    f"{min(elapsed) * 1000:8.1f} мс"
+                )
@@ -0,0 +1,45 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from content.utils.snippet import make_snippet, term_bases
+
+
+WORDS = (
+    "стойка столб шаг удар ладонь кулак дыхание разминка практика техника "
+    "учитель ученик форма связка пять стихий двенадцать животных тайцзи "
+    "синьи цюань сила корень равновесие движение тело ноги руки спина "
+    "внимание намерение энергия занятие упражнение повторение основа"
+).split()
+
+QUERIES = ("столбом", "пять стихий", "дыхание корень равновесие", "нет-такого-слова")
+
+
+class Command(BaseCommand):
+    help = "Время make_snippet на результат для ответа search_api из 5 длинных статей"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--words", type=int, default=20000)
+        parser.add_argument("--repeat", type=int, default=200)
+
+    def handle(self, *args, **options):
+        rnd = random.Random(42)
+        texts = [
+            " ".join(rnd.choices(WORDS + [f"слово{i}" for i in range(2000)], k=options["words"]))
+            for _ in range(5)
+        ]
+
+        for query in QUERIES:
+            term_bases.cache_clear()
+
+            started = time.perf_counter()
+            for _ in range(options["repeat"]):
+                for text in texts:
+                    make_snippet(text, query)
+            elapsed = time.perf_counter() - started
+
+            per_result = elapsed / (options["repeat"] * len(texts)) * 1_000_000
+            self.stdout.write(f"{query!r:<32} {per_result:8.1f} мкс на результат")
+
+        self.stdout.write(f"кеш основ: {term_bases.cache_info()}")
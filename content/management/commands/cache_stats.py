@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from content.cache import all_namespaces
+
+
+class Command(BaseCommand):
+    help = "Попадания в L1 / L2 и промахи общего кеша по пространствам (сумма по всем воркерам)"
+
+    def handle(self, *args, **options):
+        for name, ns in sorted(all_namespaces().items()):
+            stats = ns.shared_stats()
+            total = sum(stats.values())
+            hit_rate = (stats["l1_hits"] + stats["l2_hits"]) / total * 100 if total else 0
+
+            self.stdout.write(
+                f"{name:<16} L1 {stats['l1_hits']:>8}  L2 {stats['l2_hits']:>8}  "
+                f"промахи {stats['misses']:>8}  попадания {hit_rate:5.1f}%"
+            )
@@ -0,0 +1,147 @@
+import os
+import re
+from datetime import timedelta
+from urllib.parse import unquote
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from content.images import delete_variants
+from content.models import ImageVariant, Post, PostImage, PostRevision
+from content.revisions import iter_contents
+
+
+# каталоги media, где живут загрузки и варианты
+UPLOAD_DIRS = ("posts/images", "posts/covers", "variants")
+
+BATCH_SIZE = 500
+
+
+class Command(BaseCommand):
+    help = (
+        "Удаляет картинки, на которые не ссылается ни одна версия статьи, "
+        "и файлы в media без строки в базе; старше --grace-days"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--grace-days", type=int, default=7)
+        parser.add_argument("--dry-run", action="store_true", help="Только посчитать")
+
+    def handle(self, *args, **options):
+        self.verbosity = options["verbosity"]
+        self.dry_run = options["dry_run"]
+        self.cutoff = timezone.now() - timedelta(days=options["grace_days"])
+        self.freed = 0
+        self.deleted = 0
+
+        referenced = self.referenced_sources()
+        self.collect_rows(referenced)
+        self.collect_files(referenced)
+
+        verb = "Можно освободить" if self.dry_run else "Освобождено"
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb}: {self.freed / 1024 / 1024:.1f} МБ, файлов: {self.deleted}"
+        ))
+
+    def referenced_sources(self):
+        """
+        Один проход по HTML всех версий (включая старые - их можно
+        восстановить) кусками: множество имён файлов из media.
+        Ссылки в HTML закодированы (FieldFile.url квотирует не-ASCII имена) -
+        сравниваем с именами в storage после unquote.
+        """
+        pattern = re.compile(
+            re.escape(settings.MEDIA_URL) + r"""([^"'\s<>?#)]+)"""
+        )
+
+        referenced = set()
+        for _, content in iter_contents(PostRevision.objects.all()):
+            referenced.update(map(unquote, pattern.findall(content)))
+
+        return referenced
+
+    def collect_rows(self, referenced):
+        """
+        Непривязанные PostImage, на которые ничто не ссылается.
+        """
+        orphans = (
+            PostImage.objects
+            .filter(post__isnull=True, uploaded_at__lt=self.cutoff)
+            .only("id", "image")
+            .order_by("pk")
+        )
+
+        for image in orphans.iterator(chunk_size=BATCH_SIZE):
+            name = image.image.name
+            if name in referenced:
+                continue
+
+            self.report(name, self.file_size(name))
+
+            # варианты удаляются вместе с исходником
+            sizes = list(ImageVariant.objects.filter(source=name).values_list("size", flat=True))
+            self.freed += sum(sizes)
+            self.deleted += len(sizes)
+
+            if not self.dry_run:
+                delete_variants(name)
+                image.image.delete(save=False)
+                image.delete()
+
+    def collect_files(self, referenced):
+        """
+        Файлы без строки в базе (остатки удалённых строк, сбои загрузки),
+        на которые не ссылается ни одна версия.
+        Каталог читается потоком, имена сверяются с базой пачками -
+        память не зависит от размера media.
+        """
+        for directory in UPLOAD_DIRS:
+            root = os.path.join(settings.MEDIA_ROOT, directory)
+            if not os.path.isdir(root):
+                continue
+
+            batch = []
+            for entry in os.scandir(root):
+                if not entry.is_file():
+                    continue
+
+                stat = entry.stat()
+                if stat.st_mtime > self.cutoff.timestamp():
+                    continue
+
+                batch.append((f"{directory}/{entry.name}", stat.st_size))
+                if len(batch) >= BATCH_SIZE:
+                    self.collect_batch(batch, referenced)
+                    batch = []
+
+            if batch:
+                self.collect_batch(batch, referenced)
+
+    def collect_batch(self, batch, referenced):
+        names = [name for name, _ in batch]
+
+        known = set(PostImage.objects.filter(image__in=names).values_list("image", flat=True))
+        known |= set(Post.objects.filter(cover_image__in=names).values_list("cover_image", flat=True))
+        known |= set(ImageVariant.objects.filter(file__in=names).values_list("file", flat=True))
+
+        for name, size in batch:
+            if name in known or name in referenced:
+                continue
+
+            self.report(name, size)
+            if not self.dry_run:
+                default_storage.delete(name)
+
+    def report(self, name, size):
+        self.freed += size
+        self.deleted += 1
+        if self.verbosity > 1:
+            self.stdout.write(f"  {name} ({size} байт)")
+
+    def file_size(self, name):
+        try:
+            return default_storage.size(name)
+        except OSError:
+            return 0
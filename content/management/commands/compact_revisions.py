@@ -0,0 +1,116 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Count
+
+from content.conditional import bump_content_version
+from content.diff import invalidate_diffs
+from content.models import Post, PostRevision
+from content.revisions import iter_contents, rechain, retained
+
+
+class Command(BaseCommand):
+    help = (
+        "Чистит историю версий: остаются снимки публикаций, текущая версия, "
+        "последние REVISION_KEEP_DRAFTS черновиков и по одной версии за день"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument("--dry-run", action="store_true", help="Только посчитать")
+
+    def handle(self, *args, **options):
+        self.batch_size = options["batch_size"]
+        self.dry_run = options["dry_run"]
+
+        # статьи, где черновиков не больше лимита, не трогаем
+        post_ids = (
+            PostRevision.objects
+            .values("post_id")
+            .annotate(total=Count("id"))
+            .filter(total__gt=getattr(settings, "REVISION_KEEP_DRAFTS", 20))
+            .values_list("post_id", flat=True)
+            .order_by("post_id")
+        )
+
+        posts = deleted = 0
+        for post_id in post_ids:
+            count = self.compact(post_id)
+            if count:
+                posts += 1
+                deleted += count
+
+            if count and options["verbosity"] > 1:
+                self.stdout.write(f"  статья {post_id}: удалено версий {count}")
+
+        verb = "Можно удалить" if self.dry_run else "Удалено"
+        self.stdout.write(self.style.SUCCESS(f"{verb} версий: {deleted} (статей: {posts})"))
+
+    def compact(self, post_id):
+        # короткая транзакция на статью: пересобрать цепочку оставшихся
+        # и отвязать удаляемые; сами DELETE - отдельными пачками
+        with transaction.atomic():
+            current_id = (
+                Post.objects.select_for_update()
+                .filter(pk=post_id)
+                .values_list("current_revision_id", flat=True)
+                .first()
+            )
+            items = list(
+                PostRevision.objects
+                .filter(post_id=post_id)
+                .only("id", "is_published_snapshot", "created_at")
+                .order_by("pk")
+            )
+            keep = retained(items, current_id)
+            doomed = [revision.pk for revision in items if revision.pk not in keep]
+
+            if not doomed or self.dry_run:
+                return len(doomed)
+
+            self.rechain_kept(keep, min(doomed))
+
+            # удаляемые больше не база ни для кого
+            PostRevision.objects.filter(pk__in=doomed).update(
+                storage=PostRevision.Storage.RAW, raw_content="", data=None,
+                keyframe=None, base=None, chain_index=0,
+            )
+
+        for start in range(0, len(doomed), self.batch_size):
+            with transaction.atomic():
+                self.delete_batch(doomed[start:start + self.batch_size])
+
+        return len(doomed)
+
+    def delete_batch(self, pks):
+        """
+        DELETE без сигналов на строку: цепочка уже пересобрана, а
+        сброс кешей по каждой версии - тысячи событий шины на большой
+        чистке. Вместо них - одно событие сравнений и одно ETag на пачку.
+        Тела удалённых версий в кеше никто не запросит (id не
+        переиспользуются) - они истекут сами.
+        """
+        table = connection.ops.quote_name(PostRevision._meta.db_table)
+        column = connection.ops.quote_name(PostRevision._meta.pk.column)
+        placeholders = ", ".join(["%s"] * len(pks))
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {table} WHERE {column} IN ({placeholders})", pks)
+
+        transaction.on_commit(invalidate_diffs)
+        transaction.on_commit(bump_content_version)
+
+    def rechain_kept(self, keep, first_doomed):
+        """
+        Версии до первой удаляемой ни от чего удаляемого не зависят;
+        остальные оставшиеся перекодируются цепочкой от последней из них.
+        """
+        base = base_text = None
+        later = []
+
+        for revision, text in iter_contents(PostRevision.objects.filter(pk__in=keep)):
+            if revision.pk < first_doomed:
+                base, base_text = revision, text
+            else:
+                later.append((revision, text))
+
+        rechain(later, base, base_text or "")
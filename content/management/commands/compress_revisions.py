@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from content.models import PostRevision
+from content.revisions import iter_contents, rechain, stored_size
+
+
+class Command(BaseCommand):
+    help = (
+        "Переводит историю версий в сжатое хранение: опорные кадры и дельты. "
+        "--all перекодирует и уже сжатые статьи (после смены REVISION_KEYFRAME_EVERY)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--all", action="store_true", help="Все статьи, а не только с несжатыми версиями")
+        parser.add_argument("--dry-run", action="store_true", help="Только посчитать")
+
+    def handle(self, *args, **options):
+        revisions = PostRevision.objects.all()
+        if not options["all"]:
+            revisions = revisions.filter(storage=PostRevision.Storage.RAW)
+
+        post_ids = list(revisions.values_list("post_id", flat=True).distinct().order_by("post_id"))
+
+        before = after = count = 0
+        for post_id in post_ids:
+            # статья целиком в одной транзакции - цепочка не бывает наполовину старой
+            with transaction.atomic():
+                items = list(iter_contents(
+                    PostRevision.objects.filter(post_id=post_id).select_for_update()
+                ))
+                before += sum(stored_size(revision) for revision, _ in items)
+
+                rechain(items, save=not options["dry_run"])
+                after += sum(stored_size(revision) for revision, _ in items)
+                count += len(items)
+
+            if options["verbosity"] > 1:
+                self.stdout.write(f"  статья {post_id}: версий {len(items)}")
+
+        saved = before - after
+        percent = saved / before * 100 if before else 0
+        verb = "Можно сэкономить" if options["dry_run"] else "Сэкономлено"
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Статей: {len(post_ids)}, версий: {count}. "
+            f"Было {before / 1024:.1f} КБ, стало {after / 1024:.1f} КБ. "
+            f"{verb}: {saved / 1024:.1f} КБ ({percent:.0f}%)"
+        ))
@@ -0,0 +1,275 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, time
+from itertools import batched
+
+import django
+import markdown
+import yaml
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from content.conditional import bump_content_version
+from content.models import Post, PostRevision, Section
+from content.search import get_search_backend
+from content.tree import invalidate_subtree_posts
+from content.utils.html import clean_html
+from content.utils.slug import SlugAllocator, slug_base
+from content.utils.text import html_to_text, make_excerpt
+
+
+EXTENSIONS = {".html", ".htm", ".md", ".markdown"}
+
+# front-matter: дата публикации - published или date
+DATE_KEYS = ("created", "updated", "published", "date")
+
+
+def iter_files(root):
+    # обход по одному каталогу - список всего архива в памяти не держим
+    for directory, dirs, files in os.walk(root):
+        dirs.sort()
+        for name in sorted(files):
+            if os.path.splitext(name)[1].lower() in EXTENSIONS:
+                yield os.path.join(directory, name)
+
+
+def split_front_matter(text):
+    if not text.startswith("---"):
+        return {}, text
+
+    head, sep, body = text[3:].partition("\n---")
+    if not sep:
+        return {}, text
+
+    meta = yaml.safe_load(head) or {}
+    if not isinstance(meta, dict):
+        raise ValueError("front-matter должен быть словарём")
+
+    # остаток строки-разделителя
+    return meta, body.partition("\n")[2]
+
+
+def to_datetime(value):
+    if value is None or value == "":
+        return None
+
+    if isinstance(value, str):
+        parsed = parse_datetime(value)
+        if parsed is None:
+            parsed = datetime.combine(date.fromisoformat(value), time())
+        value = parsed
+    elif not isinstance(value, datetime):
+        value = datetime.combine(value, time())
+
+    if timezone.is_naive(value):
+        value = timezone.make_aware(value)
+
+    return value
+
+
+def read_article(path):
+    """
+    Разбор одного файла в процессе пула: front-matter, Markdown -> HTML,
+    clean_html и текст без разметки. Возвращает (path, article, error).
+    """
+    try:
+        with open(path, encoding="utf-8") as file:
+            meta, body = split_front_matter(file.read())
+
+        if os.path.splitext(path)[1].lower() in (".md", ".markdown"):
+            body = markdown.markdown(body, extensions=["extra"])
+
+        content = clean_html(body).strip()
+        if not content:
+            raise ValueError("текст статьи пуст")
+
+        title = str(meta.get("title") or "").strip()
+        if not title:
+            raise ValueError("нет title")
+
+        section = str(meta.get("section") or "").strip("/ ")
+        if not section:
+            raise ValueError("нет section")
+
+        status = meta.get("status") or Post.Status.PUBLISHED
+        if status not in Post.Status.values:
+            raise ValueError(f"неизвестный status: {status}")
+
+        dates = {key: to_datetime(meta.get(key)) for key in DATE_KEYS}
+        plain_text = html_to_text(content)
+    except Exception as exc:
+        return path, None, str(exc)
+
+    return path, {
+        "title": title[:255],
+        "slug": str(meta.get("slug") or ""),
+        "summary": str(meta.get("summary") or ""),
+        "section": section,
+        "status": status,
+        "created": dates["created"],
+        "updated": dates["updated"],
+        "published": dates["published"] or dates["date"],
+        "content": content,
+        "plain_text": plain_text,
+        "word_count": len(plain_text.split()),
+        "excerpt": make_excerpt(plain_text),
+    }, None
+
+
+class Command(BaseCommand):
+    help = (
+        "Импорт архива статей из каталога HTML/Markdown файлов с YAML "
+        "front-matter (section, title, status, created/updated/published). "
+        "Вставка пачками bulk_create: сигналы не срабатывают, уведомления "
+        "не рассылаются"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("directory")
+        parser.add_argument("--author", help="username автора статей и версий")
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument("--workers", type=int, default=os.cpu_count())
+
+    def handle(self, *args, **options):
+        if not os.path.isdir(options["directory"]):
+            raise CommandError(f"Нет каталога {options['directory']}")
+
+        self.verbosity = options["verbosity"]
+        self.author = None
+        if options["author"]:
+            User = get_user_model()
+            try:
+                self.author = User.objects.get(username=options["author"])
+            except User.DoesNotExist:
+                raise CommandError(f"Нет пользователя {options['author']}")
+
+        self.sections = self.load_sections()
+        self.slugs = SlugAllocator(Post)
+        self.search = get_search_backend()
+        self.imported = 0
+        self.failed = 0
+
+        files = iter_files(options["directory"])
+
+        # workers читают следующую пачку, пока текущая пишется в базу
+        with ProcessPoolExecutor(options["workers"], initializer=django.setup) as pool:
+            pending = None
+            for paths in batched(files, options["batch_size"]):
+                parsed = pool.map(read_article, paths, chunksize=16)
+                if pending is not None:
+                    self.import_batch(pending)
+                pending = parsed
+
+            if pending is not None:
+                self.import_batch(pending)
+
+        # сигналы не срабатывали - сбрасываем кеши разом
+        invalidate_subtree_posts()
+        bump_content_version()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Импортировано статей: {self.imported}, пропущено: {self.failed}"
+        ))
+
+    def load_sections(self):
+        """
+        Путь из slug-ов от корня ("taiji/bazovye") -> id раздела, одним запросом.
+        """
+        rows = {
+            pk: (slug, parent_id)
+            for pk, slug, parent_id in Section.objects.values_list("pk", "slug", "parent_id")
+        }
+
+        sections = {}
+        for pk in rows:
+            parts = []
+            current = pk
+            while current is not None:
+                slug, current = rows[current]
+                parts.append(slug)
+            sections["/".join(reversed(parts))] = pk
+
+        return sections
+
+    def import_batch(self, parsed):
+        articles = []
+        for path, article, error in parsed:
+            if article is not None and article["section"] not in self.sections:
+                error = f"нет раздела {article['section']}"
+
+            if error:
+                self.failed += 1
+                self.stderr.write(f"{path}: {error}")
+            else:
+                articles.append(article)
+
+        if not articles:
+            return
+
+        now = timezone.now()
+        bases = [slug_base(article["slug"] or article["title"], "post") for article in articles]
+        self.slugs.load(bases)
+
+        posts = []
+        revisions = []
+        dates = []
+        for article, base in zip(articles, bases):
+            published = article["status"] == Post.Status.PUBLISHED
+            published_at = article["published"] or (
+                (article["created"] or now) if published else None
+            )
+            created_at = article["created"] or published_at or now
+            updated_at = article["updated"] or created_at
+            dates.append((created_at, updated_at))
+
+            posts.append(Post(
+                section_id=self.sections[article["section"]],
+                title=article["title"],
+                slug=self.slugs.allocate(base),
+                summary=article["summary"],
+                status=article["status"],
+                author=self.author,
+                published_at=published_at,
+                created_at=created_at,
+                updated_at=updated_at,
+                feed_at=updated_at,
+            ))
+
+            revision = PostRevision(
+                created_by=self.author,
+                note="Импорт",
+                is_published_snapshot=published,
+                created_at=updated_at,
+                plain_text=article["plain_text"],
+                word_count=article["word_count"],
+                excerpt=article["excerpt"],
+            )
+            revision.content = article["content"]
+            revisions.append(revision)
+
+        with transaction.atomic():
+            Post.objects.bulk_create(posts)
+
+            for post, revision in zip(posts, revisions):
+                revision.post = post
+            PostRevision.objects.bulk_create(revisions)
+
+            # bulk_create проставил auto_now/auto_now_add - возвращаем даты
+            # архива вместе со ссылкой на версию
+            for post, revision, (created_at, updated_at) in zip(posts, revisions, dates):
+                post.created_at, post.updated_at = created_at, updated_at
+                post.current_revision = revision
+                revision.created_at = updated_at
+
+            Post.objects.bulk_update(posts, ["current_revision", "created_at", "updated_at"])
+            PostRevision.objects.bulk_update(revisions, ["created_at"])
+
+            self.search.index_posts(posts)
+
+        self.imported += len(posts)
+
+        if self.verbosity > 1:
+            self.stdout.write(f"  импортировано: {self.imported}")
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from content.models import Post
+from content.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = "Полностью перестраивает поисковый индекс статей"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+
+        posts = Post.objects.select_related("current_revision").order_by("pk")
+        total = backend.rebuild(posts, batch_size=options["batch_size"])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{type(backend).__name__}: проиндексировано статей - {total}"
+        ))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from content.models import UserProfile
+from content.notifications import DIGEST_MODES, build_digests
+
+
+class Command(BaseCommand):
+    help = (
+        "Сводки уведомлений: по одному письму на подписчика за окно. "
+        "Запускать по расписанию: send_digests hourly - каждый час, "
+        "send_digests daily - раз в день. Письма отправляет send_outbox."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("mode", choices=[mode.value for mode in DIGEST_MODES])
+
+    def handle(self, *args, **options):
+        mode = UserProfile.DigestMode(options["mode"])
+        created = build_digests(mode)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Сводка «{mode.label}»: писем в очереди {created}"
+        ))
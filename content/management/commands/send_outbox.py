@@ -0,0 +1,78 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from content.notifications import claim, expand_events, outbox_stats, send_batch
+
+
+class Command(BaseCommand):
+    help = "Воркер рассылки: разворачивает события в письма и отправляет очередь OutboxMessage"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=settings.EMAIL_BATCH_SIZE)
+        parser.add_argument(
+            "--rate",
+            type=int,
+            default=settings.EMAIL_RATE_PER_MINUTE,
+            help="Писем в минуту (0 - без ограничения)",
+        )
+        parser.add_argument("--idle", type=float, default=5, help="Пауза при пустой очереди, сек")
+        parser.add_argument("--once", action="store_true", help="Разобрать очередь и выйти")
+        parser.add_argument("--stats", action="store_true", help="Показать состояние очереди и выйти")
+
+    def handle(self, *args, **options):
+        if options["stats"]:
+            self.write_stats()
+            return
+
+        batch_size = options["batch_size"]
+        rate = options["rate"]
+
+        # аренда с запасом на время отправки всей пачки
+        lease = timedelta(seconds=60 + (batch_size * 60 / rate if rate else 0))
+
+        total_sent = total_failed = 0
+        started = time.monotonic()
+
+        while True:
+            created = expand_events()
+            if created:
+                self.stdout.write(f"Поставлено в очередь писем: {created}")
+
+            messages = claim(batch_size, lease)
+
+            if messages:
+                sent, failed = send_batch(messages, rate=rate)
+                total_sent += sent
+                total_failed += failed
+
+                elapsed = time.monotonic() - started
+                self.stdout.write(
+                    f"Отправлено {sent}, ошибок {failed}; "
+                    f"всего {total_sent} ({total_sent / elapsed * 60:.0f} в минуту)"
+                )
+                continue
+
+            if created:
+                continue
+
+            if options["once"]:
+                break
+
+            time.sleep(options["idle"])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Готово: отправлено {total_sent}, ошибок {total_failed}"
+        ))
+        self.write_stats()
+
+    def write_stats(self):
+        stats = outbox_stats()
+        self.stdout.write(
+            "Очередь: {pending} ждут (к отправке сейчас {due}), "
+            "{failed} не отправлены, событий не разобрано {events}, "
+            "статей ждут сводки {digest_items}; "
+            "отправлено за минуту {sent_last_minute}, за час {sent_last_hour}".format(**stats)
+        )
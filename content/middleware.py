@@ -1,6 +1,8 @@
 from django.shortcuts import redirect
 from django.conf import settings
 
+from . import bus
+
 class LoginRequiredMiddleware:
     def __init__(self, get_response):
         self.get_response = get_response
@@ -36,3 +38,17 @@ class LoginRequiredMiddleware:
             return redirect('/main/')
 
         return self.get_response(request)
+
+
+class InvalidationMiddleware:
+    """
+    В начале запроса применяет события шины инвалидации: кеши в памяти
+    этого процесса сбрасывают ключи, изменённые в других воркерах.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        bus.poll()
+        return self.get_response(request)
@@ -0,0 +1,46 @@
+# Generated by Django 6.0.1 on 2026-10-17 15:32
+
+from django.db import migrations, models
+
+
+def build_tree_index(apps, schema_editor):
+    Section = apps.get_model("content", "Section")
+
+    sections = list(Section.objects.only("id", "parent_id"))
+    by_parent = {}
+    for s in sections:
+        by_parent.setdefault(s.parent_id, []).append(s)
+
+    # обход от корней: у родителя path уже посчитан
+    stack = [(s, "", 0) for s in by_parent.get(None, [])]
+    while stack:
+        node, prefix, depth = stack.pop()
+        node.path = f"{prefix}{node.pk}/"
+        node.depth = depth
+        stack.extend(
+            (child, node.path, depth + 1)
+            for child in by_parent.get(node.pk, [])
+        )
+
+    Section.objects.bulk_update(sections, ["path", "depth"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('content', '0023_bookmark'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='section',
+            name='depth',
+            field=models.PositiveSmallIntegerField(db_index=True, default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='section',
+            name='path',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=255),
+        ),
+        migrations.RunPython(build_tree_index, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 6.0.1 on 2026-10-17 15:34
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    # GIN и to_tsvector есть только в PostgreSQL
+    if schema_editor.connection.vendor != "postgresql":
+        return
+
+    schema_editor.execute(
+        "CREATE INDEX IF NOT EXISTS content_post_search_vector_gin "
+        "ON content_post USING gin (search_vector)"
+    )
+    schema_editor.execute(
+        """
+        UPDATE content_post p SET search_vector =
+            setweight(to_tsvector('russian', coalesce(p.title, '')), 'A') ||
+            setweight(to_tsvector('russian', coalesce(p.summary, '')), 'B') ||
+            setweight(to_tsvector('russian', coalesce(r.content, '')), 'C')
+        FROM content_postrevision r
+        WHERE r.id = p.current_revision_id
+        """
+    )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+
+    schema_editor.execute("DROP INDEX IF EXISTS content_post_search_vector_gin")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('content', '0024_section_tree_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
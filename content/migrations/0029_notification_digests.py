@@ -0,0 +1,32 @@
+# Generated by Django 6.0.1 on 2026-10-17 15:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('content', '0028_notification_outbox'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='digest_mode',
+            field=models.CharField(choices=[('immediate', 'Сразу'), ('hourly', 'Раз в час'), ('daily', 'Раз в день')], db_index=True, default='immediate', max_length=10, verbose_name='Как присылать уведомления'),
+        ),
+        migrations.CreateModel(
+            name='DigestItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mode', models.CharField(choices=[('immediate', 'Сразу'), ('hourly', 'Раз в час'), ('daily', 'Раз в день')], max_length=10)),
+                ('kind', models.CharField(choices=[('new_post', 'Новая публикация'), ('post_update', 'Обновление статьи')], max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='digest_items', to='content.post')),
+            ],
+            options={
+                'unique_together': {('mode', 'post')},
+            },
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 6.0.1 on 2026-10-17 16:03
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('content', '0031_image_variants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='postimage',
+            name='checksum',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='postimage',
+            name='uploaded_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 6.0.1 on 2026-10-17 16:07
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('content', '0032_image_checksum'),
+    ]
+
+    operations = [
+        # столбец остаётся прежним - меняется только имя поля
+        migrations.AlterField(
+            model_name='postrevision',
+            name='content',
+            field=models.TextField(blank=True, db_column='content', editable=False),
+        ),
+        migrations.RenameField(
+            model_name='postrevision',
+            old_name='content',
+            new_name='raw_content',
+        ),
+        migrations.AddField(
+            model_name='postrevision',
+            name='base',
+            field=models.ForeignKey(blank=True, db_constraint=False, editable=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='content.postrevision'),
+        ),
+        migrations.AddField(
+            model_name='postrevision',
+            name='chain_index',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='postrevision',
+            name='data',
+            field=models.BinaryField(null=True),
+        ),
+        migrations.AddField(
+            model_name='postrevision',
+            name='keyframe',
+            field=models.ForeignKey(blank=True, db_constraint=False, editable=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='content.postrevision'),
+        ),
+        migrations.AddField(
+            model_name='postrevision',
+            name='storage',
+            field=models.CharField(choices=[('raw', 'Без сжатия'), ('keyframe', 'Опорный кадр'), ('delta', 'Дельта')], default='raw', editable=False, max_length=10),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 6.0.1 on 2026-10-17 16:14
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def create_section_index(apps, schema_editor):
+    # порядок ленты раздела (pagination.py); NULLS LAST в индексе
+    # SQLite не поддерживает
+    if schema_editor.connection.vendor != "postgresql":
+        return
+
+    schema_editor.execute(
+        "CREATE INDEX IF NOT EXISTS content_post_section_keyset "
+        "ON content_post (section_id, is_featured, \"order\", "
+        "published_at DESC NULLS LAST, created_at DESC, id DESC)"
+    )
+
+
+def drop_section_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+
+    schema_editor.execute("DROP INDEX IF EXISTS content_post_section_keyset")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('content', '0033_revision_storage'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='bookmark',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='content_boo_user_id_24f09c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['-updated_at', '-id'], name='content_pos_updated_51248f_idx'),
+        ),
+        migrations.RunPython(create_section_index, drop_section_index),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 6.0.1 on 2026-10-17 16:15
+
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def fill_feed_at(apps, schema_editor):
+    # тот же порядок, что давала прежняя сортировка ленты
+    Post = apps.get_model("content", "Post")
+    Post.objects.update(feed_at=Coalesce("updated_at", "published_at"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('content', '0034_keyset_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='feed_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False, verbose_name='В ленте с'),
+        ),
+        migrations.RunPython(fill_feed_at, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['status', '-feed_at', '-id'], name='content_pos_status_05e462_idx'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 6.0.1 on 2026-10-17 16:20
+
+from django.db import migrations
+
+
+def create_section_index(apps, schema_editor):
+    # лента раздела теперь одной выборкой: закреплённые первыми
+    if schema_editor.connection.vendor != "postgresql":
+        return
+
+    schema_editor.execute("DROP INDEX IF EXISTS content_post_section_keyset")
+    schema_editor.execute(
+        "CREATE INDEX IF NOT EXISTS content_post_section_keyset "
+        "ON content_post (section_id, is_featured DESC, \"order\", "
+        "published_at DESC NULLS LAST, created_at DESC, id DESC)"
+    )
+
+
+def restore_section_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+
+    schema_editor.execute("DROP INDEX IF EXISTS content_post_section_keyset")
+    schema_editor.execute(
+        "CREATE INDEX IF NOT EXISTS content_post_section_keyset "
+        "ON content_post (section_id, is_featured, \"order\", "
+        "published_at DESC NULLS LAST, created_at DESC, id DESC)"
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('content', '0035_post_feed_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_section_index, restore_section_index),
+    ]
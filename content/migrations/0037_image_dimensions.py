@@ -0,0 +1,23 @@
+# Generated by Django 6.0.1 on 2026-10-17 17:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('content', '0036_section_keyset_featured_first'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='post',
+            name='cover_image',
+            field=models.ImageField(blank=True, null=True, upload_to='posts/covers/', verbose_name='Обложка'),
+        ),
+        migrations.AlterField(
+            model_name='postimage',
+            name='image',
+            field=models.ImageField(upload_to='posts/images/'),
+        ),
+    ]
@@ -1,11 +1,16 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F, Value
+from django.db.models.functions import Concat, Substr
+from django.contrib.postgres.search import SearchVectorField
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.utils import timezone
 from django.contrib.auth.models import User
-from slugify import slugify
 from django.core.exceptions import ValidationError
 from django.urls import reverse
+from .utils.slug import save_with_slug
+from .utils.text import html_to_text, make_excerpt
+from . import revisions
 import uuid
 
 
@@ -41,6 +46,20 @@ class UserProfile(models.Model):
         verbose_name="Уведомлять об обновлениях статей"
     )
 
+    class DigestMode(models.TextChoices):
+        IMMEDIATE = "immediate", "Сразу"
+        HOURLY = "hourly", "Раз в час"
+        DAILY = "daily", "Раз в день"
+
+    # сводка: правки за окно приходят одним письмом
+    digest_mode = models.CharField(
+        max_length=10,
+        choices=DigestMode.choices,
+        default=DigestMode.IMMEDIATE,
+        db_index=True,
+        verbose_name="Как присылать уведомления"
+    )
+
     created_at = models.DateTimeField(
         auto_now_add=True
     )
@@ -85,55 +104,124 @@ class Section(models.Model):
 
     order = models.PositiveIntegerField(default=0)
 
+    # === ИНДЕКС ДЕРЕВА ===
+    # materialized path: id всех предков и самого раздела через "/",
+    # например "3/17/42/". Поддерживается в save(), руками не редактируется.
+    path = models.CharField(
+        max_length=255,
+        blank=True,
+        default="",
+        editable=False,
+        db_index=True,
+    )
+
+    depth = models.PositiveSmallIntegerField(
+        default=0,
+        editable=False,
+        db_index=True,
+    )
+
     class Meta:
         ordering = ["order", "title"]
 
     def __str__(self):
         return self.title
 
+    @property
+    def ancestor_ids(self):
+        """
+        id предков от корня к родителю — берутся из path, без запросов.
+        """
+        return [int(pk) for pk in self.path.split("/")[:-2] if pk]
+
     def get_ancestors(self):
-        ancestors = []
-        node = self.parent
+        ids = self.ancestor_ids
+
+        if not ids:
+            return []
 
-        while node:
-            ancestors.insert(0, node)
-            node = node.parent
+        return list(Section.objects.filter(pk__in=ids).order_by("depth"))
 
-        return ancestors
+    def get_descendants(self, include_self=False):
+        qs = Section.objects.filter(path__startswith=self.path)
+
+        if not include_self:
+            qs = qs.exclude(pk=self.pk)
+
+        return qs
+
+    def subtree_posts(self, published_only=True, limit=None):
+        """
+        Статьи раздела с подразделами (id, slug, title) - см. tree.subtree_posts.
+        """
+        from .tree import SUBTREE_POSTS_LIMIT, subtree_posts
+
+        return subtree_posts(self, published_only, limit or SUBTREE_POSTS_LIMIT)
 
     def get_absolute_url(self):
         return reverse("section_detail", kwargs={"slug": self.slug})
 
     def get_depth(self):
-        depth = 0
-        node = self.parent
-        while node:
-            depth += 1
-            node = node.parent
-        return depth
+        return self.depth
 
     def clean(self):
         if self.parent:
-            if self.parent.get_depth() >= 2:
+            if self.parent.depth >= 2:
                 raise ValidationError(
                     "Допускается не более 3 уровней вложенности разделов"
                 )
 
     def save(self, *args, **kwargs):
         self.full_clean()
+        save_with_slug(self, self._save_with_tree_index, "section", *args, **kwargs)
+
+    def _save_with_tree_index(self, *args, **kwargs):
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            self._update_tree_index()
+
+    def _update_tree_index(self):
+        """
+        Пересчитывает path/depth раздела. При переносе в другого родителя
+        всё поддерево переписывается одним UPDATE.
+        """
+        old_path, old_depth = self.path, self.depth
+
+        if self.parent_id:
+            parent = self.parent
+            new_path = f"{parent.path}{self.pk}/"
+            new_depth = parent.depth + 1
+        else:
+            new_path = f"{self.pk}/"
+            new_depth = 0
+
+        if new_path == old_path and new_depth == old_depth:
+            return
+
+        Section.objects.filter(pk=self.pk).update(path=new_path, depth=new_depth)
+
+        if old_path:
+            (
+                Section.objects
+                .filter(path__startswith=old_path)
+                .exclude(pk=self.pk)
+                .update(
+                    path=Concat(
+                        Value(new_path),
+                        Substr("path", len(old_path) + 1),
+                        output_field=models.CharField(),
+                    ),
+                    depth=F("depth") + (new_depth - old_depth),
+                )
+            )
 
-        if not self.slug and self.title:
-            base = slugify(self.title) or "section"
-            slug = base
-            counter = 1
-
-            while Section.objects.filter(slug=slug).exclude(pk=self.pk).exists():
-                slug = f"{base}-{counter}"
-                counter += 1
+        self.path, self.depth = new_path, new_depth
 
-            self.slug = slug
 
-        super().save(*args, **kwargs)
+class PostManager(models.Manager):
+    def get_queryset(self):
+        # tsvector нужен только внутри SQL поиска - в Python его не тянем
+        return super().get_queryset().defer("search_vector")
 
 
 class Post(models.Model):
@@ -173,6 +261,8 @@ class Post(models.Model):
         null=True,
         verbose_name="Обложка"
     )
+    cover_width = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    cover_height = models.PositiveIntegerField(null=True, blank=True, editable=False)
 
     status = models.CharField(
         max_length=20,
@@ -207,6 +297,14 @@ class Post(models.Model):
         verbose_name="Обновлено"
     )
 
+    # ключ сортировки главной ленты: публикация или новая версия
+    # (signals.py, publish_post); прочие сохранения его не двигают
+    feed_at = models.DateTimeField(
+        default=timezone.now,
+        editable=False,
+        verbose_name="В ленте с"
+    )
+
     author = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.SET_NULL,
@@ -225,12 +323,26 @@ class Post(models.Model):
         verbose_name="Текущая версия"
     )
 
+    # tsvector (title/summary/текст) для полнотекстового поиска в PostgreSQL.
+    # GIN-индекс создаётся миграцией только на PostgreSQL.
+    search_vector = SearchVectorField(
+        null=True,
+        blank=True,
+        editable=False,
+    )
+
+    objects = PostManager()
 
     class Meta:
         ordering = ['order', '-published_at', '-created_at']
         indexes = [
             models.Index(fields=['status', 'published_at']),
             models.Index(fields=['section', 'status']),
+            models.Index(fields=['status', '-feed_at', '-id']),
+            # ключевые страницы панели редакции (pagination.py); индекс
+            # под ленту раздела (published_at DESC NULLS LAST) создаётся
+            # миграцией только на PostgreSQL
+            models.Index(fields=['-updated_at', '-id']),
         ]
         verbose_name = "Статья"
         verbose_name_plural = "Статьи"
@@ -242,22 +354,7 @@ class Post(models.Model):
         return reverse("post_detail", kwargs={"slug": self.slug})
 
     def save(self, *args, **kwargs):
-        if not self.slug and self.title:
-            base = slugify(self.title)
-
-            if not base:
-                base = "post"
-
-            slug = base
-            counter = 1
-
-            while Post.objects.filter(slug=slug).exclude(pk=self.pk).exists():
-                slug = f"{base}-{counter}"
-                counter += 1
-
-            self.slug = slug
-
-        super().save(*args, **kwargs)
+        save_with_slug(self, super().save, "post", *args, **kwargs)
 
 class Bookmark(models.Model):
     user = models.ForeignKey(
@@ -275,6 +372,9 @@ class Bookmark(models.Model):
     class Meta:
         unique_together = ("user", "post")
         ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["user", "-created_at", "-id"]),
+        ]
 
     def __str__(self):
         return f"{self.user} → {self.post}"
@@ -288,6 +388,15 @@ class PostImage(models.Model):
         blank=True
     )
     image = models.ImageField(upload_to='posts/images/')
+    # размеры пишет images.generate_variants (width_field читал бы файл
+    # при каждой загрузке строки из базы)
+    width = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    height = models.PositiveIntegerField(null=True, blank=True, editable=False)
+
+    # sha256 содержимого: повторная загрузка того же файла берёт эту строку
+    checksum = models.CharField(max_length=64, blank=True, db_index=True, editable=False)
+    uploaded_at = models.DateTimeField(default=timezone.now, editable=False)
+
     title = models.CharField(max_length=200, blank=True)
     alt_text = models.CharField(max_length=200, blank=True)
     order = models.PositiveIntegerField(default=0)
@@ -299,9 +408,33 @@ class PostImage(models.Model):
         return self.title or f"Image #{self.id} for {self.post_id}"
 
 
+class ImageVariant(models.Model):
+    """
+    Уменьшенная копия картинки из media (content/images.py): source -
+    имя исходного файла в хранилище, общее для обложек и PostImage.
+    """
+    source = models.CharField(max_length=255, db_index=True)
+    format = models.CharField(max_length=10)
+    width = models.PositiveIntegerField()
+    height = models.PositiveIntegerField()
+    file = models.FileField(upload_to="variants/", max_length=255)
+    size = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ["source", "format", "width"]
+        unique_together = ("source", "format", "width")
+
+    def __str__(self):
+        return f"{self.source} {self.width}w {self.format}"
+
+
 class PostRevision(models.Model):
+    class Storage(models.TextChoices):
+        RAW = "raw", "Без сжатия"
+        KEYFRAME = "keyframe", "Опорный кадр"
+        DELTA = "delta", "Дельта"
+
     post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='revisions')
-    content = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
     created_by = models.ForeignKey(
         settings.AUTH_USER_MODEL,
@@ -313,6 +446,34 @@ class PostRevision(models.Model):
     note = models.CharField(max_length=200, blank=True, help_text="Короткая заметка: что изменилось")
     is_published_snapshot = models.BooleanField(default=False, help_text="Снимок в момент публикации")
 
+    # === ТЕКСТ БЕЗ РАЗМЕТКИ ===
+    # считается один раз при сохранении версии: поиск, сниппеты и
+    # анонсы в списках работают с ним, а не с HTML
+    plain_text = models.TextField(blank=True, editable=False)
+    word_count = models.PositiveIntegerField(default=0, editable=False)
+    excerpt = models.CharField(max_length=255, blank=True, editable=False)
+
+    # === ХРАНЕНИЕ ТЕКСТА ===
+    # HTML версии читается и пишется через свойство content (revisions.py):
+    # опорный кадр под zlib или сжатая дельта к версии base.
+    # raw_content - несжатый текст старых строк до compress_revisions
+    raw_content = models.TextField(blank=True, db_column="content", editable=False)
+    storage = models.CharField(
+        max_length=10, choices=Storage.choices, default=Storage.RAW, editable=False
+    )
+    data = models.BinaryField(null=True, editable=False)
+    # связи цепочки проверяются кодом: удаление версии сначала
+    # перекодирует зависящие от неё (signals.py)
+    keyframe = models.ForeignKey(
+        "self", on_delete=models.DO_NOTHING, db_constraint=False,
+        null=True, blank=True, editable=False, related_name="+",
+    )
+    base = models.ForeignKey(
+        "self", on_delete=models.DO_NOTHING, db_constraint=False,
+        null=True, blank=True, editable=False, related_name="+",
+    )
+    chain_index = models.PositiveSmallIntegerField(default=0, editable=False)
+
     class Meta:
         ordering = ['-created_at']
         indexes = [
@@ -322,6 +483,65 @@ class PostRevision(models.Model):
     def __str__(self) -> str:
         return f"Revision {self.id} - {self.post.title}"
 
+    @property
+    def content(self) -> str:
+        if "_content" not in self.__dict__:
+            self._content = revisions.decode(self)
+        return self._content
+
+    @content.setter
+    def content(self, value):
+        # сразу опорный кадр - так работает и bulk_create;
+        # дельту к предыдущей версии save() попробует сам
+        if not self._state.adding and "_chain_start" not in self.__dict__:
+            self._chain_start = self.keyframe_id or self.pk
+        self._content = value
+        self._content_changed = True
+        revisions.set_keyframe(self, value)
+
+    def fill_text(self):
+        self.plain_text = html_to_text(self.content)
+        self.word_count = len(self.plain_text.split())
+        self.excerpt = make_excerpt(self.plain_text)
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get("update_fields")
+        changed = self.__dict__.pop("_content_changed", False)
+
+        if update_fields is None or "content" in update_fields:
+            self.fill_text()
+
+            if update_fields is not None:
+                kwargs["update_fields"] = {
+                    *update_fields, "plain_text", "word_count", "excerpt",
+                    *revisions.STORAGE_FIELDS,
+                } - {"content"}
+
+        if not changed:
+            return super().save(*args, **kwargs)
+
+        if self._state.adding:
+            base = (
+                PostRevision.objects
+                .filter(post_id=self.post_id)
+                .exclude(storage=self.Storage.RAW)
+                .order_by("-pk")
+                .first()
+            )
+            if base is not None:
+                revisions.encode(self, self._content, base, base.content)
+            super().save(*args, **kwargs)
+        else:
+            # правка текста существующей версии: следующие за ней
+            # дельты собраны от старого текста - перекодировать
+            later = revisions.later_in_chain(self.pk, self.__dict__.pop("_chain_start"))
+            super().save(*args, **kwargs)
+            revisions.content_cache.delete(self.pk)
+            revisions.rechain(later, self, self._content)
+
+        if self.storage == self.Storage.DELTA:
+            revisions.content_cache.set(self.pk, self._content)
+
 class Activity(models.Model):
     ACTION_CHOICES = [
         ('create', 'Создание'),
@@ -351,3 +571,150 @@ class Activity(models.Model):
     def __str__(self):
         return f"{self.title} ({self.action})"
 
+
+
+class SearchDocument(models.Model):
+    """
+    Запись встроенного поискового индекса (для баз без PostgreSQL FTS):
+    длина документа в токенах для BM25 и отпечаток проиндексированной версии.
+    """
+    post = models.OneToOneField(
+        Post,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="search_document"
+    )
+    length = models.PositiveIntegerField(default=0)
+    checksum = models.CharField(max_length=40, blank=True)
+
+    def __str__(self):
+        return f"Search document for {self.post_id}"
+
+
+class SearchPosting(models.Model):
+    """
+    Элемент posting list: основа слова -> статья, взвешенная частота
+    и позиции токенов (для фразового поиска).
+    """
+    term = models.CharField(max_length=64)
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name="search_postings"
+    )
+    frequency = models.PositiveIntegerField(default=0)
+    positions = models.TextField(blank=True)
+
+    class Meta:
+        unique_together = ("term", "post")
+
+    def __str__(self):
+        return f"{self.term} → {self.post_id}"
+
+
+class NotificationEvent(models.Model):
+    """
+    Событие для рассылки ("новая статья", "статья обновлена").
+    Пишется одной строкой в транзакции публикации, воркер send_outbox
+    разворачивает его в письма OutboxMessage.
+    """
+
+    class Kind(models.TextChoices):
+        NEW_POST = "new_post", "Новая публикация"
+        POST_UPDATE = "post_update", "Обновление статьи"
+
+    kind = models.CharField(max_length=20, choices=Kind.choices)
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name="notification_events"
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True, db_index=True)
+
+    class Meta:
+        ordering = ["created_at"]
+
+    def __str__(self):
+        return f"{self.kind} → {self.post_id}"
+
+
+class DigestItem(models.Model):
+    """
+    Ожидающая сводки статья: одна строка на (режим, статья), сколько бы
+    правок ни было за окно. Команда send_digests забирает и удаляет строки.
+    """
+    mode = models.CharField(max_length=10, choices=UserProfile.DigestMode.choices)
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name="digest_items"
+    )
+    kind = models.CharField(max_length=20, choices=NotificationEvent.Kind.choices)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ("mode", "post")
+
+    def __str__(self):
+        return f"{self.mode}: {self.post_id}"
+
+
+class OutboxMessage(models.Model):
+    """
+    Письмо в очереди на отправку. Воркер забирает пачки через
+    SELECT ... FOR UPDATE SKIP LOCKED, при ошибке - повтор с экспоненциальной
+    задержкой, после MAX_ATTEMPTS попыток - FAILED.
+    """
+
+    class Status(models.TextChoices):
+        PENDING = "pending", "В очереди"
+        SENT = "sent", "Отправлено"
+        FAILED = "failed", "Не отправлено"
+
+    to_email = models.EmailField()
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+
+    event = models.ForeignKey(
+        NotificationEvent,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="messages"
+    )
+
+    status = models.CharField(
+        max_length=10,
+        choices=Status.choices,
+        default=Status.PENDING
+    )
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["created_at"]
+        indexes = [
+            models.Index(fields=["status", "next_attempt_at"]),
+        ]
+
+    def __str__(self):
+        return f"{self.to_email}: {self.subject}"
+
+
+class CacheInvalidation(models.Model):
+    """
+    Событие шины инвалидации (content/bus.py): какие ключи кешей в памяти
+    процессов устарели. Процессы читают строки с id больше последнего
+    увиденного.
+    """
+    namespace = models.CharField(max_length=64)
+    key = models.CharField(max_length=255)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.namespace}:{self.key}"
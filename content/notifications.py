@@ -0,0 +1,299 @@
+import logging
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from .emails import digest_email, new_post_email, post_update_email
+from .models import DigestItem, NotificationEvent, OutboxMessage, Post, UserProfile
+
+
+logger = logging.getLogger(__name__)
+
+# тип уведомления -> (флаг подписки в профиле, текст письма)
+KINDS = {
+    NotificationEvent.Kind.NEW_POST: ("notify_new_posts", new_post_email),
+    NotificationEvent.Kind.POST_UPDATE: ("notify_updates", post_update_email),
+}
+
+
+def recipient_emails(kind):
+    """
+    Адреса подписчиков с мгновенными уведомлениями одним запросом:
+    фильтры по подтверждению и подписке считает база, в Python
+    приходят только сами адреса.
+    """
+    flag, _ = KINDS[kind]
+
+    return (
+        UserProfile.objects
+        .filter(
+            email_confirmed=True,
+            digest_mode=UserProfile.DigestMode.IMMEDIATE,
+            **{flag: True}
+        )
+        .exclude(email__isnull=True)
+        .exclude(email="")
+        .order_by()
+        .values_list("email", flat=True)
+        .distinct()
+    )
+
+
+def publish(kind, post_id):
+    """
+    Поставить рассылку в очередь: одна строка в той же транзакции,
+    что и публикация. Работа в потоке запроса не зависит от числа
+    подписчиков, после коммита событие не теряется при рестарте.
+    """
+    if kind not in KINDS:
+        raise ValueError(f"Неизвестный тип уведомления: {kind}")
+
+    NotificationEvent.objects.create(kind=kind, post_id=post_id)
+
+    # для сводок - по строке на режим; повторные правки той же статьи
+    # упираются в unique (mode, post) и ничего не добавляют
+    DigestItem.objects.bulk_create(
+        [
+            DigestItem(mode=mode, post_id=post_id, kind=kind)
+            for mode in DIGEST_MODES
+        ],
+        ignore_conflicts=True,
+    )
+
+
+DIGEST_MODES = (UserProfile.DigestMode.HOURLY, UserProfile.DigestMode.DAILY)
+
+
+# ===== ВОРКЕР =====
+
+def expand_events(limit=10):
+    """
+    Событие -> письмо каждому подписчику одним bulk_create.
+    Отметка processed_at в той же транзакции: событие разворачивается
+    ровно один раз, даже если воркеров несколько.
+    Возвращает число созданных писем.
+    """
+    created = 0
+
+    with transaction.atomic():
+        events = list(
+            NotificationEvent.objects
+            .select_for_update(skip_locked=True)
+            .filter(processed_at__isnull=True)
+            .order_by("created_at")[:limit]
+        )
+
+        for event in events:
+            _, render = KINDS[event.kind]
+            post = Post.objects.filter(pk=event.post_id).first()
+
+            if post is not None:
+                subject, body = render(post)
+                messages = OutboxMessage.objects.bulk_create(
+                    [
+                        OutboxMessage(
+                            to_email=email, subject=subject, body=body, event=event
+                        )
+                        for email in recipient_emails(event.kind)
+                    ],
+                    batch_size=1000,
+                )
+                created += len(messages)
+
+            event.processed_at = timezone.now()
+            event.save(update_fields=["processed_at"])
+
+    return created
+
+
+def claim(batch_size, lease):
+    """
+    Забрать пачку писем, которые пора отправлять. Строки, занятые
+    другим воркером, пропускаются (SKIP LOCKED); у забранных
+    next_attempt_at сдвигается на lease - если воркер упадёт посреди
+    пачки, письма вернутся в очередь после истечения аренды.
+    """
+    now = timezone.now()
+
+    with transaction.atomic():
+        messages = list(
+            OutboxMessage.objects
+            .select_for_update(skip_locked=True)
+            .filter(status=OutboxMessage.Status.PENDING, next_attempt_at__lte=now)
+            .order_by("next_attempt_at")[:batch_size]
+        )
+
+        for message in messages:
+            message.attempts += 1
+            message.next_attempt_at = now + lease
+
+        OutboxMessage.objects.bulk_update(messages, ["attempts", "next_attempt_at"])
+
+    return messages
+
+
+def build_digests(mode):
+    """
+    Сводка за окно: одно письмо на подписчика режима mode со всеми
+    статьями из DigestItem. Адресаты - одним запросом, текстов всего
+    три варианта (новые / обновления / оба), письма - одним bulk_create.
+    Возвращает число поставленных в очередь писем.
+    """
+    with transaction.atomic():
+        items = list(
+            DigestItem.objects
+            .select_for_update(skip_locked=True)
+            .filter(mode=mode)
+            .order_by("created_at")
+        )
+        if not items:
+            return 0
+
+        DigestItem.objects.filter(pk__in=[item.pk for item in items]).delete()
+
+        posts = Post.objects.in_bulk(
+            [item.post_id for item in items]
+        )
+        new_posts, updated_posts = [], []
+        for item in items:
+            post = posts.get(item.post_id)
+            if post is None or post.status != Post.Status.PUBLISHED:
+                continue
+
+            if item.kind == NotificationEvent.Kind.NEW_POST:
+                new_posts.append(post)
+            else:
+                updated_posts.append(post)
+
+        texts = {}
+        for wants_new, wants_updates in ((True, True), (True, False), (False, True)):
+            selected = (
+                new_posts if wants_new else [],
+                updated_posts if wants_updates else [],
+            )
+            if any(selected):
+                texts[wants_new, wants_updates] = digest_email(*selected)
+
+        recipients = (
+            UserProfile.objects
+            .filter(email_confirmed=True, digest_mode=mode)
+            .filter(Q(notify_new_posts=True) | Q(notify_updates=True))
+            .exclude(email__isnull=True)
+            .exclude(email="")
+            .values_list("email", "notify_new_posts", "notify_updates")
+        )
+
+        messages = []
+        for email, wants_new, wants_updates in recipients:
+            text = texts.get((wants_new, wants_updates))
+            if text:
+                subject, body = text
+                messages.append(
+                    OutboxMessage(to_email=email, subject=subject, body=body)
+                )
+
+        OutboxMessage.objects.bulk_create(messages, batch_size=1000)
+
+    return len(messages)
+
+
+def retry_delay(attempts):
+    return timedelta(seconds=settings.OUTBOX_RETRY_BASE * 2 ** (attempts - 1))
+
+
+def send_batch(messages, rate=None):
+    """
+    Отправка пачки через одно SMTP-соединение. rate - писем в минуту,
+    между письмами выдерживается пауза. Ошибки не глотаются: письмо
+    получает повтор с экспоненциальной задержкой или статус FAILED.
+    Возвращает (отправлено, ошибок).
+    """
+    interval = 60 / rate if rate else 0
+    sent, failed = [], []
+
+    connection = get_connection(fail_silently=False)
+
+    try:
+        connection.open()
+    except Exception as exc:
+        failed = [(message, exc) for message in messages]
+    else:
+        try:
+            for message in messages:
+                started = time.monotonic()
+
+                try:
+                    connection.send_messages([
+                        EmailMessage(
+                            message.subject,
+                            message.body,
+                            to=[message.to_email],
+                            connection=connection,
+                        )
+                    ])
+                except Exception as exc:
+                    failed.append((message, exc))
+                else:
+                    sent.append(message)
+
+                pause = interval - (time.monotonic() - started)
+                if pause > 0:
+                    time.sleep(pause)
+        finally:
+            connection.close()
+
+    now = timezone.now()
+
+    if sent:
+        OutboxMessage.objects.filter(pk__in=[m.pk for m in sent]).update(
+            status=OutboxMessage.Status.SENT, sent_at=now, last_error=""
+        )
+
+    for message, exc in failed:
+        message.last_error = f"{type(exc).__name__}: {exc}"[:1000]
+
+        if message.attempts >= settings.OUTBOX_MAX_ATTEMPTS:
+            message.status = OutboxMessage.Status.FAILED
+            logger.error("Письмо %s не отправлено: %s", message.pk, message.last_error)
+        else:
+            message.next_attempt_at = now + retry_delay(message.attempts)
+
+    if failed:
+        OutboxMessage.objects.bulk_update(
+            [message for message, _ in failed],
+            ["status", "next_attempt_at", "last_error"],
+        )
+
+    return len(sent), len(failed)
+
+
+def outbox_stats():
+    """
+    Глубина очереди и пропускная способность: для команды send_outbox
+    и мониторинга.
+    """
+    now = timezone.now()
+
+    stats = OutboxMessage.objects.aggregate(
+        pending=Count("pk", filter=Q(status=OutboxMessage.Status.PENDING)),
+        due=Count(
+            "pk",
+            filter=Q(status=OutboxMessage.Status.PENDING, next_attempt_at__lte=now),
+        ),
+        failed=Count("pk", filter=Q(status=OutboxMessage.Status.FAILED)),
+        sent_last_minute=Count(
+            "pk", filter=Q(sent_at__gte=now - timedelta(minutes=1))
+        ),
+        sent_last_hour=Count("pk", filter=Q(sent_at__gte=now - timedelta(hours=1))),
+    )
+    stats["events"] = NotificationEvent.objects.filter(
+        processed_at__isnull=True
+    ).count()
+    stats["digest_items"] = DigestItem.objects.count()
+
+    return stats
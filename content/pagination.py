@@ -0,0 +1,295 @@
+import base64
+import datetime
+import hashlib
+import json
+import operator
+from collections.abc import Sequence
+from functools import reduce
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F, Q
+from django.utils.functional import cached_property
+from django.utils.http import urlencode
+
+from .cache import namespace
+
+
+# Постраничный вывод по ключу (keyset): следующая страница - строки
+# после значений сортировки последней строки текущей, без OFFSET и COUNT.
+# Курсор - значения сортировки (и id) строки-границы в base64.
+#
+# Порядок берётся из queryset.order_by(); id добавляется для однозначности.
+# NULL всегда в конце (nulls_last) - одинаково в PostgreSQL и SQLite.
+
+# приблизительное число строк списка: считается не чаще раза в COUNT_TTL
+COUNT_TTL = 5 * 60
+count_cache = namespace("list_counts", timeout=COUNT_TTL)
+
+
+class CursorEncoder(DjangoJSONEncoder):
+    def default(self, o):
+        # DjangoJSONEncoder обрезает микросекунды - курсору нужны точные значения
+        if isinstance(o, (datetime.datetime, datetime.time)):
+            return o.isoformat()
+        return super().default(o)
+
+
+def encode_cursor(values) -> str:
+    raw = json.dumps(values, cls=CursorEncoder, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor) -> list:
+    padded = cursor + "=" * (-len(cursor) % 4)
+    values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    if not isinstance(values, list):
+        raise ValueError("cursor")
+    return values
+
+
+class Key:
+    def __init__(self, name, descending, field, nullable):
+        self.name = name
+        self.descending = descending
+        self.field = field
+        self.nullable = nullable
+
+    def order(self, reverse=False):
+        # вперёд NULL в конце, назад - в начале; для NOT NULL полей без
+        # NULLS ..., чтобы порядок совпадал с обычными индексами
+        nulls = {}
+        if self.nullable:
+            nulls = {"nulls_first": True} if reverse else {"nulls_last": True}
+        if self.descending != reverse:
+            return F(self.name).desc(**nulls)
+        return F(self.name).asc(**nulls)
+
+    def beyond(self, value, reverse=False):
+        """
+        Условие "строка дальше value" в направлении обхода; None - таких нет.
+        """
+        if value is None:
+            # NULL последний: вперёд за ним ничего, назад - все не-NULL
+            return Q(**{f"{self.name}__isnull": False}) if reverse else None
+
+        lookup = "lt" if self.descending != reverse else "gt"
+        condition = Q(**{f"{self.name}__{lookup}": value})
+        if self.nullable and not reverse:
+            condition |= Q(**{f"{self.name}__isnull": True})
+        return condition
+
+    def equal(self, value):
+        if value is None:
+            return Q(**{f"{self.name}__isnull": True})
+        return Q(**{self.name: value})
+
+    def value(self, obj):
+        return getattr(obj, self.name)
+
+    def to_python(self, value):
+        return None if value is None else self.field.to_python(value)
+
+
+class KeysetPaginator:
+    """
+    Замена django Paginator для лент: стоимость страницы не зависит от
+    глубины. count - приблизительный (кеш на COUNT_TTL), считается
+    только если его показывают.
+    """
+
+    def __init__(self, queryset, per_page):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.keys = self._keys(queryset)
+
+    def _keys(self, queryset):
+        model = queryset.model
+        keys = []
+
+        for item in [*queryset.query.order_by, "-pk"]:
+            if not isinstance(item, str):
+                raise TypeError("Сортировка по выражению: annotate() и order_by() по имени")
+
+            name = item.lstrip("-")
+            if name in ("pk", model._meta.pk.name):
+                if any(key.field.primary_key for key in keys):
+                    continue
+                # id - в направлении последнего ключа
+                descending = keys[-1].descending if keys else True
+                keys.append(Key("pk", descending, model._meta.pk, False))
+                continue
+
+            if name in queryset.query.annotations:
+                field = queryset.query.annotations[name].output_field
+                nullable = True
+            else:
+                try:
+                    field = model._meta.get_field(name)
+                except FieldDoesNotExist:
+                    raise TypeError(f"keyset: сортировка только по полям модели, не {name}")
+                name = field.attname
+                nullable = field.null
+
+            keys.append(Key(name, item.startswith("-"), field, nullable))
+
+        return keys
+
+    def _after(self, values, reverse):
+        """
+        Строки за курсором: (k1 дальше) или (k1 = и k2 дальше) или ...
+        """
+        terms, equal = [], Q()
+        for key, value in zip(self.keys, values):
+            beyond = key.beyond(value, reverse)
+            if beyond is not None:
+                terms.append(equal & beyond)
+            equal &= key.equal(value)
+
+        condition = reduce(operator.or_, terms) if terms else Q(pk__in=[])
+
+        # граница по первому ключу отдельно - по ней база входит в индекс
+        first, value = self.keys[0], values[0]
+        if not first.nullable and value is not None:
+            lookup = "lte" if first.descending != reverse else "gte"
+            condition &= Q(**{f"{first.name}__{lookup}": value})
+
+        return condition
+
+    def _cursor(self, obj):
+        return encode_cursor([key.value(obj) for key in self.keys])
+
+    def _values(self, cursor):
+        values = decode_cursor(cursor)
+        if len(values) != len(self.keys):
+            raise ValueError("cursor")
+        return [key.to_python(value) for key, value in zip(self.keys, values)]
+
+    def page(self, after=None, before=None, params=None, prefix=""):
+        reverse = bool(before) and not after
+        qs = self.queryset.order_by(*(key.order(reverse) for key in self.keys))
+
+        cursor = before if reverse else after
+        if cursor:
+            qs = qs.filter(self._after(self._values(cursor), reverse))
+
+        rows = list(qs[:self.per_page + 1])
+        more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+
+        if reverse:
+            rows.reverse()
+            has_previous, has_next = more, True
+        else:
+            has_previous, has_next = bool(cursor), more
+
+        return KeysetPage(
+            rows, self,
+            next_cursor=self._cursor(rows[-1]) if has_next and rows else None,
+            previous_cursor=self._cursor(rows[0]) if has_previous and rows else None,
+            params=params, prefix=prefix,
+        )
+
+    def get_page(self, params, prefix=""):
+        """
+        Страница по параметрам запроса (request.GET): {prefix}after /
+        {prefix}before. Испорченный курсор - первая страница.
+        """
+        try:
+            return self.page(
+                after=params.get(f"{prefix}after"),
+                before=params.get(f"{prefix}before"),
+                params=params, prefix=prefix,
+            )
+        except (ValueError, TypeError, ValidationError):
+            return self.page(params=params, prefix=prefix)
+
+    @cached_property
+    def count(self):
+        sql, sql_params = self.queryset.order_by().query.sql_with_params()
+        key = hashlib.md5(f"{sql}|{sql_params!r}".encode()).hexdigest()
+        return count_cache.get_or_set(key, lambda: self.queryset.order_by().count())
+
+
+class ListPaginator:
+    """
+    Те же страницы и курсоры для списка, уже лежащего в памяти
+    (дочерние разделы из снимка дерева): курсор - позиция в списке.
+    """
+
+    def __init__(self, items, per_page):
+        self.items = items
+        self.per_page = per_page
+
+    @property
+    def count(self):
+        return len(self.items)
+
+    def get_page(self, params, prefix=""):
+        try:
+            after = params.get(f"{prefix}after")
+            before = params.get(f"{prefix}before")
+            if after:
+                start = int(decode_cursor(after)[0]) + 1
+            elif before:
+                start = max(int(decode_cursor(before)[0]) - self.per_page, 0)
+            else:
+                start = 0
+        except (ValueError, TypeError, IndexError):
+            start = 0
+
+        start = min(max(start, 0), len(self.items))
+        end = start + self.per_page
+
+        return KeysetPage(
+            self.items[start:end], self,
+            next_cursor=encode_cursor([end - 1]) if end < len(self.items) else None,
+            previous_cursor=encode_cursor([start]) if start > 0 else None,
+            params=params, prefix=prefix,
+        )
+
+
+class KeysetPage(Sequence):
+    def __init__(self, object_list, paginator, next_cursor, previous_cursor, params=None, prefix=""):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.params = params
+        self.prefix = prefix
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+    def _query(self, name, cursor):
+        params = self.params.copy() if self.params is not None else {}
+        if hasattr(params, "setlist"):
+            params = params.dict()
+        params.pop(f"{self.prefix}after", None)
+        params.pop(f"{self.prefix}before", None)
+        params[f"{self.prefix}{name}"] = cursor
+        return urlencode(params)
+
+    @property
+    def next_query(self):
+        """
+        Строка запроса следующей страницы: остальные параметры (q, type...)
+        сохраняются.
+        """
+        return self._query("after", self.next_cursor)
+
+    @property
+    def previous_query(self):
+        return self._query("before", self.previous_cursor)
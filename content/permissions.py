@@ -2,9 +2,49 @@ from functools import wraps
 from django.http import HttpResponseForbidden
 from django.views.decorators.http import require_POST
 
+from .cache import namespace
+
+
+PUBLISHERS = "Publishers"
+
+# группы пользователя: id -> frozenset имён; сбрасывается сигналами
+# при изменении user.groups и при переименовании / удалении группы
+groups_cache = namespace("user_groups", timeout=60 * 60)
+
+
+def get_user_groups(user) -> frozenset:
+    """
+    Имена групп пользователя. Внутри запроса - атрибут на request.user,
+    между запросами - кеш; запрос к базе только при промахе.
+    """
+    if not user.is_authenticated:
+        return frozenset()
+
+    groups = getattr(user, "_group_names", None)
+
+    if groups is None:
+        groups = groups_cache.get_or_set(
+            user.pk,
+            lambda: frozenset(user.groups.values_list("name", flat=True)),
+        )
+        user._group_names = groups
+
+    return groups
+
+
+def invalidate_user_groups(user_id=None):
+    if user_id is None:
+        groups_cache.invalidate()
+    else:
+        groups_cache.delete(user_id)
+
+
+def has_group(user, group_name) -> bool:
+    return group_name in get_user_groups(user)
+
 
 def is_publisher(user) -> bool:
-    return user.is_authenticated and user.groups.filter(name="Publishers").exists()
+    return has_group(user, PUBLISHERS)
 
 
 def publisher_required(view_func):
@@ -0,0 +1,138 @@
+import html
+import re
+
+from django.utils.html import escape, strip_tags
+
+from .cache import namespace
+from .images import DEFAULT_SIZES, fallback_url, source_from_url, srcset, variants_for
+
+
+# поднимать при изменении формата результата, чтобы не читать старый кеш
+RENDER_VERSION = 3
+
+CACHE_TIMEOUT = 60 * 60 * 24 * 7
+
+body_cache = namespace("post_body", timeout=CACHE_TIMEOUT)
+
+# картинка из media -> id версий, чьё тело с ней лежит в body_cache:
+# новые варианты картинки сбрасывают только эти тела
+image_bodies = namespace("post_body_images", timeout=CACHE_TIMEOUT, local=False)
+
+# контент проходит через bleach (utils/html.py): id у заголовков не
+# остаётся, атрибуты - только class/style, поэтому хватает регулярки
+HEADING_RE = re.compile(r"<(h[23])(\s[^>]*)?>(.*?)</\1>", re.IGNORECASE | re.DOTALL)
+WHITESPACE_RE = re.compile(r"\s+")
+IMG_RE = re.compile(r"<img\b([^>]*?)\s*/?>", re.IGNORECASE)
+SRC_RE = re.compile(r'\ssrc="([^"]*)"')
+
+
+def render_body(content: str) -> dict:
+    """
+    Готовое тело статьи: якоря у h2/h3, оглавление по ним и srcset
+    у картинок. Якоря "section-N" - те же, что раньше ставил JS,
+    старые ссылки живы.
+    """
+    toc = []
+
+    def add_anchor(match):
+        tag, attrs, inner = match.group(1).lower(), match.group(2) or "", match.group(3)
+        anchor = f"section-{len(toc)}"
+
+        title = WHITESPACE_RE.sub(" ", html.unescape(strip_tags(inner))).strip()
+        toc.append({"id": anchor, "title": title, "level": tag})
+
+        return f'<{tag} id="{anchor}"{attrs}>{inner}</{tag}>'
+
+    body = HEADING_RE.sub(add_anchor, content or "")
+    body, images = responsive_images(body)
+
+    return {"html": body, "toc": toc, "images": images}
+
+
+def responsive_images(body: str):
+    """
+    Картинки из media -> <picture> с WebP/JPEG srcset (content/images.py).
+    Картинки без готовых вариантов остаются как есть.
+    Возвращает (html, имена картинок из media).
+    """
+    sources = {}
+    for match in IMG_RE.finditer(body):
+        src = SRC_RE.search(match.group(1))
+        source = source_from_url(html.unescape(src.group(1))) if src else None
+        if source:
+            sources[match.group(0)] = source
+
+    if not sources:
+        return body, []
+
+    variants = variants_for(sources.values())
+
+    def replace(match):
+        item = variants.get(sources.get(match.group(0)))
+        if not item or "jpeg" not in item:
+            return match.group(0)
+
+        width, height = item["size"]
+        attrs = SRC_RE.sub(
+            f' src="{escape(fallback_url(item["jpeg"]))}"', match.group(1), count=1
+        )
+
+        webp = ""
+        if "webp" in item:
+            webp = (
+                f'<source type="image/webp" srcset="{escape(srcset(item["webp"]))}" '
+                f'sizes="{DEFAULT_SIZES}">'
+            )
+
+        return (
+            f"<picture>{webp}<img{attrs} "
+            f'srcset="{escape(srcset(item["jpeg"]))}" sizes="{DEFAULT_SIZES}" '
+            f'width="{width}" height="{height}" loading="lazy" decoding="async">'
+            "</picture>"
+        )
+
+    return IMG_RE.sub(replace, body), sorted(set(sources.values()))
+
+
+def body_cache_key(revision_id):
+    return f"{RENDER_VERSION}:{revision_id}"
+
+
+def get_rendered_body(revision) -> dict:
+    """
+    Версия статьи не меняется после создания, поэтому результат
+    хранится в кеше по id версии; content читается только при промахе.
+    """
+    key = body_cache_key(revision.pk)
+
+    body = body_cache.get(key)
+    if body is None:
+        body = render_body(revision.content)
+        body_cache.set(key, body)
+
+        for source in body["images"]:
+            revision_ids = image_bodies.get(source) or set()
+            revision_ids.add(revision.pk)
+            image_bodies.set(source, revision_ids)
+
+    return body
+
+
+def invalidate_rendered_body(revision_id):
+    body_cache.delete(body_cache_key(revision_id))
+
+
+def invalidate_image_bodies(source) -> bool:
+    """
+    Сбросить закешированные тела версий с картинкой source.
+    False - таких тел нет, страницы не изменились.
+    """
+    revision_ids = image_bodies.get(source)
+    if not revision_ids:
+        return False
+
+    for revision_id in revision_ids:
+        invalidate_rendered_body(revision_id)
+    image_bodies.delete(source)
+
+    return True
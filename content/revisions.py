@@ -0,0 +1,234 @@
+import json
+import re
+import zlib
+from difflib import SequenceMatcher
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from .cache import namespace
+
+
+# Хранение текста версий статей:
+#   keyframe - весь HTML под zlib;
+#   delta    - сжатая правка относительно версии base;
+#   raw      - старые строки до перехода, текст в raw_content как есть.
+# Цепочка - опорный кадр и дельты с тем же keyframe; через каждые
+# REVISION_KEYFRAME_EVERY версий начинается новая.
+
+# дельта не меньше этой доли кадра - выгоднее хранить кадр
+MAX_DELTA_RATIO = 0.6
+
+# теги, слова вместе с пробелами после них, одиночный "<"
+TOKEN_RE = re.compile(r"<[^>]*>|[^<\s]+\s*|\s+|<")
+
+# собранный текст версий-дельт; версия не меняется - ключ по pk
+content_cache = namespace("revision_content", timeout=60 * 60 * 24)
+
+STORAGE_FIELDS = ("raw_content", "storage", "data", "keyframe", "base", "chain_index")
+
+
+def keyframe_every():
+    return getattr(settings, "REVISION_KEYFRAME_EVERY", 20)
+
+
+def compress(text) -> bytes:
+    return zlib.compress(text.encode(), 9)
+
+
+def decompress(data) -> str:
+    return zlib.decompress(bytes(data)).decode()
+
+
+def make_delta(base_text, text) -> list:
+    """
+    Правка base_text -> text по токенам: [i, j] - скопировать токены
+    base_text с i по j, строка - вставить как есть.
+    """
+    a, b = TOKEN_RE.findall(base_text), TOKEN_RE.findall(text)
+    ops = []
+
+    for tag, i1, i2, j1, j2 in SequenceMatcher(None, a, b, autojunk=False).get_opcodes():
+        if tag == "equal":
+            ops.append([i1, i2])
+        elif j2 > j1:
+            ops.append("".join(b[j1:j2]))
+
+    return ops
+
+
+def apply_delta(base_text, data) -> str:
+    tokens = TOKEN_RE.findall(base_text)
+    return "".join(
+        op if isinstance(op, str) else "".join(tokens[op[0]:op[1]])
+        for op in json.loads(decompress(data))
+    )
+
+
+def set_keyframe(revision, text):
+    from .models import PostRevision
+
+    revision.raw_content = ""
+    revision.storage = PostRevision.Storage.KEYFRAME
+    revision.data = compress(text)
+    revision.keyframe = None
+    revision.base = None
+    revision.chain_index = 0
+
+
+def encode(revision, text, base=None, base_text=""):
+    """
+    Поля хранения revision: дельта к base, если цепочка не слишком
+    длинная и дельта заметно меньше кадра, иначе опорный кадр.
+    """
+    from .models import PostRevision
+
+    set_keyframe(revision, text)
+
+    if base is None or base.storage == PostRevision.Storage.RAW:
+        return
+    if base.chain_index + 1 >= keyframe_every():
+        return
+
+    delta = compress(json.dumps(make_delta(base_text, text), ensure_ascii=False))
+    if len(delta) >= len(revision.data) * MAX_DELTA_RATIO:
+        return
+
+    revision.storage = PostRevision.Storage.DELTA
+    revision.data = delta
+    revision.keyframe_id = base.keyframe_id or base.pk
+    revision.base = base
+    revision.chain_index = base.chain_index + 1
+
+
+def decode(revision) -> str:
+    """
+    Текст версии. Кадр и несжатые строки - без запросов; дельта -
+    из кеша, иначе одним запросом за всю цепочку.
+    """
+    from .models import PostRevision
+
+    if revision.storage == PostRevision.Storage.RAW:
+        return revision.raw_content
+    if revision.storage == PostRevision.Storage.KEYFRAME:
+        return decompress(revision.data)
+
+    return content_cache.get_or_set(revision.pk, lambda: _rebuild(revision))
+
+
+def _rebuild(revision):
+    from .models import PostRevision
+
+    start = revision.keyframe_id
+    chain = {
+        item.pk: item
+        for item in PostRevision.objects
+        .filter(Q(pk=start) | Q(keyframe_id=start), pk__lte=revision.pk)
+        .only("id", "storage", "data", "raw_content", "keyframe_id", "base_id")
+    }
+
+    # от версии по base до кадра, затем правки в обратном порядке
+    path = [chain[revision.pk]]
+    while path[-1].base_id in chain:
+        path.append(chain[path[-1].base_id])
+
+    head = path.pop()
+    if head.base_id is None:
+        text = decode(head)
+    else:
+        # база успела уйти в другую цепочку (compact_revisions
+        # перекодировал историю параллельно с правкой)
+        base = PostRevision.objects.get(pk=head.base_id)
+        text = apply_delta(decode(base), head.data)
+
+    for item in reversed(path):
+        text = apply_delta(text, item.data)
+    return text
+
+
+def iter_contents(revisions):
+    """
+    (версия, текст) для queryset версий. Идёт по (post, pk) и держит
+    тексты текущей цепочки - дельты собираются без запросов и кеша.
+    """
+    from .models import PostRevision
+
+    texts = {}
+
+    for revision in revisions.order_by("post_id", "pk").iterator(chunk_size=200):
+        if revision.storage == PostRevision.Storage.DELTA and revision.base_id in texts:
+            text = apply_delta(texts[revision.base_id], revision.data)
+        else:
+            text = decode(revision)
+
+        if revision.keyframe_id is None:
+            texts = {}
+        texts[revision.pk] = text
+
+        yield revision, text
+
+
+def later_in_chain(pk, start):
+    """
+    Версии цепочки start после версии pk, с текстами - они могут
+    зависеть от неё и перекодируются до её изменения или удаления.
+    """
+    from .models import PostRevision
+
+    chain = PostRevision.objects.filter(Q(pk=start) | Q(keyframe_id=start))
+
+    return [(item, text) for item, text in iter_contents(chain) if item.pk > pk]
+
+
+def rechain(items, base=None, base_text="", save=True):
+    """
+    Перекодировать последовательность (версия, текст) одной статьи
+    как цепочку от base (или с нового кадра). Пишется по одной
+    строке: дельта ссылается на уже записанную базу.
+    """
+    from .models import PostRevision
+
+    for revision, text in items:
+        encode(revision, text, base, base_text)
+        base, base_text = revision, text
+        if not save:
+            continue
+
+        PostRevision.objects.filter(pk=revision.pk).update(
+            **{name: getattr(revision, name) for name in STORAGE_FIELDS}
+        )
+        content_cache.delete(revision.pk)
+
+
+def stored_size(revision) -> int:
+    return len(revision.raw_content.encode()) + len(revision.data or b"")
+
+
+# ===== ХРАНЕНИЕ ИСТОРИИ =====
+
+def retained(items, current_id=None):
+    """
+    pk версий статьи, которые остаются по правилам хранения: снимки
+    публикаций, текущая версия, последние REVISION_KEEP_DRAFTS черновиков
+    и последняя версия каждого дня среди остальных.
+    items - версии одной статьи по возрастанию pk.
+    """
+    keep_drafts = getattr(settings, "REVISION_KEEP_DRAFTS", 20)
+
+    keep = {current_id} if current_id else set()
+    drafts = []
+    for revision in items:
+        if revision.is_published_snapshot:
+            keep.add(revision.pk)
+        else:
+            drafts.append(revision)
+
+    older = drafts[:-keep_drafts] if keep_drafts else drafts
+    keep.update(revision.pk for revision in drafts[len(older):])
+
+    # по возрастанию pk: последняя за день перезаписывает предыдущие
+    daily = {timezone.localdate(revision.created_at): revision.pk for revision in older}
+    keep.update(daily.values())
+
+    return keep
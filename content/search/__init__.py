@@ -0,0 +1,39 @@
+from django.conf import settings
+from django.db import connection
+
+from .base import LikeSearchBackend, SearchBackend
+
+
+_backend = None
+
+
+def get_search_backend() -> SearchBackend:
+    """
+    SEARCH_BACKEND: "postgres", "index" или "like".
+    По умолчанию - PostgreSQL FTS на PostgreSQL, встроенный индекс на остальных.
+    """
+    global _backend
+
+    if _backend is None:
+        name = getattr(settings, "SEARCH_BACKEND", "") or (
+            "postgres" if connection.vendor == "postgresql" else "index"
+        )
+
+        if name == "postgres":
+            from .postgres import PostgresSearchBackend
+            _backend = PostgresSearchBackend()
+        elif name == "index":
+            from .index import InvertedIndexBackend
+            _backend = InvertedIndexBackend()
+        else:
+            _backend = LikeSearchBackend()
+
+    return _backend
+
+
+def search_posts(qs, query, **kwargs):
+    return get_search_backend().search(qs, query, **kwargs)
+
+
+def search_snippet(post, query):
+    return get_search_backend().snippet(post, query)
@@ -0,0 +1,72 @@
+from django.db.models import FloatField, Q, Value
+
+from ..utils.snippet import make_snippet
+
+
+class SearchBackend:
+    """
+    Общий интерфейс поиска статей.
+
+    search() фильтрует queryset статей по запросу и добавляет аннотацию
+    search_rank (чем больше - тем релевантнее). Порядок выдачи
+    оставляется вызывающему коду.
+
+    match="all" - все слова запроса, match="any" - хотя бы одно.
+    prefix=True - последнее слово ищется как префикс (живой поиск).
+    """
+
+    def search(self, qs, query, *, match="all", prefix=False, snippets=False):
+        raise NotImplementedError
+
+    def empty(self, qs):
+        return qs.none().annotate(
+            search_rank=Value(0.0, output_field=FloatField())
+        )
+
+    def snippet(self, post, query):
+        text = post.current_revision.plain_text if post.current_revision else ""
+        return make_snippet(text, query)
+
+    def index_post(self, post, force=False):
+        """
+        Обновить индекс после сохранения статьи / смены current_revision.
+        """
+
+    def index_posts(self, posts):
+        """
+        Проиндексировать пачку новых статей (import_content) - у каждой
+        уже есть current_revision.
+        """
+        for post in posts:
+            self.index_post(post, force=True)
+
+    def rebuild(self, posts, batch_size=500):
+        """
+        Полная переиндексация. posts - queryset статей с current_revision.
+        """
+        total = 0
+        for post in posts.iterator(chunk_size=batch_size):
+            self.index_post(post, force=True)
+            total += 1
+        return total
+
+
+class LikeSearchBackend(SearchBackend):
+    """
+    Прежний поиск через icontains - для баз без собственного индекса.
+    """
+
+    def search(self, qs, query, *, match="all", prefix=False, snippets=False):
+        words = query.split() if match == "any" else [query]
+
+        condition = Q()
+        for word in words:
+            condition |= (
+                Q(title__icontains=word) |
+                Q(summary__icontains=word) |
+                Q(current_revision__plain_text__icontains=word)
+            )
+
+        return qs.filter(condition).annotate(
+            search_rank=Value(0.0, output_field=FloatField())
+        )
@@ -0,0 +1,308 @@
+import hashlib
+import math
+import re
+from collections import defaultdict
+from functools import lru_cache
+
+from django.db import connection, transaction
+from django.db.models import Avg, Case, Count, FloatField, Q, Value, When
+
+from .base import SearchBackend
+from ..utils.stemmer import stem as _stem
+
+
+TOKEN_RE = re.compile(r"[^\W_]+")
+QUERY_RE = re.compile(r'"([^"]*)"|(\S+)')
+
+CYRILLIC_RE = re.compile(r"[а-яё]")
+
+# вес вхождения в зависимости от поля
+TITLE_WEIGHT = 3
+SUMMARY_WEIGHT = 2
+CONTENT_WEIGHT = 1
+
+# BM25
+K1 = 1.2
+B = 0.75
+
+# сколько терминов может раскрыть префикс живого поиска
+MAX_PREFIX_TERMS = 50
+
+MAX_TERM_LENGTH = 64
+
+
+@lru_cache(maxsize=100_000)
+def stem(token):
+    # словарь статей повторяется - стемминг каждой формы считается один раз
+    if CYRILLIC_RE.search(token):
+        token = _stem(token)
+    return token[:MAX_TERM_LENGTH]
+
+
+def tokenize(text):
+    """
+    Текст -> список основ слов (по порядку, для позиций).
+    """
+    return [stem(token) for token in TOKEN_RE.findall(text.lower())]
+
+
+def parse_query(query, match="all"):
+    """
+    Разбор запроса: "фраза в кавычках", OR / | между словами.
+    Возвращает (operator, clauses), где clause - кортеж основ
+    (одна основа - слово, несколько - фраза).
+    """
+    operator = "or" if match == "any" else "and"
+    clauses = []
+
+    for phrase, word in QUERY_RE.findall(query):
+        if word in ("OR", "|", "ИЛИ"):
+            operator = "or"
+            continue
+
+        terms = tokenize(phrase or word)
+        if terms:
+            clauses.append(tuple(terms))
+
+    return operator, clauses
+
+
+class InvertedIndexBackend(SearchBackend):
+    """
+    Встроенный индекс на таблицах SearchDocument / SearchPosting:
+    основы слов русского стеммера, ранжирование BM25,
+    AND / OR / фразы в кавычках.
+    """
+
+    # ===== ИНДЕКСАЦИЯ =====
+
+    def build_document(self, post):
+        revision = post.current_revision if post.current_revision_id else None
+        text = revision.plain_text if revision else ""
+
+        frequencies = defaultdict(int)
+        positions = defaultdict(list)
+        position = 0
+
+        for text, weight in (
+            (post.title, TITLE_WEIGHT),
+            (post.summary, SUMMARY_WEIGHT),
+            (text, CONTENT_WEIGHT),
+        ):
+            for term in tokenize(text or ""):
+                frequencies[term] += weight
+                positions[term].append(position)
+                position += 1
+
+            # разрыв между полями, чтобы фраза не склеивалась через границу
+            position += 1
+
+        return position, frequencies, positions
+
+    def checksum(self, post):
+        value = f"{post.title}\x00{post.summary}\x00{post.current_revision_id}"
+        return hashlib.sha1(value.encode()).hexdigest()
+
+    def index_post(self, post, force=False):
+        from ..models import SearchDocument
+
+        checksum = self.checksum(post)
+
+        if not force and SearchDocument.objects.filter(
+            post_id=post.pk, checksum=checksum
+        ).exists():
+            return
+
+        with transaction.atomic():
+            self._delete(post.pk)
+            self._write([(post, checksum)])
+
+    def index_posts(self, posts):
+        # новые статьи - удалять из индекса нечего
+        self._write([(post, self.checksum(post)) for post in posts])
+
+    def rebuild(self, posts, batch_size=500):
+        from ..models import SearchDocument, SearchPosting
+
+        with transaction.atomic():
+            SearchPosting.objects.all().delete()
+            SearchDocument.objects.all().delete()
+
+        batch = []
+        total = 0
+        for post in posts.iterator(chunk_size=batch_size):
+            batch.append((post, self.checksum(post)))
+
+            if len(batch) >= batch_size:
+                self._write(batch)
+                total += len(batch)
+                batch = []
+
+        if batch:
+            self._write(batch)
+            total += len(batch)
+
+        return total
+
+    def _delete(self, post_id):
+        from ..models import SearchDocument, SearchPosting
+
+        SearchPosting.objects.filter(post_id=post_id).delete()
+        SearchDocument.objects.filter(post_id=post_id).delete()
+
+    def _write(self, items):
+        from ..models import SearchDocument, SearchPosting
+
+        documents = []
+        postings = []
+
+        for post, checksum in items:
+            length, frequencies, positions = self.build_document(post)
+
+            documents.append(
+                SearchDocument(post_id=post.pk, length=length, checksum=checksum)
+            )
+            postings.extend(
+                (term, post.pk, frequency, " ".join(map(str, positions[term])))
+                for term, frequency in frequencies.items()
+            )
+
+        SearchDocument.objects.bulk_create(documents, batch_size=500)
+
+        # сотни строк на статью - executemany без создания объектов модели
+        table = connection.ops.quote_name(SearchPosting._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f"INSERT INTO {table} (term, post_id, frequency, positions) "
+                "VALUES (%s, %s, %s, %s)",
+                postings,
+            )
+
+    # ===== ПОИСК =====
+
+    def search(self, qs, query, *, match="all", prefix=False, snippets=False):
+        scores = self.score(query, match=match, prefix=prefix)
+
+        if not scores:
+            return self.empty(qs)
+
+        # все подходящие статьи без отсечения: qs часто уже сужен до
+        # раздела или каталога, и глобальный топ терял бы их статьи
+        return qs.filter(pk__in=list(scores)).annotate(
+            search_rank=Case(
+                *[When(pk=pk, then=Value(score)) for pk, score in scores.items()],
+                default=Value(0.0),
+                output_field=FloatField(),
+            )
+        )
+
+    def score(self, query, *, match="all", prefix=False):
+        """
+        Возвращает {post_id: BM25} для статей, подходящих под запрос.
+        """
+        from ..models import SearchDocument, SearchPosting
+
+        operator, clauses = parse_query(query, match)
+
+        if not clauses:
+            return {}
+
+        prefix_term = clauses[-1][-1] if prefix and len(clauses[-1]) == 1 else None
+
+        terms = {term for clause in clauses for term in clause}
+        condition = Q(term__in=terms)
+
+        if prefix_term:
+            expanded = list(
+                SearchPosting.objects
+                .filter(term__gte=prefix_term, term__lt=prefix_term + "\uffff")
+                .values_list("term", flat=True)
+                .distinct()[:MAX_PREFIX_TERMS]
+            )
+            condition |= Q(term__in=expanded)
+
+        postings = defaultdict(dict)
+        for term, post_id, frequency in (
+            SearchPosting.objects
+            .filter(condition)
+            .values_list("term", "post_id", "frequency")
+        ):
+            postings[term][post_id] = frequency
+
+        def clause_posts(clause):
+            if clause[-1] == prefix_term and len(clause) == 1:
+                matched = set()
+                for term, docs in postings.items():
+                    if term.startswith(prefix_term):
+                        matched.update(docs)
+                return matched
+
+            matched = set(postings.get(clause[0], {}))
+            for term in clause[1:]:
+                matched &= set(postings.get(term, {}))
+
+            if len(clause) > 1 and matched:
+                matched = self._match_phrase(clause, matched)
+
+            return matched
+
+        sets = [clause_posts(clause) for clause in clauses]
+        if operator == "and":
+            candidates = set.intersection(*sets)
+        else:
+            candidates = set.union(*sets)
+
+        if not candidates:
+            return {}
+
+        stats = SearchDocument.objects.aggregate(total=Count("pk"), avg=Avg("length"))
+        total = stats["total"] or 1
+        avg_length = stats["avg"] or 1
+
+        lengths = dict(
+            SearchDocument.objects
+            .filter(post_id__in=candidates)
+            .values_list("post_id", "length")
+        )
+
+        scores = defaultdict(float)
+        for term, docs in postings.items():
+            idf = math.log(1 + (total - len(docs) + 0.5) / (len(docs) + 0.5))
+
+            for post_id, frequency in docs.items():
+                if post_id not in candidates:
+                    continue
+
+                norm = 1 - B + B * lengths.get(post_id, avg_length) / avg_length
+                scores[post_id] += idf * frequency * (K1 + 1) / (frequency + K1 * norm)
+
+        return dict(scores)
+
+    def _match_phrase(self, clause, post_ids):
+        """
+        Позиции нужны только для фраз - читаются отдельно и только
+        для статей, где уже есть все слова фразы.
+        """
+        from ..models import SearchPosting
+
+        positions = defaultdict(dict)
+        for term, post_id, value in (
+            SearchPosting.objects
+            .filter(term__in=set(clause), post_id__in=post_ids)
+            .values_list("term", "post_id", "positions")
+        ):
+            positions[post_id][term] = set(map(int, value.split()))
+
+        matched = set()
+        for post_id, by_term in positions.items():
+            first = by_term.get(clause[0], ())
+            if any(
+                all(
+                    start + offset in by_term.get(term, ())
+                    for offset, term in enumerate(clause[1:], 1)
+                )
+                for start in first
+            ):
+                matched.add(post_id)
+
+        return matched
@@ -0,0 +1,119 @@
+import re
+
+from django.contrib.postgres.search import (
+    SearchHeadline,
+    SearchQuery,
+    SearchRank,
+    SearchVector,
+)
+from django.db.models import F, OuterRef, Subquery, Value
+from django.utils.html import escape
+
+from .base import SearchBackend
+
+
+SEARCH_CONFIG = "russian"
+
+WORD_RE = re.compile(r"[^\W_]+")
+
+
+# ts_headline не экранирует текст: подсветку ставим служебными символами,
+# экранируем результат и только потом превращаем их в <mark>
+MARK_START = "\x02"
+MARK_STOP = "\x03"
+
+
+class PostgresSearchBackend(SearchBackend):
+    """
+    Полнотекстовый поиск по Post.search_vector (GIN-индекс):
+    ранжирование через ts_rank, фрагменты через ts_headline.
+    """
+
+    def build_query(self, query, *, match="all", prefix=False):
+        words = WORD_RE.findall(query)
+
+        if not words:
+            return None
+
+        if match == "all" and not prefix:
+            return SearchQuery(query, config=SEARCH_CONFIG, search_type="websearch")
+
+        if prefix:
+            words[-1] += ":*"
+
+        operator = " | " if match == "any" else " & "
+        return SearchQuery(
+            operator.join(words),
+            config=SEARCH_CONFIG,
+            search_type="raw",
+        )
+
+    def search(self, qs, query, *, match="all", prefix=False, snippets=False):
+        tsquery = self.build_query(query, match=match, prefix=prefix)
+
+        if tsquery is None:
+            return self.empty(qs)
+
+        qs = qs.filter(search_vector=tsquery).annotate(
+            search_rank=SearchRank(F("search_vector"), tsquery)
+        )
+
+        if snippets:
+            qs = qs.annotate(
+                search_headline=SearchHeadline(
+                    F("current_revision__plain_text"),
+                    tsquery,
+                    config=SEARCH_CONFIG,
+                    start_sel=MARK_START,
+                    stop_sel=MARK_STOP,
+                    max_words=30,
+                    min_words=15,
+                    max_fragments=1,
+                )
+            )
+
+        return qs
+
+    def snippet(self, post, query):
+        headline = getattr(post, "search_headline", None)
+
+        if headline is None:
+            return super().snippet(post, query)
+
+        return (
+            escape(headline)
+            .replace(MARK_START, "<mark>")
+            .replace(MARK_STOP, "</mark>")
+        )
+
+    def index_post(self, post, force=False):
+        from ..models import Post
+
+        revision = post.current_revision if post.current_revision_id else None
+        text = revision.plain_text if revision else ""
+
+        Post.objects.filter(pk=post.pk).update(
+            search_vector=(
+                SearchVector(Value(post.title), weight="A", config=SEARCH_CONFIG) +
+                SearchVector(Value(post.summary), weight="B", config=SEARCH_CONFIG) +
+                SearchVector(Value(text), weight="C", config=SEARCH_CONFIG)
+            )
+        )
+
+    def index_posts(self, posts):
+        from ..models import Post, PostRevision
+
+        # один UPDATE на пачку: текст версии - подзапросом в базе
+        text = Subquery(
+            PostRevision.objects
+            .filter(pk=OuterRef("current_revision_id"))
+            .values("plain_text")[:1]
+        )
+
+        Post.objects.filter(pk__in=[post.pk for post in posts]).update(
+            search_vector=(
+                SearchVector("title", weight="A", config=SEARCH_CONFIG) +
+                SearchVector("summary", weight="B", config=SEARCH_CONFIG) +
+                SearchVector(text, weight="C", config=SEARCH_CONFIG)
+            )
+        )
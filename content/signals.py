@@ -1,15 +1,26 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_init, post_save, post_delete, pre_delete, m2m_changed
 from django.dispatch import receiver
 from django.utils import timezone
 from django.contrib.auth import get_user_model
-from django.core.cache import cache
+from django.contrib.auth.models import Group
 from django.db import transaction
 
-from .models import UserProfile, Post, PostRevision
-from .emails import send_new_post_email, send_post_update_email  # <-- важно
+from .models import UserProfile, Post, PostRevision, Section, NotificationEvent, Bookmark, PostImage
+from .cache import namespace
+from .tree import bump_tree_version, invalidate_subtree_posts
+from .render import invalidate_rendered_body
+from .diff import invalidate_diffs
+from .permissions import invalidate_user_groups
+from .conditional import bump_content_version, touch_user_state
+from .images import schedule_variants
+from .search import get_search_backend
+from . import notifications, revisions
 
 User = get_user_model()
 
+# флаги между обработчиками сигналов - без L1, видны всем воркерам сразу
+post_flags = namespace("post_flags", local=False)
+
 print("SIGNALS LOADED", __name__)
 
 @receiver(post_save, sender=User, dispatch_uid="create_user_profile_once")
@@ -25,19 +36,10 @@ def notify_new_post(sender, instance, created, **kwargs):
 
     post = instance  # 🔹 ЯВНО фиксируем
 
-    cache.set(f"post_just_created:{post.pk}", True, timeout=30)
-
-    def _send():
-        profiles = UserProfile.objects.select_related("user")
-        for profile in profiles:
-            if (
-                profile.email
-                and profile.email_confirmed
-                and profile.notify_new_posts
-            ):
-                send_new_post_email(profile.email, post)
+    post_flags.set(f"just_created:{post.pk}", True, timeout=30)
 
-    transaction.on_commit(_send)
+    # одна строка-событие в той же транзакции; письма - воркер send_outbox
+    notifications.publish(NotificationEvent.Kind.NEW_POST, post.pk)
 
 
 
@@ -53,25 +55,14 @@ def notify_post_update(sender, instance, created, **kwargs):
     post = instance.post
 
     # если пост только что создан — это часть публикации, не обновление
-    if cache.get(f"post_just_created:{post.pk}"):
+    if post_flags.get(f"just_created:{post.pk}"):
         return
 
     # обновления шлём только для опубликованных статей
     if post.status != Post.Status.PUBLISHED:
         return
 
-    def _send():
-        profiles = UserProfile.objects.select_related("user")
-
-        for profile in profiles:
-            if (
-                profile.email
-                and profile.email_confirmed
-                and profile.notify_updates
-            ):
-                send_post_update_email(profile.email, post)
-
-    transaction.on_commit(_send)
+    notifications.publish(NotificationEvent.Kind.POST_UPDATE, post.pk)
 
 
 @receiver(post_save, sender=Post, dispatch_uid="ensure_initial_revision_once")
@@ -91,10 +82,159 @@ def ensure_initial_revision(sender, instance: Post, created: bool, **kwargs):
     Post.objects.filter(pk=instance.pk).update(current_revision=revision)
 
 
+@receiver(post_init, sender=Post, dispatch_uid="post_loaded_status")
+def remember_loaded_status(sender, instance: Post, **kwargs):
+    # статус из базы - для ensure_published_at; отложенное поле не читаем
+    instance._loaded_status = instance.__dict__.get("status")
+
+
 @receiver(post_save, sender=Post, dispatch_uid="ensure_published_at_once")
 def ensure_published_at(sender, instance: Post, created: bool, **kwargs):
     """
     Если статус опубликован, а published_at не задан - проставляем.
+    Переход в «опубликовано» (редактор, админка, смена статуса без новой
+    версии) поднимает статью в ленте.
     """
-    if instance.status == Post.Status.PUBLISHED and not instance.published_at:
-        Post.objects.filter(pk=instance.pk).update(published_at=timezone.now())
+    previous = instance._loaded_status
+    instance._loaded_status = instance.status
+
+    if instance.status != Post.Status.PUBLISHED:
+        return
+
+    now = timezone.now()
+    changes = {}
+
+    if not instance.published_at:
+        changes["published_at"] = now
+
+    # при создании feed_at и так - время создания
+    if not created and previous is not None and previous != Post.Status.PUBLISHED:
+        changes["feed_at"] = now
+
+    if changes:
+        Post.objects.filter(pk=instance.pk).update(**changes)
+        for field, value in changes.items():
+            setattr(instance, field, value)
+
+
+@receiver(post_save, sender=PostRevision, dispatch_uid="feed_at_new_revision")
+def bump_feed_at(sender, instance: PostRevision, created: bool, **kwargs):
+    # новая версия поднимает в ленте опубликованную статью; правки
+    # черновика ленту не трогают
+    if not created:
+        return
+
+    if PostRevision.post.is_cached(instance):
+        # edit_post уже поменял статус в памяти и следом сохраняет
+        # статью целиком - решаем по нему и не затираем старым значением
+        post = instance.post
+        if post.status != Post.Status.PUBLISHED:
+            return
+
+        Post.objects.filter(pk=post.pk).update(feed_at=instance.created_at)
+        post.feed_at = instance.created_at
+    else:
+        Post.objects.filter(
+            pk=instance.post_id, status=Post.Status.PUBLISHED
+        ).update(feed_at=instance.created_at)
+
+
+@receiver(post_save, sender=Post, dispatch_uid="update_search_index_once")
+def update_search_index(sender, instance: Post, **kwargs):
+    get_search_backend().index_post(instance)
+
+
+@receiver(post_save, sender=Section, dispatch_uid="section_tree_saved")
+@receiver(post_delete, sender=Section, dispatch_uid="section_tree_deleted")
+def invalidate_section_tree(sender, instance, **kwargs):
+    # после коммита: Section.save() ещё дописывает path поддерева
+    transaction.on_commit(bump_tree_version)
+
+
+@receiver(post_save, sender=Post, dispatch_uid="subtree_posts_post_saved")
+@receiver(post_delete, sender=Post, dispatch_uid="subtree_posts_post_deleted")
+@receiver(post_save, sender=Section, dispatch_uid="subtree_posts_section_saved")
+@receiver(post_delete, sender=Section, dispatch_uid="subtree_posts_section_deleted")
+def invalidate_section_posts(sender, instance, **kwargs):
+    # статус, порядок, заголовок, раздел статьи или место раздела в дереве
+    transaction.on_commit(invalidate_subtree_posts)
+
+
+@receiver(post_save, sender=PostRevision, dispatch_uid="rendered_body_saved")
+@receiver(post_delete, sender=PostRevision, dispatch_uid="rendered_body_deleted")
+def invalidate_post_body(sender, instance, created=False, **kwargs):
+    # новые версии получают новый id - сбрасываем тело и сравнения версий
+    # только при правке или удалении существующей;
+    # после коммита, чтобы другой воркер не закешировал старый текст заново
+    if not created:
+        pk = instance.pk
+        transaction.on_commit(lambda: invalidate_rendered_body(pk))
+        transaction.on_commit(invalidate_diffs)
+
+
+@receiver(pre_delete, sender=PostRevision, dispatch_uid="rechain_revisions_on_delete")
+def rechain_revisions(sender, instance, origin=None, **kwargs):
+    # статья удаляется целиком - цепочки уходят вместе с ней
+    if isinstance(origin, Post) or getattr(origin, "model", None) is Post:
+        return
+
+    # из базы: при удалении нескольких версий предыдущий вызов
+    # уже мог перекодировать эту
+    keyframe_id = (
+        PostRevision.objects.filter(pk=instance.pk)
+        .values_list("keyframe_id", flat=True).first()
+    )
+    later = revisions.later_in_chain(instance.pk, keyframe_id or instance.pk)
+    revisions.rechain(later)
+
+
+@receiver(m2m_changed, sender=User.groups.through, dispatch_uid="user_groups_changed")
+def invalidate_groups_of_user(sender, instance, action, reverse, pk_set, **kwargs):
+    if not action.startswith("post_"):
+        return
+
+    if reverse:
+        # group.user_set.add(...) - instance это группа
+        if pk_set is None:
+            invalidate_user_groups()
+        else:
+            for user_id in pk_set:
+                invalidate_user_groups(user_id)
+    else:
+        invalidate_user_groups(instance.pk)
+
+
+@receiver(post_save, sender=Group, dispatch_uid="group_saved")
+@receiver(post_delete, sender=Group, dispatch_uid="group_deleted")
+def invalidate_all_groups(sender, instance, **kwargs):
+    # переименование или удаление группы касается всех её участников
+    invalidate_user_groups()
+
+
+@receiver(post_save, sender=Post, dispatch_uid="content_version_post_saved")
+@receiver(post_delete, sender=Post, dispatch_uid="content_version_post_deleted")
+@receiver(post_save, sender=PostRevision, dispatch_uid="content_version_revision_saved")
+@receiver(post_delete, sender=PostRevision, dispatch_uid="content_version_revision_deleted")
+def invalidate_content_etags(sender, instance, **kwargs):
+    # ETag страниц и API (conditional.py) перестают совпадать
+    transaction.on_commit(bump_content_version)
+
+
+@receiver(post_save, sender=Bookmark, dispatch_uid="user_state_bookmark_saved")
+@receiver(post_delete, sender=Bookmark, dispatch_uid="user_state_bookmark_deleted")
+@receiver(post_save, sender=UserProfile, dispatch_uid="user_state_profile_saved")
+def invalidate_user_etags(sender, instance, **kwargs):
+    user_id = instance.user_id
+    transaction.on_commit(lambda: touch_user_state(user_id))
+
+
+@receiver(post_save, sender=PostImage, dispatch_uid="image_variants_post_image")
+def make_post_image_variants(sender, instance, **kwargs):
+    # в пуле потоков после коммита; уже готовые варианты не пересчитываются
+    schedule_variants(instance.image.name)
+
+
+@receiver(post_save, sender=Post, dispatch_uid="image_variants_cover")
+def make_cover_variants(sender, instance, **kwargs):
+    if instance.cover_image:
+        schedule_variants(instance.cover_image.name)
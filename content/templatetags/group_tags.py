@@ -1,7 +1,10 @@
 from django import template
 
+from content.permissions import has_group as _has_group
+
 register = template.Library()
 
 @register.filter
 def has_group(user, group_name):
-    return user.groups.filter(name=group_name).exists()
+    # группы читаются один раз за запрос (content/permissions.py)
+    return _has_group(user, group_name)
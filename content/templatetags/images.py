@@ -0,0 +1,32 @@
+from django import template
+from django.utils.html import format_html
+
+from content.images import DEFAULT_SIZES, fallback_url, srcset, variants_for
+
+register = template.Library()
+
+
+@register.simple_tag
+def responsive_image(image, alt="", sizes=DEFAULT_SIZES, css_class=""):
+    """
+    {% responsive_image post.cover_image post.title %} - <picture> с
+    WebP/JPEG srcset; пока вариантов нет - исходный файл.
+    """
+    if not image:
+        return ""
+
+    item = variants_for([image.name]).get(image.name)
+
+    if not item or "jpeg" not in item:
+        return format_html('<img src="{}" alt="{}" class="{}" loading="lazy">', image.url, alt, css_class)
+
+    width, height = item["size"]
+
+    return format_html(
+        '<picture><source type="image/webp" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}" width="{}" height="{}" alt="{}" '
+        'class="{}" loading="lazy" decoding="async"></picture>',
+        srcset(item.get("webp", [])), sizes,
+        fallback_url(item["jpeg"]), srcset(item["jpeg"]), sizes,
+        width, height, alt, css_class,
+    )
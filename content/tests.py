@@ -1,3 +1,745 @@
-from django.test import TestCase
+import os
+import shutil
+import tempfile
+import time
+from datetime import datetime, timedelta
+from io import BytesIO, StringIO
+from unittest.mock import patch
 
-# Create your tests here.
+from django.contrib.auth.models import Group, User
+from django.core import mail
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import F
+from django.db.models.functions import Length
+from django.http import QueryDict
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from . import bus
+from .cache import all_namespaces
+from .conditional import get_content_version
+from .images import generate_variants
+from .models import (
+    CacheInvalidation, NotificationEvent, Post, PostImage, PostRevision, Section, UserProfile,
+)
+from .pagination import KeysetPaginator, ListPaginator, encode_cursor
+from .permissions import PUBLISHERS
+from .render import body_cache, body_cache_key, get_rendered_body
+from .revisions import content_cache, retained
+from .search import search_posts
+
+
+LOCMEM_CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+}
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class CacheTestCase(TestCase):
+    """
+    Общий кеш - locmem на тест, L1 пространств очищается: id строк
+    между тестами повторяются.
+    """
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        for ns in all_namespaces().values():
+            ns.local.clear()
+
+
+class MediaTestCase(CacheTestCase):
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def save_image(self, name, size=(800, 600)):
+        buffer = BytesIO()
+        Image.new("RGB", size, "red").save(buffer, format="PNG")
+        return default_storage.save(name, ContentFile(buffer.getvalue()))
+
+
+class PostImageDimensionsTests(MediaTestCase):
+    def test_missing_cover_file_does_not_break_loading(self):
+        section = Section.objects.create(title="Раздел")
+        post = Post.objects.create(section=section, title="Статья")
+        Post.objects.filter(pk=post.pk).update(cover_image="posts/covers/missing.jpg")
+
+        loaded = Post.objects.get(pk=post.pk)
+
+        self.assertEqual(loaded.cover_image.name, "posts/covers/missing.jpg")
+        self.assertIsNone(loaded.cover_width)
+
+
+class RenderedBodyImageTests(MediaTestCase):
+    def test_new_variants_reset_only_bodies_with_the_image(self):
+        source = self.save_image("posts/images/photo.png")
+        post = Post.objects.create(section=Section.objects.create(title="Раздел"), title="Статья")
+        with_image = PostRevision.objects.create(
+            post=post, content=f'<p><img src="/media/{source}"></p>'
+        )
+        without_image = PostRevision.objects.create(post=post, content="<p>Текст</p>")
+
+        self.assertNotIn("<picture>", get_rendered_body(with_image)["html"])
+        get_rendered_body(without_image)
+        version = get_content_version()
+
+        generate_variants(source)
+
+        self.assertIsNone(body_cache.get(body_cache_key(with_image.pk)))
+        self.assertIsNotNone(body_cache.get(body_cache_key(without_image.pk)))
+        self.assertIn("<picture>", get_rendered_body(with_image)["html"])
+        self.assertNotEqual(get_content_version(), version)
+
+    def test_encoded_non_ascii_src_gets_variants(self):
+        source = self.save_image("posts/images/фото.png")
+        generate_variants(source)
+        url = PostImage(image=source).image.url
+        self.assertIn("%D1%84", url)
+
+        post = Post.objects.create(section=Section.objects.create(title="Раздел"), title="Статья")
+        revision = PostRevision.objects.create(post=post, content=f'<p><img src="{url}"></p>')
+
+        html = get_rendered_body(revision)["html"]
+        self.assertIn("<picture>", html)
+        self.assertIn("srcset=", html)
+
+    def test_variants_of_unused_image_keep_pages_cached(self):
+        source = self.save_image("posts/images/unused.png")
+        version = get_content_version()
+
+        generate_variants(source)
+
+        self.assertEqual(get_content_version(), version)
+
+
+class CollectImagesTests(MediaTestCase):
+    def age(self, name, days=30):
+        path = default_storage.path(name)
+        stamp = time.time() - days * 24 * 60 * 60
+        os.utime(path, (stamp, stamp))
+
+    def test_files_linked_from_revisions_are_kept(self):
+        linked = self.save_image("posts/images/linked.png")
+        stray = self.save_image("posts/images/stray.png")
+        self.age(linked)
+        self.age(stray)
+
+        post = Post.objects.create(section=Section.objects.create(title="Раздел"), title="Статья")
+        PostRevision.objects.create(post=post, content=f'<p><img src="/media/{linked}"></p>')
+
+        call_command("collect_images", stdout=StringIO())
+
+        self.assertTrue(default_storage.exists(linked))
+        self.assertFalse(default_storage.exists(stray))
+
+    def test_non_ascii_name_linked_by_encoded_url_is_kept(self):
+        name = self.save_image("posts/images/фото.png")
+        self.age(name)
+        image = PostImage.objects.create(image=name)
+        PostImage.objects.update(uploaded_at=timezone.now() - timedelta(days=30))
+
+        # в HTML версии - адрес из FieldFile.url, с %-кодированием
+        self.assertIn("%D1%84", image.image.url)
+        post = Post.objects.create(section=Section.objects.create(title="Раздел"), title="Статья")
+        PostRevision.objects.create(post=post, content=f'<p><img src="{image.image.url}"></p>')
+
+        call_command("collect_images", stdout=StringIO())
+
+        self.assertTrue(PostImage.objects.filter(pk=image.pk).exists())
+        self.assertTrue(default_storage.exists(name))
+
+    def test_reuploaded_image_is_not_collected(self):
+        publisher = User.objects.create_user("editor", password="pass")
+        publisher.groups.add(Group.objects.create(name=PUBLISHERS))
+        self.client.force_login(publisher)
+
+        def upload():
+            buffer = BytesIO()
+            Image.new("RGB", (40, 40), "blue").save(buffer, format="PNG")
+            file = SimpleUploadedFile("photo.png", buffer.getvalue(), content_type="image/png")
+            return self.client.post(reverse("upload_editor_image"), {"image": file})
+
+        self.assertEqual(upload().status_code, 200)
+        image = PostImage.objects.get()
+        PostImage.objects.update(uploaded_at=timezone.now() - timedelta(days=30))
+        self.age(image.image.name)
+
+        # та же картинка снова вставлена в редакторе, статья ещё не сохранена
+        self.assertEqual(upload().status_code, 200)
+        call_command("collect_images", stdout=StringIO())
+
+        self.assertTrue(PostImage.objects.filter(pk=image.pk).exists())
+        self.assertTrue(default_storage.exists(image.image.name))
+
+
+class SlugAllocationTests(CacheTestCase):
+    def setUp(self):
+        super().setUp()
+        self.section = Section.objects.create(title="Раздел")
+
+    def test_same_titled_posts_cost_a_constant_number_of_queries(self):
+        counts = []
+        slug_lookups = []
+
+        def count(execute, sql, params, many, context):
+            counts[-1] += 1
+            if "LIKE" in sql and '"slug"' in sql:
+                slug_lookups[-1] += 1
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(count):
+            for _ in range(1000):
+                counts.append(0)
+                slug_lookups.append(0)
+                Post.objects.create(section=self.section, title="Занятие")
+
+        slugs = set(Post.objects.values_list("slug", flat=True))
+        self.assertEqual(len(slugs), 1000)
+        self.assertIn("zaniatie", slugs)
+        self.assertIn("zaniatie-999", slugs)
+
+        # число запросов на статью не растёт с числом занятых slug-ов
+        # (остальное - сигналы: версия, поиск, уведомления, savepoint)
+        self.assertEqual(set(slug_lookups), {1})
+        self.assertEqual(min(counts), max(counts))
+        self.assertLessEqual(max(counts), 20)
+
+    def test_slug_taken_concurrently_is_allocated_again(self):
+        Post.objects.create(section=self.section, title="Занятие")
+
+        # соседний запрос выбрал тот же slug и успел сохранить его первым
+        with patch("content.utils.slug.allocate_slug", side_effect=["zaniatie", "zaniatie-1"]):
+            post = Post.objects.create(section=self.section, title="Занятие")
+
+        self.assertEqual(post.slug, "zaniatie-1")
+        self.assertEqual(Post.objects.count(), 2)
+
+
+@override_settings(EMAIL_BACKEND="django.core.mail.backends.locmem.EmailBackend")
+class NotificationDeliveryTests(CacheTestCase):
+    def setUp(self):
+        super().setUp()
+        self.section = Section.objects.create(title="Раздел")
+        self.subscribers = 0
+
+        publisher = User.objects.create_user("editor", password="pass")
+        publisher.groups.add(Group.objects.create(name=PUBLISHERS))
+        self.client.force_login(publisher)
+
+    def add_subscribers(self, count):
+        start, self.subscribers = self.subscribers, self.subscribers + count
+        users = User.objects.bulk_create(
+            [User(username=f"reader{i}") for i in range(start, self.subscribers)]
+        )
+        UserProfile.objects.bulk_create([
+            UserProfile(user=user, email=f"{user.username}@example.com", email_confirmed=True)
+            for user in users
+        ])
+
+    def publish(self, title):
+        queries = []
+
+        def count(execute, sql, params, many, context):
+            queries.append(sql)
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(count):
+            response = self.client.post(reverse("create_post"), {
+                "section": self.section.pk,
+                "title": title,
+                "content": "<p>Текст статьи</p>",
+                "status": Post.Status.PUBLISHED,
+            })
+
+        self.assertEqual(response.status_code, 302)
+        return len(queries)
+
+    def drain(self):
+        mail.outbox = []
+        call_command("send_outbox", "--once", "--rate", "0", stdout=StringIO())
+        return len(mail.outbox)
+
+    def test_publish_cost_does_not_depend_on_subscriber_count(self):
+        self.add_subscribers(10)
+        self.publish("Прогрев")
+        self.drain()
+
+        few = self.publish("Десять подписчиков")
+        self.assertEqual(self.drain(), 10)
+
+        self.add_subscribers(9990)
+        mail.outbox = []
+        many = self.publish("Десять тысяч подписчиков")
+
+        # публикация - одна строка-событие, письма разворачивает воркер
+        self.assertEqual(few, many)
+        self.assertEqual(len(mail.outbox), 0)
+
+        self.assertEqual(self.drain(), 10000)
+        self.assertEqual(
+            {message.to[0] for message in mail.outbox},
+            {f"reader{i}@example.com" for i in range(10000)},
+        )
+
+
+class InvalidationBusTests(TestCase):
+    def setUp(self):
+        bus._last_seen = None
+        bus._gaps.clear()
+        self.keys = []
+        bus._subscribers["test-bus"] = [self.keys.append]
+        self.addCleanup(bus._subscribers.pop, "test-bus")
+
+    def test_event_committed_after_a_later_one_is_applied(self):
+        CacheInvalidation.objects.create(pk=10, namespace="test-bus", key="old")
+        bus.poll()
+
+        # id 11 выдан транзакции, которая закоммитилась после id 12
+        CacheInvalidation.objects.create(pk=12, namespace="test-bus", key="b")
+        bus.poll()
+        CacheInvalidation.objects.create(pk=11, namespace="test-bus", key="a")
+        bus.poll()
+        bus.poll()
+
+        self.assertEqual(self.keys, ["b", "a"])
+        self.assertEqual(bus._gaps, {})
+
+    def test_gap_is_forgotten_after_grace_period(self):
+        CacheInvalidation.objects.create(pk=10, namespace="test-bus", key="old")
+        bus.poll()
+        CacheInvalidation.objects.create(pk=12, namespace="test-bus", key="b")
+        bus.poll()
+        self.assertEqual(list(bus._gaps), [11])
+
+        with patch("content.bus.time.monotonic", return_value=time.monotonic() + bus.GAP_GRACE + 1):
+            bus.poll()
+
+        self.assertEqual(bus._gaps, {})
+
+
+class FeedOrderTests(CacheTestCase):
+    def setUp(self):
+        super().setUp()
+        self.section = Section.objects.create(title="Раздел")
+        self.month_ago = timezone.now() - timedelta(days=30)
+
+    def create(self, status):
+        post = Post.objects.create(section=self.section, title="Статья", status=status)
+        Post.objects.filter(pk=post.pk).update(feed_at=self.month_ago)
+        return Post.objects.get(pk=post.pk)
+
+    def test_publishing_without_new_revision_moves_post_up(self):
+        post = self.create(Post.Status.DRAFT)
+        started = timezone.now()
+
+        # как в админке: только смена статуса
+        post.status = Post.Status.PUBLISHED
+        post.save()
+
+        post.refresh_from_db()
+        self.assertGreaterEqual(post.feed_at, started)
+        self.assertGreaterEqual(post.published_at, started)
+
+    def test_resaving_published_post_keeps_its_place(self):
+        post = self.create(Post.Status.PUBLISHED)
+
+        post.title = "Новый заголовок"
+        post.save()
+
+        post.refresh_from_db()
+        self.assertEqual(post.feed_at, self.month_ago)
+
+    def test_draft_revision_does_not_move_post(self):
+        post = self.create(Post.Status.DRAFT)
+
+        PostRevision.objects.create(post_id=post.pk, content="<p>Черновик</p>")
+
+        post.refresh_from_db()
+        self.assertEqual(post.feed_at, self.month_ago)
+
+    def test_published_revision_moves_post_up(self):
+        post = self.create(Post.Status.PUBLISHED)
+
+        revision = PostRevision.objects.create(post_id=post.pk, content="<p>Правка</p>")
+
+        post.refresh_from_db()
+        self.assertEqual(post.feed_at, revision.created_at)
+
+
+class InvertedIndexSearchTests(CacheTestCase):
+    # встроенный индекс - поиск по умолчанию на SQLite
+
+    def test_results_are_not_cut_to_a_global_top(self):
+        popular = Section.objects.create(title="Тайцзи")
+        quiet = Section.objects.create(title="Синь И")
+        for i in range(250):
+            Post.objects.create(section=popular, title=f"Практика {i}", status=Post.Status.PUBLISHED)
+        Post.objects.create(
+            section=quiet, title="Занятие", summary="практика стойки",
+            status=Post.Status.PUBLISHED,
+        )
+
+        self.assertEqual(search_posts(Post.objects.all(), "практика").count(), 251)
+        self.assertEqual(
+            list(search_posts(Post.objects.filter(section=quiet), "практика").values_list("title", flat=True)),
+            ["Занятие"],
+        )
+
+
+class ImportContentTests(CacheTestCase):
+    def setUp(self):
+        super().setUp()
+        taiji = Section.objects.create(title="Тайцзи", slug="taiji")
+        self.basics = Section.objects.create(title="Базовые", slug="bazovye", parent=taiji)
+
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+    def write(self, name, text):
+        with open(os.path.join(self.directory, name), "w", encoding="utf-8") as file:
+            file.write(text)
+
+    def test_import_directory(self):
+        Post.objects.create(section=self.basics, title="Стойка столба")
+        events = NotificationEvent.objects.count()
+
+        self.write("lesson.md", (
+            "---\n"
+            "title: Стойка столба\n"
+            "section: taiji/bazovye\n"
+            "status: published\n"
+            "created: 2015-03-01\n"
+            "updated: 2016-04-02 10:00\n"
+            "published: 2015-03-02\n"
+            "---\n"
+            "## Начало\n\n"
+            "Первое упражнение - **стойка** у стены.\n"
+        ))
+        self.write("intro.html", (
+            "---\n"
+            "title: Стойка столба\n"
+            "section: taiji/bazovye\n"
+            "status: draft\n"
+            "---\n"
+            "<p>Вступление к занятиям</p>\n"
+        ))
+        self.write("broken.md", "---\nsection: taiji/bazovye\n---\nБез заголовка\n")
+
+        stderr = StringIO()
+        call_command("import_content", self.directory, "--workers", "1", stdout=StringIO(), stderr=stderr)
+
+        self.assertIn("broken.md", stderr.getvalue())
+        self.assertEqual(Post.objects.count(), 3)
+
+        # сортировка файлов: intro.html раньше lesson.md
+        intro = Post.objects.select_related("current_revision").get(slug="stoika-stolba-1")
+        lesson = Post.objects.select_related("current_revision").get(slug="stoika-stolba-2")
+
+        self.assertEqual(intro.status, Post.Status.DRAFT)
+        self.assertIsNone(intro.published_at)
+        self.assertEqual(intro.current_revision.content, "<p>Вступление к занятиям</p>")
+
+        self.assertEqual(lesson.section, self.basics)
+        self.assertEqual(lesson.revisions.get(), lesson.current_revision)
+        self.assertIn("<strong>стойка</strong>", lesson.current_revision.content)
+        self.assertIn("стойка у стены", lesson.current_revision.plain_text)
+
+        tz = timezone.get_current_timezone()
+        self.assertEqual(lesson.created_at, datetime(2015, 3, 1, tzinfo=tz))
+        self.assertEqual(lesson.published_at, datetime(2015, 3, 2, tzinfo=tz))
+        self.assertEqual(lesson.updated_at, datetime(2016, 4, 2, 10, 0, tzinfo=tz))
+        self.assertEqual(lesson.feed_at, lesson.updated_at)
+        self.assertEqual(lesson.current_revision.created_at, lesson.updated_at)
+
+        found = search_posts(Post.objects.all(), "упражнение").values_list("pk", flat=True)
+        self.assertEqual(list(found), [lesson.pk])
+
+        self.assertEqual(NotificationEvent.objects.count(), events)
+
+
+def revision_text(version, changed=0):
+    # длинный текст, где каждая версия правит один абзац - дельты выгоднее кадров
+    return "".join(
+        f"<p>Абзац {i}: стойка столба, дыхание и расслабление плеч"
+        f"{f', правка {version}' if i == changed else ''}.</p>"
+        for i in range(30)
+    )
+
+
+class RevisionStorageTests(CacheTestCase):
+    def setUp(self):
+        super().setUp()
+        self.post = Post.objects.create(section=Section.objects.create(title="Раздел"), title="Статья")
+
+    def add(self, count):
+        created = []
+        for version in range(count):
+            created.append(PostRevision.objects.create(
+                post=self.post, content=revision_text(version, version % 30)
+            ))
+        return created
+
+    def stored(self):
+        # тексты из базы: без кешей собранных дельт
+        cache.clear()
+        content_cache.local.clear()
+        return {
+            revision.pk: revision.content
+            for revision in PostRevision.objects.filter(post=self.post).order_by("pk")
+        }
+
+    def expected(self, created):
+        # первая версия - пустая, её создаёт сигнал при создании статьи
+        texts = {self.post.revisions.order_by("pk").first().pk: ""}
+        for version, revision in enumerate(created):
+            texts[revision.pk] = revision_text(version, version % 30)
+        return texts
+
+    def test_round_trip(self):
+        created = self.add(8)
+
+        self.assertEqual(self.stored(), self.expected(created))
+
+        storages = [
+            revision.storage
+            for revision in PostRevision.objects.filter(pk__in=[r.pk for r in created]).order_by("pk")
+        ]
+        self.assertEqual(storages[0], PostRevision.Storage.KEYFRAME)
+        self.assertEqual(set(storages[1:]), {PostRevision.Storage.DELTA})
+
+    @override_settings(REVISION_KEYFRAME_EVERY=5)
+    def test_new_keyframe_every_n_revisions(self):
+        created = self.add(12)
+
+        rows = list(PostRevision.objects.filter(pk__in=[r.pk for r in created]).order_by("pk"))
+        self.assertEqual([row.chain_index for row in rows], [0, 1, 2, 3, 4] * 2 + [0, 1])
+        keyframes = [row.pk for row in rows if row.storage == PostRevision.Storage.KEYFRAME]
+        self.assertEqual(keyframes, [rows[0].pk, rows[5].pk, rows[10].pk])
+        self.assertEqual(rows[7].keyframe_id, rows[5].pk)
+        self.assertEqual(rows[7].base_id, rows[6].pk)
+
+        self.assertEqual(self.stored(), self.expected(created))
+
+    def test_edit_in_the_middle_of_chain(self):
+        created = self.add(6)
+        expected = self.expected(created)
+
+        middle = PostRevision.objects.get(pk=created[2].pk)
+        middle.content = "<p>Совсем другой текст</p>" + revision_text(99, 5)
+        middle.save()
+        expected[middle.pk] = middle.content
+
+        self.assertEqual(self.stored(), expected)
+
+    def test_delete_in_the_middle_of_chain(self):
+        created = self.add(8)
+        expected = self.expected(created)
+
+        PostRevision.objects.get(pk=created[2].pk).delete()
+        PostRevision.objects.filter(pk__in=[created[4].pk, created[5].pk]).delete()
+        for revision in (created[2], created[4], created[5]):
+            del expected[revision.pk]
+
+        self.assertEqual(self.stored(), expected)
+
+    def test_deleting_post_skips_rechain(self):
+        self.add(5)
+
+        with patch("content.revisions.rechain") as rechain:
+            self.post.delete()
+
+        rechain.assert_not_called()
+        self.assertFalse(PostRevision.objects.exists())
+
+    def test_compress_revisions_converts_plain_rows(self):
+        created = self.add(6)
+        expected = self.expected(created)
+
+        # строки до перехода на сжатое хранение
+        for pk, text in expected.items():
+            PostRevision.objects.filter(pk=pk).update(
+                storage=PostRevision.Storage.RAW, raw_content=text, data=None,
+                keyframe=None, base=None, chain_index=0,
+            )
+
+        call_command("compress_revisions", stdout=StringIO())
+
+        storages = list(PostRevision.objects.order_by("pk").values_list("storage", flat=True))
+        self.assertNotIn(PostRevision.Storage.RAW, storages)
+        self.assertIn(PostRevision.Storage.DELTA, storages)
+        self.assertFalse(PostRevision.objects.exclude(raw_content="").exists())
+        self.assertEqual(self.stored(), expected)
+
+
+@override_settings(REVISION_KEEP_DRAFTS=3)
+class CompactRevisionsTests(CacheTestCase):
+    def setUp(self):
+        super().setUp()
+        self.post = Post.objects.create(section=Section.objects.create(title="Раздел"), title="Статья")
+        self.noon = timezone.localtime().replace(hour=12, minute=0, second=0, microsecond=0)
+
+        # (дней назад, снимок публикации); первая - пустая версия из сигнала
+        self.layout = [
+            (10, False),
+            (9, False), (9, False),
+            (8, True),
+            (7, False), (7, False), (7, False),
+            (6, False), (5, False), (4, False), (3, False),
+        ]
+        self.revisions = [self.post.revisions.get()]
+        self.texts = {self.revisions[0].pk: ""}
+        for version, (_, snapshot) in enumerate(self.layout[1:]):
+            revision = PostRevision.objects.create(
+                post=self.post, content=revision_text(version, version), is_published_snapshot=snapshot,
+            )
+            self.revisions.append(revision)
+            self.texts[revision.pk] = revision_text(version, version)
+
+        for revision, (days, _) in zip(self.revisions, self.layout):
+            PostRevision.objects.filter(pk=revision.pk).update(created_at=self.noon - timedelta(days=days))
+        Post.objects.filter(pk=self.post.pk).update(current_revision=self.revisions[-1])
+
+    def test_retained(self):
+        items = list(PostRevision.objects.filter(post=self.post).order_by("pk"))
+        keep = retained(items, self.revisions[-1].pk)
+
+        # последние 3 черновика, снимок публикации и последняя версия
+        # каждого дня среди остальных
+        expected = {self.revisions[i].pk for i in (0, 2, 3, 6, 7, 8, 9, 10)}
+        self.assertEqual(keep, expected)
+
+    def test_command_deletes_without_per_revision_invalidation(self):
+        kept = {self.revisions[i].pk for i in (0, 2, 3, 6, 7, 8, 9, 10)}
+        CacheInvalidation.objects.all().delete()
+
+        with patch("content.revisions.later_in_chain") as later_in_chain:
+            with self.captureOnCommitCallbacks(execute=True):
+                call_command("compact_revisions", stdout=StringIO())
+
+        later_in_chain.assert_not_called()
+        self.assertEqual(set(PostRevision.objects.values_list("pk", flat=True)), kept)
+
+        # одна пачка - по одному событию сравнений и ETag
+        events = list(CacheInvalidation.objects.values_list("namespace", flat=True))
+        self.assertEqual(events.count("revision_diff"), 1)
+        self.assertEqual(events.count("content"), 1)
+        self.assertNotIn("post_body", events)
+
+        cache.clear()
+        content_cache.local.clear()
+        for revision in PostRevision.objects.all():
+            self.assertEqual(revision.content, self.texts[revision.pk])
+
+
+class KeysetPaginationTests(CacheTestCase):
+    PER_PAGE = 4
+
+    def setUp(self):
+        super().setUp()
+        section = Section.objects.create(title="Раздел")
+        moment = timezone.now()
+
+        # 15 статей на 4 значениях времени: ключ сортировки повторяется
+        for number in range(15):
+            post = Post.objects.create(section=section, title="Статья " + "я" * (number % 3))
+            Post.objects.filter(pk=post.pk).update(
+                feed_at=moment - timedelta(hours=number % 4),
+                published_at=None if number % 5 == 0 else moment - timedelta(days=number % 2),
+            )
+
+    def walk(self, queryset):
+        """
+        Вперёд по after до конца, затем назад по before от последней
+        страницы; возвращает (id вперёд, id назад).
+        """
+        paginator = KeysetPaginator(queryset, self.PER_PAGE)
+
+        forward = []
+        page = paginator.get_page({})
+        forward.extend(post.pk for post in page)
+        while page.has_next():
+            page = paginator.get_page({"after": page.next_cursor})
+            self.assertLessEqual(len(page), self.PER_PAGE)
+            forward.extend(post.pk for post in page)
+
+        backward = [post.pk for post in page]
+        while page.has_previous():
+            page = paginator.get_page({"before": page.previous_cursor})
+            self.assertEqual(len(page), self.PER_PAGE)
+            backward[:0] = [post.pk for post in page]
+
+        return forward, backward
+
+    def assertWalks(self, queryset, expected):
+        forward, backward = self.walk(queryset)
+        self.assertEqual(forward, expected)
+        self.assertEqual(backward, expected)
+
+    def test_tied_sort_keys(self):
+        expected = list(Post.objects.order_by("-feed_at", "-pk").values_list("pk", flat=True))
+        self.assertWalks(Post.objects.order_by("-feed_at"), expected)
+
+    def test_tied_keys_on_two_fields(self):
+        # id - в направлении последнего ключа
+        expected = list(
+            Post.objects.order_by("-feed_at", "title", "pk").values_list("pk", flat=True)
+        )
+        self.assertWalks(Post.objects.order_by("-feed_at", "title"), expected)
+
+    def test_nullable_key_puts_nulls_last(self):
+        expected = list(
+            Post.objects.order_by(F("published_at").desc(nulls_last=True), "-pk")
+            .values_list("pk", flat=True)
+        )
+        self.assertIsNone(Post.objects.get(pk=expected[-1]).published_at)
+        self.assertWalks(Post.objects.order_by("-published_at"), expected)
+
+    def test_annotated_key(self):
+        queryset = Post.objects.annotate(title_length=Length("title"))
+        expected = list(queryset.order_by("title_length", "pk").values_list("pk", flat=True))
+        self.assertWalks(queryset.order_by("title_length"), expected)
+
+    def test_bad_cursor_falls_back_to_first_page(self):
+        paginator = KeysetPaginator(Post.objects.order_by("-feed_at"), self.PER_PAGE)
+        first = [post.pk for post in paginator.get_page({})]
+
+        for cursor in ("не курсор", "e30", encode_cursor([1]), encode_cursor(["x", "y"])):
+            with self.subTest(cursor=cursor):
+                page = paginator.get_page({"after": cursor})
+                self.assertEqual([post.pk for post in page], first)
+                self.assertFalse(page.has_previous())
+
+        items = list(range(10))
+        page = ListPaginator(items, self.PER_PAGE).get_page({"cafter": "не курсор"}, prefix="c")
+        self.assertEqual(list(page), items[:self.PER_PAGE])
+
+    def test_next_query_keeps_other_params(self):
+        params = QueryDict(mutable=True)
+        params.update({"q": "стойка", "type": "post", "after": "старый"})
+        params.setlist("tag", ["a", "b"])
+
+        page = KeysetPaginator(Post.objects.order_by("-feed_at"), self.PER_PAGE).get_page(params)
+        query = QueryDict(page.next_query)
+
+        self.assertEqual(query["q"], "стойка")
+        self.assertEqual(query["type"], "post")
+        self.assertEqual(query["after"], page.next_cursor)
+        self.assertNotIn("before", query)
+
+        page = ListPaginator(list(range(10)), self.PER_PAGE).get_page({"q": "стойка"}, prefix="c")
+        query = QueryDict(page.next_query)
+        self.assertEqual(query["q"], "стойка")
+        self.assertEqual(query["cafter"], page.next_cursor)
@@ -0,0 +1,195 @@
+import threading
+
+from .cache import namespace
+from .models import Post, Section
+
+
+# снимок дерева живёт в памяти процесса, общая только версия
+tree_cache = namespace("section_tree")
+
+# статьи поддерева для боковой панели: (раздел, роль) -> [{id, slug, title}];
+# сбрасывается целиком при сохранении / удалении статьи или раздела
+subtree_posts_cache = namespace("subtree_posts", timeout=60 * 60)
+
+SUBTREE_POSTS_LIMIT = 200
+
+
+class TreeNode:
+    """
+    Лёгкое представление раздела поверх массивов снимка.
+    Поля те же, что использовали шаблоны у Section: id, slug, title, children.
+    """
+
+    __slots__ = ("_tree", "_i")
+
+    def __init__(self, tree, i):
+        self._tree = tree
+        self._i = i
+
+    @property
+    def id(self):
+        return self._tree.ids[self._i]
+
+    pk = id
+
+    @property
+    def parent_id(self):
+        return self._tree.parent_ids[self._i]
+
+    @property
+    def slug(self):
+        return self._tree.slugs[self._i]
+
+    @property
+    def title(self):
+        return self._tree.titles[self._i]
+
+    @property
+    def catalog(self):
+        return self._tree.catalogs[self._i]
+
+    @property
+    def depth(self):
+        return self._tree.depths[self._i]
+
+    @property
+    def description(self):
+        return self._tree.descriptions[self._i]
+
+    @property
+    def children(self):
+        return [TreeNode(self._tree, c) for c in self._tree.child_index[self._i]]
+
+    def __str__(self):
+        return self.title
+
+
+class SectionTree:
+    """
+    Неизменяемый снимок всего дерева разделов: плоские кортежи
+    id / parent / order / slug / title / catalog / depth / description.
+    Порядок элементов - как у Section.Meta.ordering ("order", "title").
+    """
+
+    def __init__(self, version, rows):
+        self.version = version
+
+        self.ids = tuple(r[0] for r in rows)
+        self.parent_ids = tuple(r[1] for r in rows)
+        self.orders = tuple(r[2] for r in rows)
+        self.slugs = tuple(r[3] for r in rows)
+        self.titles = tuple(r[4] for r in rows)
+        self.catalogs = tuple(r[5] for r in rows)
+        self.depths = tuple(r[6] for r in rows)
+        self.descriptions = tuple(r[7] for r in rows)
+
+        self.positions = {pk: i for i, pk in enumerate(self.ids)}
+
+        children = [[] for _ in rows]
+        roots = []
+        for i, parent_id in enumerate(self.parent_ids):
+            parent = self.positions.get(parent_id)
+            if parent is None:
+                roots.append(i)
+            else:
+                children[parent].append(i)
+
+        self.child_index = tuple(tuple(c) for c in children)
+        self.root_index = tuple(roots)
+
+    def get(self, pk):
+        i = self.positions.get(pk)
+        return TreeNode(self, i) if i is not None else None
+
+    def roots(self, catalog=None):
+        return [
+            TreeNode(self, i) for i in self.root_index
+            if not catalog or self.catalogs[i] == catalog
+        ]
+
+    def children(self, pk):
+        node = self.get(pk)
+        return node.children if node else []
+
+    def serialize(self, node, catalog=None, depth=0):
+        """
+        Узел в формате JSON API дерева разделов.
+        """
+        return {
+            "id": node.id,
+            "title": node.title,
+            "depth": depth,
+            "children": [
+                self.serialize(child, catalog, depth + 1)
+                for child in node.children
+                if not catalog or child.catalog == catalog
+            ],
+        }
+
+
+_snapshot = None
+_lock = threading.Lock()
+
+
+def get_tree_version():
+    return tree_cache.version()
+
+
+def bump_tree_version():
+    tree_cache.invalidate()
+
+
+def get_section_tree():
+    """
+    Возвращает актуальный снимок дерева. Пересобирается одним запросом,
+    только если версия в кеше изменилась (сохранение / удаление раздела).
+    """
+    global _snapshot
+
+    version = get_tree_version()
+    snapshot = _snapshot
+
+    if snapshot is not None and snapshot.version == version:
+        return snapshot
+
+    with _lock:
+        if _snapshot is not None and _snapshot.version == version:
+            return _snapshot
+
+        rows = list(
+            Section.objects
+            .order_by("order", "title")
+            .values_list(
+                "id", "parent_id", "order", "slug", "title", "catalog", "depth",
+                "description",
+            )
+        )
+
+        _snapshot = SectionTree(version, rows)
+        return _snapshot
+
+
+def subtree_posts(section, published_only=True, limit=SUBTREE_POSTS_LIMIT):
+    """
+    id / slug / title статей раздела и всех его подразделов: один запрос
+    по индексу path (префикс поддерева), не больше limit строк.
+    """
+    role = "published" if published_only else "all"
+
+    def fetch():
+        qs = Post.objects.filter(section__path__startswith=section.path)
+        if not section.path:
+            qs = Post.objects.filter(section=section)
+        if published_only:
+            qs = qs.filter(status=Post.Status.PUBLISHED)
+
+        return list(
+            qs.order_by("order", "-published_at", "id")
+            .values("id", "slug", "title")[:limit]
+        )
+
+    return subtree_posts_cache.get_or_set(f"{section.pk}:{role}:{limit}", fetch)
+
+
+def invalidate_subtree_posts():
+    subtree_posts_cache.invalidate()
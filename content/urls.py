@@ -4,6 +4,7 @@ from . import views
 urlpatterns = [
     path('', views.home, name='home'),
     path('main/', views.main, name='main'),
+    path("api/feed/", views.main_feed_api, name="main_feed_api"),
     path("search/", views.search, name="search"),
     path("api/search/", views.search_api, name="search_api"),
     path("profile/confirm/<str:token>/", views.confirm_email, name="confirm_email"),
@@ -39,6 +40,8 @@ urlpatterns = [
     path('post/<slug:slug>/publish/', views.publish_post, name='publish_post'),
     path('post/<slug:slug>/archive/', views.archive_post, name='archive_post'),
     path('post/<slug:slug>/delete/', views.delete_post, name='delete_post'),
+    path("post/<slug:slug>/revisions/", views.revision_list_api, name="revision_list_api"),
+    path("post/<slug:slug>/diff/", views.revision_diff_api, name="revision_diff_api"),
     path('post/<slug:slug>/', views.post_detail, name='post_detail'),
 
     # --- Dashboard ---
@@ -1,34 +1,140 @@
-from django.utils.text import slugify
-from content.models import Post, Section
+import re
 
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from slugify import slugify
 
-def generate_post_slug(title: str) -> str:
-    base = slugify(title)
 
-    if not base:
-        base = "post"
+SLUG_MAX_LENGTH = 255
 
-    slug = base
-    counter = 1
+# место под "-<номер>" в конце slug
+SUFFIX_RESERVE = 11
 
-    while Post.objects.filter(slug=slug).exists():
-        slug = f"{base}-{counter}"
-        counter += 1
+SAVE_ATTEMPTS = 5
 
-    return slug
+SUFFIX_RE = re.compile(r"(.+)-(\d+)")
 
 
-def generate_section_slug(title: str) -> str:
-    base = slugify(title)
+def slug_base(title: str, fallback: str) -> str:
+    return slugify(title, max_length=SLUG_MAX_LENGTH - SUFFIX_RESERVE) or fallback
+
+
+def allocate_slug(model, base: str, exclude_pk=None) -> str:
+    """
+    Первый свободный из base, base-1, base-2... Все занятые варианты
+    выбираются одним запросом по префиксу (slug LIKE 'base%' идёт по индексу).
+    """
+    taken = model._default_manager.filter(slug__startswith=base)
+    if exclude_pk is not None:
+        taken = taken.exclude(pk=exclude_pk)
+
+    used = {base: set()}
+    _collect_suffixes(taken.values_list("slug", flat=True), used)
+
+    return _take_free(base, used[base])
+
+
+class SlugAllocator:
+    """
+    Slug-и для пачки новых объектов (import_content): занятые варианты
+    всех новых основ пачки выбираются одним запросом, дальше номера
+    выдаются в памяти - одинаковые заголовки внутри импорта не сталкиваются.
+    """
+
+    # основ в одном запросе (OR из LIKE 'base%')
+    QUERY_CHUNK = 500
+
+    def __init__(self, model):
+        self.model = model
+        self.used = {}
+        # "a-2" для основы "a" - это и основа "a-2" у другого заголовка
+        self.issued = set()
+
+    def load(self, bases):
+        new = [base for base in dict.fromkeys(bases) if base not in self.used]
+
+        for start in range(0, len(new), self.QUERY_CHUNK):
+            chunk = new[start:start + self.QUERY_CHUNK]
+            for base in chunk:
+                self.used[base] = set()
+
+            condition = Q()
+            for base in chunk:
+                condition |= Q(slug__startswith=base)
+
+            _collect_suffixes(
+                self.model._default_manager.filter(condition).values_list("slug", flat=True),
+                self.used,
+            )
+
+    def allocate(self, base: str) -> str:
+        if base not in self.used:
+            self.load([base])
 
-    if not base:
-        base = "section"
+        slug = _take_free(base, self.used[base])
+        while slug in self.issued:
+            slug = _take_free(base, self.used[base])
 
-    slug = base
-    counter = 1
+        self.issued.add(slug)
+        return slug
 
-    while Section.objects.filter(slug=slug).exists():
-        slug = f"{base}-{counter}"
+
+def _collect_suffixes(slugs, used):
+    # "base" - номер 0, "base-N" - номер N; used: основа -> занятые номера
+    for slug in slugs:
+        if slug in used:
+            used[slug].add(0)
+
+        match = SUFFIX_RE.fullmatch(slug)
+        if match and match.group(1) in used:
+            used[match.group(1)].add(int(match.group(2)))
+
+
+def _take_free(base, numbers):
+    counter = 0
+    while counter in numbers:
         counter += 1
 
-    return slug
+    numbers.add(counter)
+    return f"{base}-{counter}" if counter else base
+
+
+def save_with_slug(instance, save, fallback: str, *args, **kwargs):
+    """
+    Сохраняет объект через save(*args, **kwargs), выдав ему slug по заголовку,
+    если его ещё нет. Параллельное сохранение могло занять тот же slug -
+    тогда запись откатывается до savepoint и slug выбирается заново.
+    """
+    if instance.slug or not instance.title:
+        return save(*args, **kwargs)
+
+    model = type(instance)
+    base = slug_base(instance.title, fallback)
+
+    for attempt in range(SAVE_ATTEMPTS):
+        instance.slug = allocate_slug(model, base, exclude_pk=instance.pk)
+        try:
+            with transaction.atomic():
+                return save(*args, **kwargs)
+        except IntegrityError:
+            conflict = (
+                model._default_manager
+                .filter(slug=instance.slug)
+                .exclude(pk=instance.pk)
+                .exists()
+            )
+            if not conflict or attempt == SAVE_ATTEMPTS - 1:
+                instance.slug = ""
+                raise
+
+
+def generate_post_slug(title: str) -> str:
+    from content.models import Post
+
+    return allocate_slug(Post, slug_base(title, "post"))
+
+
+def generate_section_slug(title: str) -> str:
+    from content.models import Section
+
+    return allocate_slug(Section, slug_base(title, "section"))
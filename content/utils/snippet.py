@@ -1,43 +1,163 @@
 import re
+from functools import lru_cache
+
 from django.utils.html import escape
-from django.utils.text import Truncator
-from django.utils.html import strip_tags
+
+from .stemmer import stem
+
+
+WORD_RE = re.compile(r"[^\W_]+")
+CYRILLIC_RE = re.compile(r"[а-яё]")
+WORD_END_RE = re.compile(r"\w*")
+
+# сколько совпадений одного слова максимум разбираем в одном тексте
+MAX_MATCHES = 500
+
+
+def query_terms(query: str) -> tuple:
+    """
+    Слова запроса в нижнем регистре, без повторов, в исходном порядке.
+    """
+    terms = []
+    for word in WORD_RE.findall(query.lower()):
+        if word not in terms:
+            terms.append(word)
+    return tuple(terms)
+
+
+@lru_cache(maxsize=256)
+def term_bases(terms: tuple) -> tuple:
+    """
+    Что искать для каждого слова запроса: (основа, только с начала слова).
+    Русские слова ищутся по основе, чтобы находились и другие формы
+    ("столбом" -> "столб", "столба"), остальные - как подстрока.
+    """
+    bases = []
+    for term in terms:
+        if CYRILLIC_RE.search(term):
+            bases.append((stem(term) or term, True))
+        else:
+            bases.append((term, False))
+    return tuple(bases)
+
+
+def find_matches(text: str, terms: tuple) -> list:
+    """
+    Совпадения (start, end, номер слова) по порядку в тексте.
+
+    Основы ищутся через str.find по тексту в нижнем регистре - это в
+    разы быстрее общего регулярного выражения на длинных статьях;
+    регулярка нужна только чтобы дотянуть совпадение до конца слова.
+    """
+    lowered = text.lower()
+    if len(lowered) != len(text):
+        # редкие символы меняют длину при lower() - позиции бы разъехались
+        lowered = "".join(c if len(c.lower()) != 1 else c.lower() for c in text)
+
+    matches = []
+    for number, (base, word_start) in enumerate(term_bases(terms)):
+        position = lowered.find(base)
+        found = 0
+
+        while position != -1 and found < MAX_MATCHES:
+            end = position + len(base)
+
+            if word_start:
+                if position and lowered[position - 1].isalnum():
+                    position = lowered.find(base, end)
+                    continue
+                end = WORD_END_RE.match(lowered, end).end()
+
+            matches.append((position, end, number))
+            found += 1
+            position = lowered.find(base, end)
+
+    matches.sort()
+    return matches
+
+
+def _densest_window(matches, width):
+    """
+    Скользящее окно по совпадениям: больше разных слов запроса,
+    при равенстве - больше совпадений. Возвращает (first, last) индексы.
+    """
+    best = (0, 0)
+    best_key = (0, 0)
+    counts = {}
+    left = 0
+
+    for right, (start, end, term) in enumerate(matches):
+        counts[term] = counts.get(term, 0) + 1
+
+        while end - matches[left][0] > width:
+            old = matches[left][2]
+            counts[old] -= 1
+            if not counts[old]:
+                del counts[old]
+            left += 1
+
+        key = (len(counts), right - left + 1)
+        if key > best_key:
+            best_key = key
+            best = (left, right)
+
+    return best
+
 
 def make_snippet(text: str, query: str, radius: int = 80) -> str:
+    """
+    text - уже очищенный от разметки текст (PostRevision.plain_text).
+
+    Находит фрагмент, где встречается больше всего разных слов запроса,
+    и подсвечивает их все за один проход с экранированием по кускам.
+    Пересекающиеся совпадения разных слов подсвечиваются по первому.
+    """
     if not text or not query:
         return ""
 
-    # 1. Убираем HTML полностью
-    plain = strip_tags(text)
-
-    q = query.strip()
-    if not q:
+    terms = query_terms(query)
+    if not terms:
         return ""
 
-    # 2. Ищем без учёта регистра
-    match = re.search(re.escape(q), plain, re.IGNORECASE)
-    if not match:
+    matches = find_matches(text, terms)
+    if not matches:
         return ""
 
-    start = max(match.start() - radius, 0)
-    end = min(match.end() + radius, len(plain))
+    width = radius * 2
+    first, last = _densest_window(matches, width)
+    span_start, span_end = matches[first][0], matches[last][1]
 
-    snippet = plain[start:end]
+    # добиваем контекстом до ширины окна поровну с двух сторон
+    pad = max(width - (span_end - span_start), 0) // 2
+    start = max(span_start - pad, 0)
+    end = min(span_end + pad, len(text))
 
+    # не режем слова по краям
     if start > 0:
-        snippet = "…" + snippet
-    if end < len(plain):
-        snippet += "…"
-
-    # 3. Экранируем (на всякий)
-    snippet = escape(snippet)
-
-    # 4. Подсветка
-    snippet = re.sub(
-        f"({re.escape(q)})",
-        r"<mark>\1</mark>",
-        snippet,
-        flags=re.IGNORECASE
-    )
-
-    return snippet
+        space = text.find(" ", start, span_start)
+        if space != -1:
+            start = space + 1
+    if end < len(text):
+        space = text.rfind(" ", span_end, end)
+        if space != -1:
+            end = space
+
+    parts = ["…"] if start > 0 else []
+    position = start
+
+    for match_start, match_end, _ in matches:
+        if match_start >= end:
+            break
+        if match_start < position:
+            continue
+
+        parts.append(escape(text[position:match_start]))
+        parts.append(f"<mark>{escape(text[match_start:match_end])}</mark>")
+        position = match_end
+
+    parts.append(escape(text[position:end]))
+
+    if end < len(text):
+        parts.append("…")
+
+    return "".join(parts)
@@ -0,0 +1,143 @@
+"""
+Стеммер для русского языка по алгоритму Snowball (Porter).
+https://snowballstem.org/algorithms/russian/stemmer.html
+"""
+
+VOWELS = "аеиоуыэюя"
+
+PERFECTIVE_GERUND = (
+    ("в", "вши", "вшись"),
+    ("ив", "ивши", "ившись", "ыв", "ывши", "ывшись"),
+)
+
+ADJECTIVE = (
+    "ее", "ие", "ые", "ое", "ими", "ыми", "ей", "ий", "ый", "ой", "ем", "им",
+    "ым", "ом", "его", "ого", "ему", "ому", "их", "ых", "ую", "юю", "ая",
+    "яя", "ою", "ею",
+)
+
+PARTICIPLE = (
+    ("ем", "нн", "вш", "ющ", "щ"),
+    ("ивш", "ывш", "ующ"),
+)
+
+REFLEXIVE = ("ся", "сь")
+
+VERB = (
+    (
+        "ла", "на", "ете", "йте", "ли", "й", "л", "ем", "н", "ло", "но", "ет",
+        "ют", "ны", "ть", "ешь", "нно",
+    ),
+    (
+        "ила", "ыла", "ена", "ейте", "уйте", "ите", "или", "ыли", "ей", "уй",
+        "ил", "ыл", "им", "ым", "ен", "ило", "ыло", "ено", "ят", "ует", "уют",
+        "ит", "ыт", "ены", "ить", "ыть", "ишь", "ую", "ю",
+    ),
+)
+
+NOUN = (
+    "а", "ев", "ов", "ие", "ье", "е", "иями", "ями", "ами", "еи", "ии", "и",
+    "ией", "ей", "ой", "ий", "й", "иям", "ям", "ием", "ем", "ам", "ом", "о",
+    "у", "ах", "иях", "ях", "ы", "ь", "ию", "ью", "ю", "ия", "ья", "я",
+)
+
+DERIVATIONAL = ("ост", "ость")
+
+SUPERLATIVE = ("ейш", "ейше")
+
+
+def _longest(word, suffixes):
+    best = ""
+    for suffix in suffixes:
+        if len(suffix) > len(best) and word.endswith(suffix):
+            best = suffix
+    return best
+
+
+def _strip(rv, groups):
+    """
+    Снимает самое длинное окончание из групп. Окончания первой группы
+    должны идти после "а" или "я" (сама буква остаётся).
+    Возвращает (новый rv, найдено ли окончание).
+    """
+    conditional, plain = groups
+    suffix = _longest(rv, conditional + plain)
+
+    if not suffix:
+        return rv, False
+
+    if suffix in conditional and suffix not in plain:
+        if not rv[:-len(suffix)].endswith(("а", "я")):
+            return rv, False
+
+    return rv[:-len(suffix)], True
+
+
+def _regions(word):
+    rv = r1 = r2 = len(word)
+
+    for i, ch in enumerate(word):
+        if ch in VOWELS:
+            rv = i + 1
+            break
+
+    for i in range(1, len(word)):
+        if word[i] not in VOWELS and word[i - 1] in VOWELS:
+            r1 = i + 1
+            break
+
+    for i in range(r1 + 1, len(word)):
+        if word[i] not in VOWELS and word[i - 1] in VOWELS:
+            r2 = i + 1
+            break
+
+    return rv, r2
+
+
+def stem(word: str) -> str:
+    word = word.lower().replace("ё", "е")
+
+    rv_start, r2_start = _regions(word)
+    head, rv = word[:rv_start], word[rv_start:]
+
+    # шаг 1
+    rv, found = _strip(rv, PERFECTIVE_GERUND)
+
+    if not found:
+        suffix = _longest(rv, REFLEXIVE)
+        if suffix:
+            rv = rv[:-len(suffix)]
+
+        suffix = _longest(rv, ADJECTIVE)
+        if suffix:
+            rv = rv[:-len(suffix)]
+            rv, _ = _strip(rv, PARTICIPLE)
+        else:
+            rv, found = _strip(rv, VERB)
+            if not found:
+                suffix = _longest(rv, NOUN)
+                if suffix:
+                    rv = rv[:-len(suffix)]
+
+    # шаг 2
+    if rv.endswith("и"):
+        rv = rv[:-1]
+
+    # шаг 3: словообразовательные окончания только в R2
+    suffix = _longest(rv, DERIVATIONAL)
+    if suffix and len(head) + len(rv) - len(suffix) >= r2_start:
+        rv = rv[:-len(suffix)]
+
+    # шаг 4
+    if rv.endswith("нн"):
+        rv = rv[:-1]
+    else:
+        suffix = _longest(rv, SUPERLATIVE)
+        if suffix:
+            rv = rv[:-len(suffix)]
+            if rv.endswith("нн"):
+                rv = rv[:-1]
+        elif rv.endswith("ь"):
+            rv = rv[:-1]
+
+    return head + rv
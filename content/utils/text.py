@@ -0,0 +1,23 @@
+import html
+import re
+
+from django.utils.html import strip_tags
+from django.utils.text import Truncator
+
+# после блочных тегов вставляем пробел, чтобы абзацы не склеивались
+BLOCK_END_RE = re.compile(r"(<br\s*/?>|</(?:p|div|li|h[1-6]|blockquote|pre)>)", re.IGNORECASE)
+WHITESPACE_RE = re.compile(r"\s+")
+
+EXCERPT_LENGTH = 240
+
+
+def html_to_text(value: str) -> str:
+    if not value:
+        return ""
+
+    text = strip_tags(BLOCK_END_RE.sub(r"\1 ", value))
+    return WHITESPACE_RE.sub(" ", html.unescape(text)).strip()
+
+
+def make_excerpt(text: str, length: int = EXCERPT_LENGTH) -> str:
+    return Truncator(text).chars(length)
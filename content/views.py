@@ -1,50 +1,47 @@
 from django.shortcuts import render, get_object_or_404, redirect
+from django.template.loader import render_to_string
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from content.emails import verify_email_token, send_confirm_email
 from django.utils import timezone
 from datetime import timedelta
 from django.views.decorators.http import require_POST, require_GET
-from django.http import JsonResponse, HttpResponseBadRequest
+from django.http import JsonResponse, HttpResponseBadRequest, StreamingHttpResponse, Http404
 from django.views.decorators.csrf import csrf_exempt
+from .search import search_posts, search_snippet
 from .utils.snippet import make_snippet
 import uuid
 import logging
 
 logger = logging.getLogger(__name__)
 
-from django import template
 from .models import Section, Post, PostRevision, Activity, PostImage, UserProfile, Bookmark
 from .forms import PostEditorForm, SectionForm, ProfileForm
-from .permissions import publisher_required
+from .permissions import publisher_required, is_publisher
 from .utils.html import clean_html
-from .utils.slug import generate_post_slug, generate_section_slug
+from .tree import get_section_tree
+from .render import get_rendered_body
+from .conditional import conditional_page
+from .images import file_checksum
+from .pagination import KeysetPaginator, ListPaginator
+from . import diff
 from django.core.paginator import Paginator
 from django.db.models import Max, OuterRef, Exists, Count, Q, OuterRef, Subquery, Value
-from django.db.models.functions import Coalesce
 
 
-register = template.Library()
+SEARCH_SNIPPETS = 20
 
 def get_sidebar_context(section=None, catalog=None):
 
     if section:
         catalog = section.catalog
 
-    qs = Section.objects.filter(parent__isnull=True)
-
-    if catalog:
-        qs = qs.filter(catalog=catalog)
-
-    root_sections = (
-        qs.prefetch_related("children__children")
-        .order_by("order", "title")
-    )
+    root_sections = get_section_tree().roots(catalog)
 
     ancestor_ids = set()
 
     if section:
-        ancestor_ids = {s.id for s in section.get_ancestors()}
+        ancestor_ids = set(section.ancestor_ids)
         ancestor_ids.add(section.id)
 
     return {
@@ -53,15 +50,6 @@ def get_sidebar_context(section=None, catalog=None):
         "ancestor_ids": ancestor_ids,
     }
 
-@register.filter
-def has_group(user, group_name):
-    return user.groups.filter(name=group_name).exists()
-
-
-def is_publisher(user) -> bool:
-    return user.is_authenticated and user.groups.filter(name="Publishers").exists()
-
-
 def root_redirect(request):
     return redirect("/main/")
 
@@ -140,22 +128,41 @@ def confirm_email(request, token):
 
     return render(request, "content/internal/email_confirm_success.html")
 
-@login_required
-def main(request):
-    posts = (
+def _main_feed():
+    return (
         Post.objects
         .filter(status=Post.Status.PUBLISHED)
         .select_related("section", "author")
-        .order_by(
-            Coalesce("updated_at", "published_at").desc()
-        )
+        .order_by("-feed_at")
     )
 
-    paginator = Paginator(posts, 5)
-    page_obj = paginator.get_page(request.GET.get("page"))
 
+def main_feed_page(request):
+    return KeysetPaginator(_main_feed(), 5).get_page(request.GET)
+
+
+@login_required
+@conditional_page
+def main(request):
     return render(request, "content/internal/main.html", {
-        "page_obj": page_obj,
+        "page_obj": main_feed_page(request),
+    })
+
+
+@login_required
+@conditional_page
+def main_feed_api(request):
+    """
+    Следующая порция ленты для бесконечной прокрутки: готовые карточки
+    и строка запроса для следующей.
+    """
+    page_obj = main_feed_page(request)
+
+    return JsonResponse({
+        "html": render_to_string(
+            "content/internal/_feed_items.html", {"page_obj": page_obj}, request=request
+        ),
+        "next": page_obj.next_query if page_obj.has_next() else None,
     })
 
 
@@ -163,13 +170,6 @@ def main(request):
 def catalog_sinyi(request):
     q = request.GET.get("q", "").strip()
 
-    sections = (
-        Section.objects
-        .filter(catalog="sinyi", parent__isnull=True)
-        .prefetch_related("children__children")
-        .order_by("order", "title")
-    )
-
     search_qs = (
         Post.objects
         .filter(
@@ -177,16 +177,13 @@ def catalog_sinyi(request):
             section__catalog="sinyi",
         )
         .select_related("section", "author", "current_revision")
+        .defer("current_revision__raw_content", "current_revision__data", "current_revision__plain_text")
     )
 
     featured_qs = search_qs.filter(is_featured=True)
 
     if q:
-        result_qs = search_qs.filter(
-            Q(title__icontains=q) |
-            Q(summary__icontains=q) |
-            Q(current_revision__content__icontains=q)
-        ).order_by(
+        result_qs = search_posts(search_qs, q).order_by(
             "-is_featured",
             "order",
             "-published_at",
@@ -199,8 +196,7 @@ def catalog_sinyi(request):
             "-created_at"
         )
 
-    paginator = Paginator(result_qs, 10)
-    page_obj = paginator.get_page(request.GET.get("page"))
+    page_obj = KeysetPaginator(result_qs, 10).get_page(request.GET)
 
     sidebar = get_sidebar_context(catalog="sinyi")
 
@@ -228,16 +224,13 @@ def catalog_taiji(request):
             section__catalog="taiji",
         )
         .select_related("section", "author", "current_revision")
+        .defer("current_revision__raw_content", "current_revision__data", "current_revision__plain_text")
     )
 
     featured_qs = search_qs.filter(is_featured=True)
 
     if q:
-        result_qs = search_qs.filter(
-            Q(title__icontains=q) |
-            Q(summary__icontains=q) |
-            Q(current_revision__content__icontains=q)
-        ).order_by(
+        result_qs = search_posts(search_qs, q).order_by(
             "-is_featured",
             "order",
             "-published_at",
@@ -250,8 +243,7 @@ def catalog_taiji(request):
             "-created_at"
         )
 
-    paginator = Paginator(result_qs, 10)
-    page_obj = paginator.get_page(request.GET.get("page"))
+    page_obj = KeysetPaginator(result_qs, 10).get_page(request.GET)
 
     sidebar = get_sidebar_context(catalog="taiji")
 
@@ -270,11 +262,9 @@ def catalog_taiji(request):
 
 @login_required
 def section_tree(request):
-    sections = (
-        Section.objects
-        .filter(parent__isnull=True)
-        .prefetch_related("children__children")
-        .order_by("catalog", "order", "title")
+    sections = sorted(
+        get_section_tree().roots(),
+        key=lambda node: node.catalog
     )
 
     return render(request, "content/internal/section_tree.html", {
@@ -305,102 +295,81 @@ def section_search_api(request):
             "id": s.id,
             "slug": s.slug,
             "title": s.title,
-            "depth": s.get_depth(),
+            "depth": s.depth,
         }
         for s in qs[:20]
     ]
     return JsonResponse(data, safe=False)
 
 @login_required
+@conditional_page
 def section_tree_page_api(request):
     page = int(request.GET.get("page", 1))
     per_page = 1
     catalog = request.GET.get("catalog")
 
-    roots = Section.objects.filter(parent__isnull=True)
-
-    if catalog:
-        roots = roots.filter(catalog=catalog)
-
-    roots = roots.order_by("order", "title")
+    tree = get_section_tree()
+    roots = tree.roots(catalog)
 
     paginator = Paginator(roots, per_page)
     root_page = paginator.get_page(page)
 
-    def serialize(node, depth=0):
-        children_qs = node.children.all()
-
-        if catalog:
-            children_qs = children_qs.filter(catalog=catalog)
-
-        return {
-            "id": node.id,
-            "title": node.title,
-            "depth": depth,
-            "children": [
-                serialize(c, depth + 1)
-                for c in children_qs
-            ]
-        }
-
     return JsonResponse({
         "pages": paginator.num_pages,
         "current": root_page.number,
-        "data": [serialize(r, 0) for r in root_page.object_list]
+        "data": [tree.serialize(r, catalog) for r in root_page.object_list]
     })
 
 
 @login_required
+@conditional_page
 def section_detail(request, slug):
 
     section = get_object_or_404(Section, slug=slug)
     query = request.GET.get("q", "").strip()
 
-    ancestors = section.get_ancestors()
-
-    children_qs = section.children.order_by("order", "title")
+    # предки и дочерние разделы - из снимка дерева, без запросов
+    tree = get_section_tree()
+    ancestors = [node for node in map(tree.get, section.ancestor_ids) if node]
+    children = tree.children(section.pk)
 
     children_page = None
     page_obj = None
-    featured_posts = None
-
-    # дети
-    if children_qs.exists():
-        paginator = Paginator(children_qs, 10)
-        children_page = paginator.get_page(request.GET.get("cpage"))
-
-    # посты (ВСЕГДА)
-    posts = (
-        Post.objects
-        .filter(
-            section=section,
-            status__in=[
-                Post.Status.PUBLISHED,
-                Post.Status.ARCHIVED
-            ] if is_publisher(request.user)
-            else [Post.Status.PUBLISHED]
-        )
-        .select_related("current_revision", "author")
-    )
+    featured_posts = regular_posts = []
 
-    if query:
-        posts = posts.filter(
-            Q(title__icontains=query) |
-            Q(summary__icontains=query) |
-            Q(current_revision__content__icontains=query)
+    if children:
+        children_page = ListPaginator(children, 10).get_page(request.GET, prefix="c")
+    else:
+        # статьи показываются только в разделе без подразделов.
+        # Закреплённые и обычные - одна выборка: закреплённые идут первыми,
+        # страница делится на два блока уже в памяти
+        posts = (
+            Post.objects
+            .filter(
+                section=section,
+                status__in=[
+                    Post.Status.PUBLISHED,
+                    Post.Status.ARCHIVED
+                ] if is_publisher(request.user)
+                else [Post.Status.PUBLISHED]
+            )
+            .select_related("current_revision", "author")
+            .defer("current_revision__raw_content", "current_revision__data", "current_revision__plain_text")
         )
 
-    posts = posts.order_by(
-        "order",
-        "-published_at",
-        "-created_at"
-    )
+        if query:
+            posts = search_posts(posts, query)
 
-    featured_posts = posts.filter(is_featured=True)
-    regular_posts = posts.filter(is_featured=False)
+        posts = posts.order_by(
+            "-is_featured",
+            "order",
+            "-published_at",
+            "-created_at"
+        )
 
-    paginator = Paginator(regular_posts, 10)
-    page_obj = paginator.get_page(request.GET.get("page"))
+        page_obj = KeysetPaginator(posts, 10).get_page(request.GET)
+        featured_posts = [post for post in page_obj if post.is_featured]
+        regular_posts = [post for post in page_obj if not post.is_featured]
 
     sidebar = get_sidebar_context(section)
 
@@ -413,6 +382,7 @@ def section_detail(request, slug):
             "children_page": children_page,
             "page_obj": page_obj,
             "featured_posts": featured_posts,
+            "regular_posts": regular_posts,
             "query": query,
             "sidebar_mode": "section",
             "can_edit": is_publisher(request.user),
@@ -420,10 +390,16 @@ def section_detail(request, slug):
         }
     )
 @login_required
+@conditional_page
 def post_detail(request, slug):
 
 
-    qs = Post.objects.select_related("section", "author", "current_revision")
+    # тело берётся из кеша отрисовки, content читается только при промахе
+    qs = (
+        Post.objects
+        .select_related("section", "author", "current_revision")
+        .defer("current_revision__raw_content", "current_revision__data", "current_revision__plain_text")
+    )
 
     if is_publisher(request.user):
         post = get_object_or_404(qs, slug=slug)
@@ -432,31 +408,8 @@ def post_detail(request, slug):
 
     section = post.section if post.section and post.section.slug else None
 
-    if section:
-
-        def collect_sections(node):
-            result = [node]
-            for child in node.children.all():
-                result += collect_sections(child)
-            return result
-
-        sections = collect_sections(section)
-
-        section_posts_qs = Post.objects.filter(
-            section__in=sections
-        )
-
-        if not is_publisher(request.user):
-            section_posts_qs = section_posts_qs.filter(
-                status=Post.Status.PUBLISHED
-            )
-
-        section_posts_qs = section_posts_qs.order_by(
-            "order",
-            "-published_at"
-        )
-    else:
-        section_posts_qs = Post.objects.none()
+    # статьи раздела и подразделов для боковой панели - из кеша
+    section_posts = section.subtree_posts(published_only=not is_publisher(request.user)) if section else []
 
     is_bookmarked = Bookmark.objects.filter(
         user=request.user,
@@ -466,10 +419,15 @@ def post_detail(request, slug):
 
     sidebar = get_sidebar_context(post.section)
 
+    revision = post.current_revision
+    body = get_rendered_body(revision) if revision else None
+
     return render(request, "content/internal/post_detail.html", {
         "post": post,
-        "revision": post.current_revision,
-        "section_posts": section_posts_qs,
+        "revision": revision,
+        "body": body,
+        "toc": body["toc"] if body else [],
+        "section_posts": section_posts,
         "active_section_slug": section.slug if section else None,
         "active_post_slug": post.slug,
         "sidebar_mode": "post",
@@ -486,25 +444,32 @@ def search(request):
     results = Post.objects.none()
 
     if q:
-        query = Q()
-
-        for word in q.split():
-            query |= (
-                Q(title__icontains=word) |
-                Q(summary__icontains=word) |
-                Q(current_revision__content__icontains=word)
-            )
-
         results = (
             Post.objects
             .filter(status=Post.Status.PUBLISHED)
-            .filter(query)
+            .select_related("section", "author", "current_revision")
+            .defer("current_revision__raw_content", "current_revision__data", "current_revision__plain_text")
         )
 
         if catalog:
             results = results.filter(section__catalog=catalog)
 
-        results = results.distinct()
+        results = list(
+            search_posts(results, q, match="any").order_by(
+                "-search_rank",
+                "-published_at"
+            )
+        )
+
+        # подсветка слов запроса - для первых результатов, текст одним запросом
+        top = results[:SEARCH_SNIPPETS]
+        texts = dict(
+            PostRevision.objects
+            .filter(pk__in=[post.current_revision_id for post in top])
+            .values_list("pk", "plain_text")
+        )
+        for post in top:
+            post.snippet = make_snippet(texts.get(post.current_revision_id, ""), q)
 
     return render(request, "content/internal/search.html", {
         "query": q,
@@ -515,6 +480,7 @@ def search(request):
 
 
 @login_required
+@conditional_page
 def search_api(request):
     q = request.GET.get("q", "").strip()
     catalog = request.GET.get("catalog")
@@ -524,6 +490,7 @@ def search_api(request):
         Post.objects
         .filter(status=Post.Status.PUBLISHED)
         .select_related("section", "current_revision")
+        .defer("current_revision__raw_content", "current_revision__data")
     )
 
     if section:
@@ -532,17 +499,16 @@ def search_api(request):
         qs = qs.filter(section__catalog=catalog)
 
     if q:
-        qs = qs.filter(
-            Q(title__icontains=q) |
-            Q(current_revision__content__icontains=q)
+        qs = search_posts(qs, q, prefix=True, snippets=True).order_by(
+            "-search_rank",
+            "-published_at"
         )
 
-    qs = qs.distinct()[:5]
+    qs = qs[:5]
 
     data = []
     for post in qs:
-        content = post.current_revision.content if post.current_revision else ""
-        snippet = make_snippet(content, q)
+        snippet = search_snippet(post, q)
 
         data.append({
             "title": post.title,
@@ -572,10 +538,14 @@ def toggle_bookmark(request, slug):
 
 @login_required
 def my_bookmarks(request):
-    qs = Bookmark.objects.filter(user=request.user).select_related("post")
+    qs = (
+        Bookmark.objects
+        .filter(user=request.user)
+        .select_related("post")
+        .order_by("-created_at")
+    )
 
-    paginator = Paginator(qs, 6)
-    page_obj = paginator.get_page(request.GET.get("page"))
+    page_obj = KeysetPaginator(qs, 6).get_page(request.GET)
 
     return render(request, "content/internal/bookmarks.html", {
         "page_obj": page_obj
@@ -592,9 +562,7 @@ def dashboard(request):
         .order_by('-updated_at')
     )
 
-    paginator = Paginator(posts, 6)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    page_obj = KeysetPaginator(posts, 6).get_page(request.GET)
 
     return render(request, 'content/internal/dashboard.html', {
         'page_obj': page_obj,
@@ -621,11 +589,21 @@ def upload_editor_image(request):
     if not image:
         return JsonResponse({"error": "no image"}, status=400)
 
-    img = PostImage.objects.create(
-        post=None,
-        image=image,
-        title=image.name,
-    )
+    # одинаковые файлы не копим: по хешу содержимого берём готовую строку
+    checksum = file_checksum(image)
+    img = PostImage.objects.filter(checksum=checksum).first()
+
+    if img is not None:
+        # картинку вставили снова - collect_images не должен счесть её
+        # старой, пока статья с ней не сохранена
+        PostImage.objects.filter(pk=img.pk).update(uploaded_at=timezone.now())
+    else:
+        img = PostImage.objects.create(
+            post=None,
+            image=image,
+            title=image.name,
+            checksum=checksum,
+        )
 
     return JsonResponse({"url": img.image.url})
 
@@ -760,6 +738,87 @@ def edit_post(request, post_slug):
     })
 
 
+@login_required
+@publisher_required
+@require_GET
+def revision_list_api(request, slug):
+    """
+    История статьи без текстов версий - для выбора пары к сравнению.
+    """
+    post = get_object_or_404(Post.objects.only("id", "current_revision_id"), slug=slug)
+
+    revisions = (
+        PostRevision.objects
+        .filter(post=post)
+        .select_related("created_by")
+        .only(
+            "id", "created_at", "note", "is_published_snapshot", "word_count",
+            "created_by__username",
+        )
+        .order_by("-pk")
+    )
+
+    return JsonResponse({
+        "current": post.current_revision_id,
+        "revisions": [
+            {
+                "id": r.id,
+                "created_at": r.created_at.isoformat(),
+                "author": r.created_by.username if r.created_by else None,
+                "note": r.note,
+                "words": r.word_count,
+                "published": r.is_published_snapshot,
+            }
+            for r in revisions
+        ],
+    })
+
+
+@login_required
+@publisher_required
+@require_GET
+def revision_diff_api(request, slug):
+    """
+    ?a=<id>&b=<id>&mode=text|html - правка версии a в версию b по словам.
+    Повторный запрос той же пары - из кеша; большие правки не кешируются
+    и отдаются потоком.
+    """
+    try:
+        rev_a, rev_b = int(request.GET["a"]), int(request.GET["b"])
+    except (KeyError, ValueError):
+        return HttpResponseBadRequest("a и b - id версий")
+
+    mode = request.GET.get("mode", diff.TEXT)
+    if mode not in (diff.TEXT, diff.HTML):
+        return HttpResponseBadRequest("mode: text или html")
+
+    post = get_object_or_404(Post.objects.only("id"), slug=slug)
+    meta = {"a": rev_a, "b": rev_b, "mode": mode}
+    key = diff.diff_cache_key(post.pk, rev_a, rev_b, mode)
+
+    ops = diff.diff_cache.get(key)
+    if ops is not None:
+        return JsonResponse({**meta, "ops": ops})
+
+    qs = PostRevision.objects.filter(post=post, pk__in={rev_a, rev_b})
+    if mode == diff.TEXT:
+        # хватает plain_text - HTML и дельты не разбираются
+        qs = qs.only("id", "plain_text")
+
+    found = {r.pk: r for r in qs}
+    if rev_a not in found or rev_b not in found:
+        raise Http404("Версия не найдена")
+
+    def text(revision):
+        return revision.plain_text if mode == diff.TEXT else revision.content
+
+    ops = diff.iter_diff(text(found[rev_a]), text(found[rev_b]), mode)
+    return StreamingHttpResponse(
+        diff.stream_json(meta, ops, cache_key=key),
+        content_type="application/json",
+    )
+
+
 
 @login_required
 @publisher_required
@@ -771,8 +830,9 @@ def publish_post(request, slug):
     """
     post = get_object_or_404(Post, slug=slug)
     post.status = Post.Status.PUBLISHED
+    post.feed_at = timezone.now()
     if not post.published_at:
-        post.published_at = timezone.now()
+        post.published_at = post.feed_at
     post.save()
 
     _log_activity(post=post, action="publish", user=request.user)
@@ -804,8 +864,7 @@ def archived_posts(request):
         .order_by("-updated_at")
     )
 
-    paginator = Paginator(posts, 5)
-    page_obj = paginator.get_page(request.GET.get("page"))
+    page_obj = KeysetPaginator(posts, 5).get_page(request.GET)
 
     return render(request, "content/internal/dashboard.html", {
         "page_obj": page_obj,
@@ -839,9 +898,7 @@ def create_section(request):
         if form.is_valid():
             section = form.save(commit=False)
 
-
-            section.slug = generate_section_slug(section.title)
-
+            # slug выдаёт Section.save
             section.save()
             return redirect("section_list")
     else:
@@ -903,24 +960,22 @@ def section_list(request):
 
     # счётчики
     counts = {
-        "container": base_qs.filter(parent__isnull=True).count(),
-        "group": base_qs.filter(parent__isnull=False, parent__parent__isnull=True).count(),
-        "content": base_qs.filter(parent__parent__isnull=False).count(),
+        "container": Section.objects.filter(depth=0).count(),
+        "group": Section.objects.filter(depth=1).count(),
+        "content": Section.objects.filter(depth__gte=2).count(),
     }
 
     # фильтр для текущей вкладки
     if section_type == "container":
-        sections_qs = base_qs.filter(parent__isnull=True)
+        sections_qs = base_qs.filter(depth=0)
     elif section_type == "content":
-        sections_qs = base_qs.filter(parent__parent__isnull=False)
+        sections_qs = base_qs.filter(depth__gte=2)
     else:  # group
-        sections_qs = base_qs.filter(parent__isnull=False, parent__parent__isnull=True)
+        sections_qs = base_qs.filter(depth=1)
 
     sections_qs = sections_qs.order_by("title")
 
-    paginator = Paginator(sections_qs, 10)
-    page_number = request.GET.get("page")
-    page_obj = paginator.get_page(page_number)
+    page_obj = KeysetPaginator(sections_qs, 10).get_page(request.GET)
 
     return render(request, "content/internal/section_list.html", {
         "page_obj": page_obj,
@@ -939,10 +994,7 @@ def edit_section(request, slug):
         if form.is_valid():
             section = form.save(commit=False)
 
-            # если slug пустой - пересоздаём
-            if not section.slug:
-                section.slug = generate_section_slug(section.title)
-
+            # если slug пустой - Section.save выдаст новый
             section.save()
             return redirect("section_list")
     else: